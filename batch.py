@@ -0,0 +1,178 @@
+from __future__ import annotations
+import argparse
+import time
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from firetower import FireTowerGame, Geometry, Players, TileStatus, WindDir
+
+TREE, FIRE, FIREBREAK = 0, 1, 2
+STATUS_CODES = {TileStatus.tree: TREE, TileStatus.fire: FIRE, TileStatus.firebreak: FIREBREAK}
+CODE_STATUSES = {code: status for status, code in STATUS_CODES.items()}
+WINDS = tuple(WindDir)
+# per wind in WINDS, the (y, x) slices of the target and source tiles when everything moves one step that way
+SHIFTS = tuple({
+    WindDir.N: ((slice(None, -1), slice(None)), (slice(1, None), slice(None))),
+    WindDir.S: ((slice(1, None), slice(None)), (slice(None, -1), slice(None))),
+    WindDir.W: ((slice(None), slice(None, -1)), (slice(None), slice(1, None))),
+    WindDir.E: ((slice(None), slice(1, None)), (slice(None), slice(None, -1))),
+}[wind] for wind in WINDS)
+
+
+class BatchEngine:
+    """
+    K Fire Tower games held as one (K, size, size) uint8 array of tile codes, indexed [game, y, x], with per-game
+    wind, player and game-over vectors alongside. Fire storms, wind fire candidates and victory checks run on every
+    game at once. All games share one seating; finished games are left untouched by later operations
+    """
+
+    def __init__(self, games: int, players: Optional[Players] = None, size: int = FireTowerGame.BOARD_SIZE,
+                 seed: Optional[int] = None):
+        self.size = size
+        self.geometry = Geometry.of(size)
+        self.rng = np.random.default_rng(seed)
+        self.corners = [p.corner for p in players or Players.four_player()]
+
+        self.boards = np.zeros((games, size, size), dtype=np.uint8)
+        for i in self.geometry.eternal_flame:
+            y, x = divmod(i, size)
+            self.boards[:, y, x] = FIRE
+        self.players_active = np.ones((games, len(self.corners)), dtype=bool)
+        self.active = np.ones(games, dtype=bool)
+
+        self.corner_y = np.array([self.geometry.corners[c] // size for c in self.corners])
+        self.corner_x = np.array([self.geometry.corners[c] % size for c in self.corners])
+        self.towers = np.zeros((len(self.corners), size, size), dtype=bool)
+        for k, corner in enumerate(self.corners):
+            self.towers[k].flat[sorted(self.geometry.towers[corner])] = True
+        self.corner_winds = np.array([[wind in corner for wind in WINDS] for corner in self.corners])
+        self.winds = self.random_winds()
+
+    @classmethod
+    def from_games(cls, games: Sequence[FireTowerGame], seed: Optional[int] = None) -> BatchEngine:
+        """A batch holding copies of the given scalar games, which must share a board size and seating"""
+        first = games[0]
+        batch = cls(len(games), first.players, first.geometry.size, seed)
+        for k, game in enumerate(games):
+            batch.set_game(k, game)
+        return batch
+
+    def set_game(self, k: int, game: FireTowerGame):
+        tiles = game.board.tiles[:self.geometry.tiles]
+        self.boards[k] = np.array([STATUS_CODES[s] for s in tiles], dtype=np.uint8).reshape(self.size, self.size)
+        self.players_active[k] = [p.active for p in game.players]
+        self.active[k] = game.active
+        self.winds[k] = WINDS.index(game.wind)
+
+    def statuses(self, k: int) -> List[TileStatus]:
+        """The k-th board as TileStatus values in tile-index order, comparable with Board.tiles"""
+        return [CODE_STATUSES[c] for c in self.boards[k].ravel().tolist()]
+
+    def random_winds(self) -> np.ndarray:
+        """One wind per game, drawn uniformly from the directions of that game's active players' corners"""
+        valid = self.players_active @ self.corner_winds
+        keys = self.rng.random(valid.shape)
+        keys[~valid] = -1
+        return keys.argmax(axis=1).astype(np.uint8)
+
+    def shifted(self, mask: np.ndarray, winds: np.ndarray) -> np.ndarray:
+        """
+        The (K, size, size) mask with each game's tiles moved one step in that game's wind, as a roll of the board
+        that drops whatever is pushed over the edge instead of wrapping it around
+        """
+        moved = np.zeros_like(mask)
+        for d, (target, source) in enumerate(SHIFTS):
+            games = np.flatnonzero(winds == d)
+            if len(games):
+                moved[(games,) + target] = mask[(games,) + source]
+        return moved
+
+    def wind_fire_candidates(self) -> np.ndarray:
+        """(K, size, size) bool: the tree tiles where add_wind_fire would place fire in each game's current wind"""
+        return self.shifted(self.boards == FIRE, self.winds) & (self.boards == TREE) & self.active[:, None, None]
+
+    def fire_storm(self, storm_winds: Optional[np.ndarray] = None, next_winds: Optional[np.ndarray] = None):
+        """
+        A fire storm in every unfinished game: each fire spreads one tile in that game's storm wind, then the
+        game's wind is re-rolled. Either set of winds can be given as WINDS indices instead of being drawn
+        """
+        storm_winds = self.random_winds() if storm_winds is None else np.asarray(storm_winds)
+        spread = self.shifted(self.boards == FIRE, storm_winds)
+        spread &= (self.boards == TREE) & self.active[:, None, None]
+        self.boards |= spread.view(np.uint8)
+        next_winds = self.random_winds() if next_winds is None else np.asarray(next_winds)
+        self.winds = np.where(self.active, next_winds, self.winds).astype(np.uint8)
+
+    def check_for_victory(self) -> np.ndarray:
+        """
+        Burn every player whose corner caught fire, setting their whole tower alight, and end the games with at most
+        one player left. Returns the mask of games that finished in this call
+        """
+        corner_fire = self.boards[:, self.corner_y, self.corner_x] == FIRE
+        burned = corner_fire & self.players_active & self.active[:, None]
+        if burned.any():
+            for k in range(len(self.corners)):
+                self.boards[burned[:, k, None, None] & self.towers[k]] = FIRE
+            self.players_active &= ~burned
+        finished = self.active & (self.players_active.sum(axis=1) <= 1)
+        self.active &= ~finished
+        return finished
+
+    def winners(self) -> np.ndarray:
+        """The winning seat of each finished game, or -1 where the game is still going or everyone burned"""
+        won = ~self.active & (self.players_active.sum(axis=1) == 1)
+        return np.where(won, self.players_active.argmax(axis=1), -1)
+
+
+def check_against_scalar(games: int = 32, steps: int = 40, seed: int = 0) -> bool:
+    """
+    Play the same fire storms through scalar FireTowerGames and a BatchEngine, with wind fire placed from the
+    batch's candidates, and check that boards, winds, players and candidates agree tile for tile after every step
+    """
+    scalar = [FireTowerGame(seed=seed + k) for k in range(games)]
+    for game in scalar:
+        game.verbose = False
+    batch = BatchEngine.from_games(scalar, seed=seed)
+    for _ in range(steps):
+        candidates = batch.wind_fire_candidates()
+        for k, game in enumerate(scalar):
+            expected = [game.active and game.plan_add_wind_fire(i) is not None for i in range(game.geometry.tiles)]
+            if candidates[k].ravel().tolist() != expected:
+                return False
+            placed = np.flatnonzero(candidates[k])
+            if len(placed):
+                i = int(placed[len(placed) // 2])
+                game.add_wind_fire(game.geometry.points[i])
+                batch.boards[k].flat[i] = FIRE
+        storm_winds, next_winds = batch.random_winds(), batch.random_winds()
+        for k, game in enumerate(scalar):
+            if game.active:
+                game.fire_storm(WINDS[storm_winds[k]], WINDS[next_winds[k]])
+                game.check_for_victory()
+        batch.fire_storm(storm_winds, next_winds)
+        batch.check_for_victory()
+        for k, game in enumerate(scalar):
+            if (batch.statuses(k) != game.board.tiles[:game.geometry.tiles] or bool(batch.active[k]) != game.active
+                    or batch.players_active[k].tolist() != [p.active for p in game.players]
+                    or WINDS[batch.winds[k]] is not game.wind):
+                return False
+    return True
+
+
+def storm_throughput(games: int = 10000, steps: int = 100, seed: int = 0) -> float:
+    """Storm steps per second (one storm in one game being one step) on a batch of fresh games"""
+    batch = BatchEngine(games, seed=seed)
+    start = time.perf_counter()
+    for _ in range(steps):
+        batch.fire_storm()
+    return games * steps / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check the batch engine against the scalar rules and time it')
+    parser.add_argument('--games', type=int, default=10000)
+    parser.add_argument('--steps', type=int, default=100)
+    args = parser.parse_args()
+    print(f'agrees with scalar rules: {check_against_scalar()}')
+    print(f'{storm_throughput(args.games, args.steps):,.0f} storm steps/s')
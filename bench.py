@@ -0,0 +1,198 @@
+from __future__ import annotations
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple, Type
+
+from bots import RandomBot, play_turn
+from firetower import Board, FireTowerGame, SparseBoard, TileStatus
+from simulator import play_game
+
+BOARD_TYPES: Dict[str, Type[Board]] = {'Board': Board, 'SparseBoard': SparseBoard}
+# card methods timed one placement at a time, each from a mid-game position
+CARDS = ('add_wind_fire', 'dozer_line', 'scratch_line', 'de_re_forest', 'flare_up', 'burning_snag', 'explosion',
+         'ember_phase_one', 'fire_truck', 'air_drop', 'smoke_jumper')
+Benchmark = Callable[[], Callable[[], None]]
+
+
+def midgame(board_type: Type[Board], seed: int = 0, turns: int = 12) -> FireTowerGame:
+    """A reproducible position a dozen random turns into a game, still in play"""
+    game = FireTowerGame(board_type=board_type, seed=seed)
+    game.verbose = False
+    bot = RandomBot(seed)
+    for _ in range(turns):
+        checkpoint = game.checkpoint()
+        play_turn(game, bot)
+        if not game.active:
+            game.rollback(checkpoint)
+            break
+    return game
+
+
+def saturated(board_type: Type[Board], seed: int = 0, share: float = 0.6) -> FireTowerGame:
+    """A game with fire on a share of the tiles outside the towers, the worst case for a fire storm"""
+    game = FireTowerGame(board_type=board_type, seed=seed)
+    game.verbose = False
+    rng = random.Random(seed)
+    for i in range(game.geometry.tiles):
+        if i not in game.protected_tiles and rng.random() < share:
+            game.board.put(i, TileStatus.fire)
+    game.journal.clear()
+    return game
+
+
+def card_benchmark(board_type: Type[Board], action: str) -> Benchmark:
+    """Play each legal placement of a card in turn and roll it back again"""
+    def setup():
+        game = midgame(board_type)
+        moves = game.legal_moves((action,)) or [None]
+        checkpoint = game.checkpoint()
+        k = 0
+
+        def run():
+            nonlocal k
+            move = moves[k % len(moves)]
+            k += 1
+            if move is not None:
+                game.apply(move.action, move.point, move.orientation)
+            game.rollback(checkpoint)
+        return run
+    return setup
+
+
+def storm_benchmark(board_type: Type[Board], position: Callable[[Type[Board]], FireTowerGame]) -> Benchmark:
+    """A fire storm in each wind in turn, rolled back after each"""
+    def setup():
+        game = position(board_type)
+        winds = [w for p in game.players for w in p.corner]
+        checkpoint = game.checkpoint()
+        k = 0
+
+        def run():
+            nonlocal k
+            game.fire_storm(winds[k % len(winds)], game.wind)
+            k += 1
+            game.rollback(checkpoint)
+        return run
+    return setup
+
+
+def victory_benchmark(board_type: Type[Board]) -> Benchmark:
+    def setup():
+        return midgame(board_type).check_for_victory
+    return setup
+
+
+def colors_benchmark(board_type: Type[Board]) -> Benchmark:
+    def setup():
+        game = midgame(board_type)
+        return lambda: game.board.get_colors(game.players)
+    return setup
+
+
+def playout_benchmark(board_type: Type[Board]) -> Benchmark:
+    """A whole random game, a different seed each time"""
+    def setup():
+        seeds = iter(range(sys.maxsize))
+        return lambda: play_game(next(seeds), (RandomBot,), board_type=board_type)
+    return setup
+
+
+def benchmarks(board_types: Dict[str, Type[Board]]) -> Dict[str, Tuple[Benchmark, int]]:
+    """Every benchmark by name, with the number of calls making up one timed run"""
+    suite = {}
+    for name, board_type in board_types.items():
+        for action in CARDS:
+            suite[f'{name}/card/{action}'] = card_benchmark(board_type, action), 200
+        suite[f'{name}/fire_storm/sparse'] = storm_benchmark(board_type, midgame), 200
+        suite[f'{name}/fire_storm/saturated'] = storm_benchmark(board_type, saturated), 50
+        suite[f'{name}/check_for_victory'] = victory_benchmark(board_type), 2000
+        suite[f'{name}/get_colors'] = colors_benchmark(board_type), 50
+        suite[f'{name}/playout'] = playout_benchmark(board_type), 2
+    return suite
+
+
+def measure(benchmark: Benchmark, number: int, repeat: int) -> Dict[str, float]:
+    """Seconds per call over `repeat` runs of `number` calls, after one untimed warm-up run"""
+    run = benchmark()
+    for _ in range(number):
+        run()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            run()
+        timings.append((time.perf_counter() - start) / number)
+    return {'min': min(timings), 'median': statistics.median(timings), 'calls': number * repeat}
+
+
+def run_suite(names: Optional[List[str]] = None, repeat: int = 5, scale: float = 1.0,
+              board_types: Dict[str, Type[Board]] = BOARD_TYPES) -> Dict:
+    """
+    Time every benchmark, or those whose name starts with one of the given prefixes, and return the results with
+    enough about the machine to tell whether two runs are comparable
+    """
+    results = {}
+    for name, (benchmark, number) in benchmarks(board_types).items():
+        if names and not any(name.startswith(prefix) for prefix in names):
+            continue
+        results[name] = measure(benchmark, max(1, round(number * scale)), repeat)
+    return {
+        'machine': {'python': platform.python_version(), 'implementation': platform.python_implementation(),
+                    'platform': platform.platform(), 'processor': platform.processor()},
+        'repeat': repeat,
+        'results': results,
+    }
+
+
+def compare(run: Dict, baseline: Dict, tolerance: float = 0.1) -> List[Tuple[str, float]]:
+    """The benchmarks whose best time got slower than the baseline's by more than the tolerance, with the ratio"""
+    regressions = []
+    for name, result in run['results'].items():
+        base = baseline['results'].get(name)
+        if base and base['min'] > 0:
+            ratio = result['min'] / base['min']
+            if ratio > 1 + tolerance:
+                regressions.append((name, ratio))
+    return regressions
+
+
+def report(run: Dict, baseline: Optional[Dict] = None) -> str:
+    lines = []
+    for name, result in run['results'].items():
+        line = f'{name:<40} {result["min"] * 1e6:>12.1f} us  (median {result["median"] * 1e6:.1f})'
+        base = baseline['results'].get(name) if baseline else None
+        if base:
+            line += f'  x{result["min"] / base["min"]:.2f} vs baseline'
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time the engine hot paths and compare against a saved baseline')
+    parser.add_argument('names', nargs='*', help='only run benchmarks starting with these, e.g. SparseBoard/card')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--scale', type=float, default=1.0, help='multiply the calls per timed run')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='compare against the results in this JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='slowdown allowed before flagging, 0.1 is 10%%')
+    args = parser.parse_args()
+
+    results = run_suite(args.names, args.repeat, args.scale)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print(report(results, baseline))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if baseline:
+        regressions = compare(results, baseline, args.tolerance)
+        for name, ratio in regressions:
+            print(f'REGRESSION {name}: {ratio:.2f}x slower')
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,342 @@
+from __future__ import annotations
+import math
+import random
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional, Dict, Tuple, Protocol
+
+from firetower import FireTowerGame, Move, OrientationEnum, Player, Corner
+
+FIRE_PHASE = 'fire'
+CARD_PHASE = 'card'
+FIRE_ACTIONS = ('add_wind_fire',)
+CARD_ACTIONS = tuple(a for a in FireTowerGame.CARD_ACTIONS if a not in FIRE_ACTIONS)
+ORIENTATIONS = tuple(OrientationEnum)
+
+
+class Policy(Protocol):
+    def choose(self, game: FireTowerGame, phase: str) -> Optional[Move]:
+        """Pick a move for the current player in the given phase of their turn, or None to pass"""
+
+
+def phase_actions(game: FireTowerGame, phase: str) -> Tuple[str, ...]:
+    if phase == FIRE_PHASE:
+        return FIRE_ACTIONS
+    if game.action == game.ember_phase_two:
+        return 'ember_phase_two',
+    if game.allowed_actions is not None:
+        return tuple(a for a in CARD_ACTIONS if a in game.allowed_actions)
+    return CARD_ACTIONS
+
+
+def turn_moves(game: FireTowerGame, phase: str) -> List[Optional[Move]]:
+    """
+    The moves open to the current player in a phase of their turn. The wind fire must be placed if it can be,
+    while playing a card is optional, so None (pass) is only offered where passing is allowed
+    """
+    moves: List[Optional[Move]] = game.legal_moves(phase_actions(game, phase))
+    if phase == CARD_PHASE or not moves:
+        moves.append(None)
+    return moves
+
+
+def advance(game: FireTowerGame, phase: str, move: Optional[Move]) -> str:
+    """Play a move (None passes) in the given phase of the current player's turn and return the next phase"""
+    if move is not None:
+        game.apply(move.action, move.point, move.orientation)
+    if not game.active:
+        return phase
+    if phase == FIRE_PHASE:
+        return CARD_PHASE
+    if move is not None and game.action == game.ember_phase_two:
+        return CARD_PHASE
+    game.end_turn()
+    return FIRE_PHASE
+
+
+def play_turn(game: FireTowerGame, policy: Policy):
+    """Let a policy play the current player's whole turn: the wind fire, then a card"""
+    phase = advance(game, FIRE_PHASE, policy.choose(game, FIRE_PHASE))
+    while game.active and phase == CARD_PHASE:
+        phase = advance(game, phase, policy.choose(game, phase))
+
+
+def sample_move(game: FireTowerGame, actions: Tuple[str, ...], rng: random.Random, tries: int = 16) -> Optional[Move]:
+    """A random legal move, found by probing random candidate tiles instead of enumerating every move"""
+    if not actions:
+        return None
+    for _ in range(tries):
+        action = rng.choice(actions)
+        orientation = rng.choice(ORIENTATIONS) if action in game.ORIENTED_ACTIONS else None
+        candidates = game.candidates(action, orientation)
+        if candidates:
+            i = rng.choice(candidates)
+            if getattr(game, f'plan_{action}')(i, orientation) is not None:
+                return Move(action, game.geometry.points[i], orientation)
+    return None
+
+
+def random_move(game: FireTowerGame, phase: str, rng: random.Random) -> Optional[Move]:
+    """
+    A random move by sample_move, except that the compulsory wind fire is only ever passed when it can't be placed:
+    if the probes miss, the fire phase falls back to drawing from every legal placement
+    """
+    move = sample_move(game, phase_actions(game, phase), rng)
+    if move is None and phase == FIRE_PHASE:
+        moves = game.legal_moves(FIRE_ACTIONS)
+        if moves:
+            move = rng.choice(moves)
+    return move
+
+
+_tower_bounds: Dict[Tuple[int, Corner], Tuple[int, int, int, int]] = {}
+
+
+def tower_distance(game: FireTowerGame, player: Player) -> int:
+    """Manhattan distance from the nearest fire to the player's tower area, 0 once fire is inside it"""
+    key = (game.geometry.size, player.corner)
+    bounds = _tower_bounds.get(key)
+    if bounds is None:
+        tower = [game.geometry.points[i] for i in game.geometry.towers[player.corner]]
+        bounds = _tower_bounds[key] = (min(p.x for p in tower), max(p.x for p in tower),
+                                       min(p.y for p in tower), max(p.y for p in tower))
+    x_lo, x_hi, y_lo, y_hi = bounds
+    points = game.geometry.points
+    best = 2 * game.geometry.size
+    for i in game.board.fire_tiles:
+        x, y = points[i]
+        distance = max(x_lo - x, 0, x - x_hi) + max(y_lo - y, 0, y - y_hi)
+        if distance < best:
+            best = distance
+    return best
+
+
+def tower_threat(game: FireTowerGame, player: Player) -> int:
+    """
+    Fire placements still needed to reach the player's tower. Read from the game's threat maps when it keeps them,
+    which route around firebreaks; otherwise the plain tower_distance
+    """
+    threats = game.board.threats
+    return threats.threat(player.corner) if threats is not None else tower_distance(game, player)
+
+
+def evaluate(game: FireTowerGame) -> List[float]:
+    """
+    A value in [0, 1] for each player slot. A finished game scores 1 for the winner and 0 for everyone else;
+    otherwise fire approaching the other players' towers is good for a player and fire approaching its own is bad
+    """
+    players = list(game.players)
+    if not game.active:
+        return [1.0 if p.active else 0.0 for p in players]
+    danger = [1.0 / (1 + tower_threat(game, p)) if p.active else 1.0 for p in players]
+    values = []
+    for k, p in enumerate(players):
+        if not p.active:
+            values.append(0.0)
+            continue
+        others = [d for j, d in enumerate(danger) if j != k]
+        values.append(0.5 + 0.5 * (sum(others) / len(others) - danger[k]))
+    return values
+
+
+def rollout(game: FireTowerGame, phase: str, turns: int, rng: random.Random, storm_chance: float) -> List[float]:
+    """Play random moves for a number of turns, with the odd fire storm between turns, then evaluate"""
+    played = 0
+    while game.active and played < turns:
+        phase = advance(game, phase, random_move(game, phase, rng))
+        if not game.active:
+            break
+        if phase == FIRE_PHASE:
+            played += 1
+            if rng.random() < storm_chance:
+                game.fire_storm()
+                game.check_for_victory()
+    return evaluate(game)
+
+
+@dataclass
+class SearchStats:
+    iterations: int = 0
+    playouts: int = 0
+    seconds: float = 0.0
+
+    @property
+    def playouts_per_second(self) -> float:
+        return self.playouts / self.seconds if self.seconds else 0.0
+
+    def __add__(self, other: SearchStats) -> SearchStats:
+        return SearchStats(self.iterations + other.iterations, self.playouts + other.playouts,
+                           max(self.seconds, other.seconds))
+
+
+class Node:
+    __slots__ = ('move', 'parent', 'mover', 'children', 'untried', 'visits', 'value')
+
+    def __init__(self, move: Optional[Move], parent: Optional[Node], mover: Optional[int]):
+        self.move = move
+        self.parent = parent
+        self.mover = mover
+        self.children: List[Node] = []
+        self.untried: Optional[List[Optional[Move]]] = None
+        self.visits = 0
+        self.value = 0.0
+
+    def best_child(self, exploration: float) -> Node:
+        log_visits = math.log(self.visits)
+        return max(self.children,
+                   key=lambda c: c.value / c.visits + exploration * math.sqrt(log_visits / c.visits))
+
+
+RootStats = Dict[Optional[Move], Tuple[int, float]]
+
+
+def run_search(game: FireTowerGame, phase: str, iterations: Optional[int], time_limit: Optional[float],
+               exploration: float, rollout_turns: int, storm_chance: float, seed: int) -> Tuple[RootStats, SearchStats]:
+    """
+    One UCT search from the given position, returning the visits and value of each root move.
+    Moves are played and rolled back on a private copy of the game through its journal, so nothing is copied per node
+    """
+    rng = random.Random(seed)
+    game = game.copy()
+    game.verbose = False
+    root = Node(None, None, None)
+    checkpoint = game.checkpoint()
+    stats = SearchStats()
+    start = time.perf_counter()
+    deadline = start + time_limit if time_limit is not None else None
+    while ((iterations is None or stats.iterations < iterations)
+           and (deadline is None or time.perf_counter() < deadline)):
+        node = root
+        node_phase = phase
+        while node.untried == [] and node.children and game.active:
+            node = node.best_child(exploration)
+            node_phase = advance(game, node_phase, node.move)
+        if game.active:
+            if node.untried is None:
+                node.untried = turn_moves(game, node_phase)
+            if node.untried:
+                move = node.untried.pop(rng.randrange(len(node.untried)))
+                mover = game.turn
+                node_phase = advance(game, node_phase, move)
+                child = Node(move, node, mover)
+                node.children.append(child)
+                node = child
+        values = rollout(game, node_phase, rollout_turns, rng, storm_chance)
+        stats.playouts += 1
+        while node is not None:
+            node.visits += 1
+            if node.mover is not None:
+                node.value += values[node.mover]
+            node = node.parent
+        game.rollback(checkpoint)
+        stats.iterations += 1
+    stats.seconds = time.perf_counter() - start
+    return {c.move: (c.visits, c.value) for c in root.children}, stats
+
+
+class RandomBot:
+    """
+    Plays a random legal move: a random card action on a random candidate tile, passing if none is found. The wind
+    fire is placed whenever it can be
+    """
+
+    def __init__(self, seed: Optional[int] = None):
+        self.rng = random.Random(seed)
+
+    def choose(self, game: FireTowerGame, phase: str) -> Optional[Move]:
+        return random_move(game, phase, self.rng)
+
+
+class ThreatBot:
+    """
+    A greedy player trying each move open to it on a private copy of the game and keeping the one that evaluate
+    scores best on the copy's threat maps, which are repaired move by move rather than rebuilt.
+    With samples set, only that many randomly drawn moves are tried per decision
+    """
+
+    def __init__(self, samples: Optional[int] = None, seed: Optional[int] = None):
+        self.samples = samples
+        self.rng = random.Random(seed)
+
+    def choose(self, game: FireTowerGame, phase: str) -> Optional[Move]:
+        moves = turn_moves(game, phase)
+        self.rng.shuffle(moves)
+        if self.samples is not None:
+            moves = moves[:self.samples]
+        seat = game.turn
+        game = game.copy()
+        game.verbose = False
+        game.track_threats()
+        checkpoint = game.checkpoint()
+        best, best_value = None, -1.0
+        for move in moves:
+            if move is not None:
+                game.apply(move.action, move.point, move.orientation)
+            value = evaluate(game)[seat]
+            game.rollback(checkpoint)
+            if value > best_value:
+                best, best_value = move, value
+        return best
+
+
+class MCTSBot:
+    """
+    A Monte Carlo tree search player. Each decision gets an iteration and/or time budget; with workers > 1 the
+    search runs as independent trees on a thread or process pool whose root statistics are merged.
+    The throughput of the last decision is kept in `stats`
+    """
+
+    def __init__(self, iterations: Optional[int] = None, time_limit: Optional[float] = None,
+                 exploration: float = 1.4, rollout_turns: int = 4, storm_chance: float = 0.1, workers: int = 1,
+                 pool: str = 'thread', seed: Optional[int] = None):
+        if pool not in {'thread', 'process'}:
+            raise ValueError(f'{pool} is not a pool type, expecting thread or process')
+        self.iterations = iterations if iterations is not None or time_limit is not None else 200
+        self.time_limit = time_limit
+        self.exploration = exploration
+        self.rollout_turns = rollout_turns
+        self.storm_chance = storm_chance
+        self.workers = workers
+        self.pool = pool
+        self.rng = random.Random(seed)
+        self.stats = SearchStats()
+        self._executor: Optional[Executor] = None
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            executor_type = ThreadPoolExecutor if self.pool == 'thread' else ProcessPoolExecutor
+            self._executor = executor_type(max_workers=self.workers)
+        return self._executor
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def choose(self, game: FireTowerGame, phase: str) -> Optional[Move]:
+        if self.workers <= 1:
+            root, self.stats = self._search(game, phase, self.iterations)
+        else:
+            share = -(-self.iterations // self.workers) if self.iterations is not None else None
+            # a copy leaves out the listeners, hooks and journal, which a process pool would otherwise pickle
+            position = game.copy()
+            futures = [self.executor.submit(run_search, position, phase, share, self.time_limit, self.exploration,
+                                            self.rollout_turns, self.storm_chance, self.rng.getrandbits(32))
+                       for _ in range(self.workers)]
+            root = {}
+            self.stats = SearchStats()
+            for future in futures:
+                worker_root, worker_stats = future.result()
+                self.stats += worker_stats
+                for move, (visits, value) in worker_root.items():
+                    total_visits, total_value = root.get(move, (0, 0.0))
+                    root[move] = (total_visits + visits, total_value + value)
+        if not root:
+            return None
+        return max(root, key=lambda m: root[m][0])
+
+    def _search(self, game: FireTowerGame, phase: str, iterations: Optional[int]) -> Tuple[RootStats, SearchStats]:
+        return run_search(game, phase, iterations, self.time_limit, self.exploration, self.rollout_turns,
+                          self.storm_chance, self.rng.getrandbits(32))
@@ -0,0 +1,224 @@
+from __future__ import annotations
+import random
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from bots import CARD_PHASE, FIRE_PHASE, Policy
+from firetower import Card, CardTypeEnum, FireTowerGame, OrientationEnum, Point
+from simulator import PLAYER_COUNTS
+
+# name, type, the game method the card plays and how many are in the deck
+DECK_LIST: Tuple[Tuple[str, CardTypeEnum, str, int], ...] = (
+    ('Fire Truck', CardTypeEnum.water, 'fire_truck', 3),
+    ('Air Drop', CardTypeEnum.water, 'air_drop', 3),
+    ('Smoke Jumpers', CardTypeEnum.water, 'smoke_jumper', 3),
+    ('Flare Up', CardTypeEnum.fire, 'flare_up', 4),
+    ('Burning Snag', CardTypeEnum.fire, 'burning_snag', 3),
+    ('Explosion', CardTypeEnum.fire, 'explosion', 2),
+    ('Ember', CardTypeEnum.fire, 'ember_phase_one', 3),
+    ('Dozer Line', CardTypeEnum.firebreak, 'dozer_line', 4),
+    ('Scratch Line', CardTypeEnum.firebreak, 'scratch_line', 4),
+    ('De/Re-Forest', CardTypeEnum.firebreak, 'de_re_forest', 4),
+    ('Wind Change', CardTypeEnum.wind, 'roll_wind', 6),
+    ('Firestorm', CardTypeEnum.special, 'fire_storm', 1),
+)
+# cards played without picking a tile
+UNTARGETED = frozenset({'roll_wind', 'fire_storm'})
+HAND_SIZE = 5
+
+
+def build_cards(game: FireTowerGame) -> List[Card]:
+    """One Card per card in DECK_LIST, bound to the game's action methods"""
+    cards = []
+    for name, card_type, action, count in DECK_LIST:
+        method = getattr(game, action)
+        description = ' '.join((method.__doc__ or name).split())
+        cards.extend(Card(name, description, card_type, '', method) for _ in range(count))
+    return cards
+
+
+class Deck:
+    """
+    The cards of one game as a fixed table, with the draw pile, discard pile and hands held as arrays of indices
+    into it. Draws and discards are O(1); shuffles are Fisher-Yates on the game's random generator, so a game's
+    seed fixes every deal. Firestorm cards are buried in the bottom half of the draw pile after each shuffle
+    """
+
+    def __init__(self, game: FireTowerGame, players: int, hand_size: int = HAND_SIZE):
+        self.rng: random.Random = game.rng
+        self.cards = build_cards(game)
+        self.storms = [k for k, card in enumerate(self.cards) if card.action.__name__ == 'fire_storm']
+        self.draw_pile = array('H', (k for k in range(len(self.cards)) if k not in self.storms))
+        self.discard_pile = array('H')
+        self.shuffle(self.draw_pile)
+        self.hands = [array('H', (self.draw_pile.pop() for _ in range(hand_size))) for _ in range(players)]
+        for k in self.storms:
+            self.bury(k)
+
+    def shuffle(self, pile: array):
+        for i in range(len(pile) - 1, 0, -1):
+            j = self.rng.randrange(i + 1)
+            pile[i], pile[j] = pile[j], pile[i]
+
+    def bury(self, k: int):
+        """Put a card somewhere in the bottom half of the draw pile, whose top is its end"""
+        self.draw_pile.append(k)
+        j = self.rng.randrange(len(self.draw_pile) // 2 + 1)
+        self.draw_pile[-1], self.draw_pile[j] = self.draw_pile[j], self.draw_pile[-1]
+
+    def reshuffle(self):
+        """Turn the discard pile into a fresh draw pile"""
+        storms = [k for k in self.discard_pile if k in self.storms]
+        self.draw_pile = array('H', (k for k in self.discard_pile if k not in self.storms))
+        self.discard_pile = array('H')
+        self.shuffle(self.draw_pile)
+        for k in storms:
+            self.bury(k)
+
+    def draw(self) -> Optional[int]:
+        """The top card of the draw pile, reshuffling the discards if it ran out, or None if both are empty"""
+        if not self.draw_pile:
+            self.reshuffle()
+        return self.draw_pile.pop() if self.draw_pile else None
+
+    def discard(self, seat: int, position: int) -> Card:
+        """Move a card from a hand to the discard pile"""
+        hand = self.hands[seat]
+        k = hand.pop(position)
+        self.discard_pile.append(k)
+        return self.cards[k]
+
+    def hand(self, seat: int) -> List[Card]:
+        return [self.cards[k] for k in self.hands[seat]]
+
+
+class TurnEngine:
+    """
+    Sequences whole turns of a game with cards. Each turn the current player places the wind fire, then plays one
+    card from their hand on a tile or discards one, then draws back up to a full hand. A drawn Firestorm sets off a
+    fire storm at once and is discarded; the wind is rolled again between turns if wind_rolls is set
+    """
+
+    def __init__(self, game: FireTowerGame, hand_size: int = HAND_SIZE, wind_rolls: bool = True):
+        self.game = game
+        self.hand_size = hand_size
+        self.wind_rolls = wind_rolls
+        self.deck = Deck(game, len(list(game.players)), hand_size)
+        self.turns = 0
+        self.played: Dict[str, int] = {}
+        self.restrict()
+
+    @property
+    def seat(self) -> int:
+        return self.game.turn
+
+    def hand(self, seat: Optional[int] = None) -> List[Card]:
+        return self.deck.hand(self.seat if seat is None else seat)
+
+    def restrict(self):
+        """Limit the card phase of the current player to the actions on the cards in their hand"""
+        self.game.allowed_actions = frozenset(card.action.__name__ for card in self.hand())
+
+    def place_wind_fire(self, point: Point) -> bool:
+        return self.play_action('add_wind_fire', point)
+
+    def play_action(self, action: str, point: Optional[Point] = None,
+                    orientation: Optional[OrientationEnum] = None) -> bool:
+        """Play an action on the game, returning whether it went through"""
+        game = self.game
+        game.rejected = False
+        if action in UNTARGETED:
+            getattr(game, action)()
+            game.check_for_victory()
+            game.journal.commit()
+        else:
+            game.apply(action, point, orientation)
+        return not game.rejected
+
+    def play_card(self, position: int, point: Optional[Point] = None,
+                  orientation: Optional[OrientationEnum] = None) -> bool:
+        """
+        Play the card at a position in the current player's hand. A rejected placement leaves the card in the hand;
+        a played one is discarded. After an Ember, the game waits for the ember_phase_two placement
+        """
+        k = self.deck.hands[self.seat][position]
+        action = self.deck.cards[k].action.__name__
+        if not self.play_action(action, point, orientation):
+            return False
+        self.played[action] = self.played.get(action, 0) + 1
+        self.deck.discard(self.seat, position)
+        return True
+
+    def discard(self, position: int) -> Card:
+        return self.deck.discard(self.seat, position)
+
+    def end_turn(self):
+        """Refill the current player's hand, resolving any Firestorm drawn, then hand over to the next player"""
+        game = self.game
+        hand = self.deck.hands[self.seat]
+        while len(hand) < self.hand_size and game.active:
+            k = self.deck.draw()
+            if k is None:
+                break
+            if k in self.deck.storms:
+                self.deck.discard_pile.append(k)
+                self.play_action('fire_storm')
+                self.played['fire_storm'] = self.played.get('fire_storm', 0) + 1
+            else:
+                hand.append(k)
+        if game.active:
+            game.end_turn()
+            if self.wind_rolls:
+                game.roll_wind()
+        self.turns += 1
+        self.restrict()
+
+    def play_turn(self, policy: Policy):
+        """
+        Let a policy play the current player's turn. Its card phase choice is limited to the actions in hand; a pass
+        plays a held Wind Change, or else discards the oldest card
+        """
+        game = self.game
+        move = policy.choose(game, FIRE_PHASE)
+        if move is not None:
+            self.place_wind_fire(move.point)
+        if game.active:
+            self.restrict()
+            move = policy.choose(game, CARD_PHASE)
+            if move is not None and self.play_card(self.position(move.action), move.point, move.orientation):
+                while game.active and game.action == game.ember_phase_two:
+                    move = policy.choose(game, CARD_PHASE)
+                    if move is None or not self.play_action(move.action, move.point, move.orientation):
+                        break
+            else:
+                self.pass_turn()
+        if game.active:
+            self.end_turn()
+
+    def position(self, action: str) -> int:
+        hand = self.deck.hands[self.seat]
+        return next(p for p, k in enumerate(hand) if self.deck.cards[k].action.__name__ == action)
+
+    def pass_turn(self):
+        hand = self.hand()
+        for position, card in enumerate(hand):
+            if card.action.__name__ == 'roll_wind':
+                self.play_card(position)
+                return
+        if hand:
+            self.discard(0)
+
+    def run(self, policies: Sequence[Policy], max_turns: int = 200) -> int:
+        """Play turns with a policy per seat until the game ends or max_turns have passed, returning the turns played"""
+        while self.game.active and self.turns < max_turns:
+            self.play_turn(policies[self.seat % len(policies)])
+        return self.turns
+
+
+def play_game(seed: int, policies: Sequence[Policy], max_turns: int = 200, **engine_args) -> TurnEngine:
+    """A whole game with cards between a policy per seat, e.g. play_game(1, [RandomBot(1), RandomBot(2)])"""
+    game = FireTowerGame(PLAYER_COUNTS[len(policies)](), seed=seed)
+    game.verbose = False
+    engine = TurnEngine(game, **engine_args)
+    engine.run(policies, max_turns)
+    return engine
@@ -1,13 +1,23 @@
 from __future__ import annotations
+import copy
+import functools
+import heapq
 import random
-from collections import deque
+import time
+import warnings
+from collections import Counter, deque, OrderedDict
+from contextlib import nullcontext
 from dataclasses import dataclass
 from enum import Enum
-from typing import List, Union, Callable, Set, Any, Optional, Dict, NamedTuple, Tuple, Iterable
+from typing import (List, Union, Callable, Set, Any, Optional, Dict, NamedTuple, Tuple, Iterable, FrozenSet, Type,
+                    Sequence, TYPE_CHECKING)
 
-import PySimpleGUI as sg
 from frozendict import frozendict
 
+if TYPE_CHECKING:
+    import PySimpleGUI as sg
+    from instrument import LoopProfiler
+
 
 class classproperty:
     """
@@ -70,6 +80,11 @@ class WindDir(Enum):
         }.get(self)
 
 
+def warn_default_size(name: str, replacement: str):
+    warnings.warn(f'{name} assumes a {FireTowerGame.BOARD_SIZE}x{FireTowerGame.BOARD_SIZE} board, use '
+                  f'{replacement}(game.geometry) instead', DeprecationWarning, stacklevel=3)
+
+
 class Corner:
     def __init__(self, y_wind: WindDir, x_wind: WindDir):
         if x_wind not in {WindDir.W, WindDir.E}:
@@ -79,19 +94,28 @@ class Corner:
         self.x_wind = x_wind
         self.y_wind = y_wind
 
+    def point_on(self, geometry: Geometry) -> Point:
+        """The corner tile on a board with the given geometry, e.g. a game's own"""
+        return geometry.corner_point(self)
+
+    def tower_on(self, geometry: Geometry) -> Set[Point]:
+        return {geometry.points[i] for i in geometry.towers[self]}
+
     @property
     def point(self) -> Point:
-        x = 0 if self.x_wind is WindDir.W else FireTowerGame.BOARD_SIZE - 1
-        y = 0 if self.y_wind is WindDir.N else FireTowerGame.BOARD_SIZE - 1
-        return Point(x, y)
+        """Deprecated: the corner tile on a board of the default size only, whatever the game's size"""
+        warn_default_size('Corner.point', 'point_on')
+        return self.point_on(Geometry.of(FireTowerGame.BOARD_SIZE))
 
     @property
     def tower(self) -> Set[Point]:
-        x_range = range(0, 3) if self.x_wind is WindDir.W else range(FireTowerGame.BOARD_SIZE - 3,
-                                                                     FireTowerGame.BOARD_SIZE)
-        y_range = range(0, 3) if self.y_wind is WindDir.N else range(FireTowerGame.BOARD_SIZE - 3,
-                                                                     FireTowerGame.BOARD_SIZE)
-        return FireTowerGame.get_board_range(x_range, y_range)
+        """Deprecated: the tower tiles on a board of the default size only"""
+        warn_default_size('Corner.tower', 'tower_on')
+        return self.tower_on(Geometry.of(FireTowerGame.BOARD_SIZE))
+
+    @property
+    def name(self) -> str:
+        return f'{self.y_wind.name}{self.x_wind.name}'
 
     def __iter__(self):
         return iter([self.y_wind, self.x_wind])
@@ -116,13 +140,23 @@ class Player:
     corner: Corner
     active: bool = True
 
+    def point_on(self, geometry: Geometry) -> Point:
+        return self.corner.point_on(geometry)
+
+    def tower_on(self, geometry: Geometry) -> Set[Point]:
+        return self.corner.tower_on(geometry)
+
     @property
-    def point(self):
-        return self.corner.point
+    def point(self) -> Point:
+        """Deprecated: the corner tile on a board of the default size only, whatever the game's size"""
+        warn_default_size('Player.point', 'point_on')
+        return self.point_on(Geometry.of(FireTowerGame.BOARD_SIZE))
 
     @property
-    def tower(self):
-        return self.corner.tower
+    def tower(self) -> Set[Point]:
+        """Deprecated: the tower tiles on a board of the default size only"""
+        warn_default_size('Player.tower', 'tower_on')
+        return self.tower_on(Geometry.of(FireTowerGame.BOARD_SIZE))
 
 
 @dataclass
@@ -138,9 +172,8 @@ class Players:
     @classmethod
     def get_players(cls, players: List[Optional[Player]]):
         """Given a list of players in slots, fill in empty slots with default values and return the list of players"""
-        corners = {*CORNERS}
         taken_corners = {p.corner for p in players if p is not None}
-        corners = deque(corners - taken_corners)
+        corners = deque(c for c in CORNERS if c not in taken_corners)
         return [p or Player(f'Player {i + 1}', corners.popleft()) for i, p in enumerate(players)]
 
     @classmethod
@@ -179,53 +212,509 @@ class OrientationEnum(Enum):
             return OrientationEnum.h
 
 
+class LazyTable:
+    """A read-only sequence that computes each entry from its index, standing in for a table too big to build"""
+    __slots__ = ('entry', 'length')
+
+    def __init__(self, entry: Callable[[int], Any], length: int):
+        self.entry = entry
+        self.length = length
+
+    def __getitem__(self, i: int) -> Any:
+        if not 0 <= i < self.length:
+            raise IndexError(i)
+        return self.entry(i)
+
+    def __len__(self) -> int:
+        return self.length
+
+
+class Geometry:
+    """
+    Integer tile-index tables for a square board, built once per board size.
+    Tile (x, y) has index y * size + x. Index `size * size` is the off-board sentinel: every neighbour lookup
+    that walks off the board lands there, and the sentinel's own neighbours are the sentinel again.
+    Boards over DENSE_TILES tiles get LazyTables computing entries on lookup instead of prebuilt tuples
+    """
+    DENSE_TILES = 1 << 16
+    _cache: Dict[int, Geometry] = {}
+
+    def __init__(self, size: int):
+        self.size = size
+        self.tiles = size * size
+        self.off_board = off = self.tiles
+        dense = self.tiles <= self.DENSE_TILES
+
+        def table(entry: Callable[[int], Any], length: int = self.tiles + 1):
+            return tuple(map(entry, range(length))) if dense else LazyTable(entry, length)
+
+        self.points: Sequence[Point] = table(lambda i: Point(i % size, i // size), self.tiles)
+        self.left = left = table(lambda i: i - 1 if i % size else off)
+        self.right = right = table(lambda i: i + 1 if i % size < size - 1 and i < off else off)
+        self.up = up = table(lambda i: i - size if size <= i < off else off)
+        self.down = down = table(lambda i: i + size if i < off - size else off)
+
+        self.orthogonal = table(lambda i: (left[i], right[i], up[i], down[i]))
+        self.surrounding = table(lambda i: (left[up[i]], up[i], right[up[i]], left[i], right[i], left[down[i]],
+                                            down[i], right[down[i]]))
+        self.squares = table(lambda i: (i, right[i], down[i], right[down[i]]))
+
+        forward = {OrientationEnum.h: right, OrientationEnum.v: down}
+        self.pairs = {o: table(lambda i, step=step: (i, step[i])) for o, step in forward.items()}
+        self.gaps = {o: table(lambda i, step=step: (i, step[step[i]])) for o, step in forward.items()}
+        self.lines = {o: table(lambda i, step=step: (i, step[i], step[step[i]])) for o, step in forward.items()}
+
+        self.backward = {OrientationEnum.h: left, OrientationEnum.v: up}
+        self.step = {WindDir.N: up, WindDir.S: down, WindDir.W: left, WindDir.E: right}
+        self.upwind = {WindDir.N: down, WindDir.S: up, WindDir.W: right, WindDir.E: left}
+
+        self.corners = {c: self.index(self.corner_point(c)) for c in CORNERS}
+        self.towers = {c: frozenset(self._range(self._edge_range(c.x_wind), self._edge_range(c.y_wind)))
+                       for c in CORNERS}
+        middle = range(size // 2 - 1, size // 2 + 1)
+        self.eternal_flame = frozenset(self._range(middle, middle))
+
+    @classmethod
+    def of(cls, size: int) -> Geometry:
+        """Get the shared geometry for a board size, building it on first use"""
+        geometry = cls._cache.get(size)
+        if geometry is None:
+            geometry = cls._cache[size] = cls(size)
+        return geometry
+
+    def __reduce__(self):
+        return Geometry.of, (self.size,)
+
+    def index(self, point: Point) -> int:
+        x, y = point
+        if 0 <= x < self.size and 0 <= y < self.size:
+            return y * self.size + x
+        return self.off_board
+
+    def corner_point(self, corner: Corner) -> Point:
+        x = 0 if corner.x_wind is WindDir.W else self.size - 1
+        y = 0 if corner.y_wind is WindDir.N else self.size - 1
+        return Point(x, y)
+
+    def _edge_range(self, wind: WindDir) -> range:
+        return range(0, 3) if wind in {WindDir.W, WindDir.N} else range(self.size - 3, self.size)
+
+    def _range(self, x_range: range, y_range: range) -> List[int]:
+        return [y * self.size + x for x in x_range for y in y_range]
+
+
+def splitmix64(seed: int, i: int) -> int:
+    """A well-mixed 64-bit key for index i, used in place of stored random keys on very large boards"""
+    x = (seed + (i + 1) * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+    return x ^ (x >> 31)
+
+
+class Zobrist:
+    """
+    Fixed 64-bit random keys for Zobrist hashing, shared by every game with the same board size.
+    The keys come from a seeded generator, so hashes agree across processes and runs
+    """
+    _cache: Dict[int, Zobrist] = {}
+
+    def __init__(self, size: int):
+        rng = random.Random(f'zobrist-{size}')
+        tiles = size * size + 1
+        if tiles <= Geometry.DENSE_TILES:
+            self.tiles = {status: tuple(rng.getrandbits(64) for _ in range(tiles))
+                          for status in (TileStatus.fire, TileStatus.tree, TileStatus.firebreak)}
+        else:
+            self.tiles = {status: LazyTable(functools.partial(splitmix64, rng.getrandbits(64)), tiles)
+                          for status in (TileStatus.fire, TileStatus.tree, TileStatus.firebreak)}
+        self.winds = {wind: rng.getrandbits(64) for wind in WindDir}
+        self.orientations = {orientation: rng.getrandbits(64) for orientation in OrientationEnum}
+        self.corners = {corner: rng.getrandbits(64) for corner in CORNERS}
+        self.turns = tuple(rng.getrandbits(64) for _ in CORNERS)
+        self.size = size
+        self._actions: Dict[str, int] = {}
+
+    def __reduce__(self):
+        return Zobrist.of, (self.size,)
+
+    @classmethod
+    def of(cls, size: int) -> Zobrist:
+        keys = cls._cache.get(size)
+        if keys is None:
+            keys = cls._cache[size] = cls(size)
+        return keys
+
+    def action(self, name: str) -> int:
+        key = self._actions.get(name)
+        if key is None:
+            key = self._actions[name] = random.Random(f'zobrist-action-{name}').getrandbits(64)
+        return key
+
+
+class TranspositionTable:
+    """An LRU-bounded cache of analysis results keyed on game hashes"""
+
+    def __init__(self, capacity: int = 1 << 16):
+        self.capacity = capacity
+        self.entries: OrderedDict[int, Any] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: int, default: Any = None) -> Any:
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        self.misses += 1
+        return default
+
+    def put(self, key: int, value: Any):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key: int) -> bool:
+        return key in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+Delta = Tuple[Any, Union[int, str], Any, Any]
+
+
+class Journal:
+    """
+    A log of state changes, each a small (target, key, old, new) delta, grouped into undoable steps.
+    An int key is a tile index on a Board target, a str key is an attribute name on any other target
+    """
+
+    def __init__(self):
+        self.done: List[List[Delta]] = []
+        self.undone: List[List[Delta]] = []
+        self.pending: List[Delta] = []
+        self.recording = True
+
+    def record(self, target: Any, key: Union[int, str], old: Any, new: Any):
+        if self.recording and old != new:
+            self.pending.append((target, key, old, new))
+
+    def commit(self) -> int:
+        """Close the pending deltas into a step, which discards anything that could be redone"""
+        if self.pending:
+            self.done.append(self.pending)
+            self.pending = []
+            self.undone.clear()
+        return len(self.done)
+
+    def clear(self):
+        self.done.clear()
+        self.undone.clear()
+        self.pending = []
+
+    def _restore(self, step: List[Delta], forward: bool):
+        self.recording = False
+        try:
+            for target, key, old, new in (step if forward else reversed(step)):
+                value = new if forward else old
+                if isinstance(key, int):
+                    target.put(key, value)
+                else:
+                    setattr(target, key, value)
+        finally:
+            self.recording = True
+
+    def undo(self) -> bool:
+        self.commit()
+        if not self.done:
+            return False
+        step = self.done.pop()
+        self._restore(step, forward=False)
+        self.undone.append(step)
+        return True
+
+    def redo(self) -> bool:
+        self.commit()
+        if not self.undone:
+            return False
+        step = self.undone.pop()
+        self._restore(step, forward=True)
+        self.done.append(step)
+        return True
+
+    def checkpoint(self) -> int:
+        """A marker for the current state, which rollback can return to"""
+        return self.commit()
+
+    def rollback(self, checkpoint: int):
+        """Undo and discard steps until the journal is back at the given checkpoint"""
+        self.commit()
+        while len(self.done) > checkpoint:
+            self._restore(self.done.pop(), forward=False)
+
+
+Plan = List[Tuple[int, TileStatus]]
+
+
+class Move(NamedTuple):
+    action: str
+    point: Point
+    orientation: Optional[OrientationEnum] = None
+
+
+class GameEvent(NamedTuple):
+    """Something that happened to a game, as passed to its listeners after the game has been updated"""
+    kind: str  # 'play', 'fire_storm', 'roll_wind' or 'end_turn'
+    action: Optional[str] = None
+    point: Optional[Point] = None
+    orientation: Optional[OrientationEnum] = None
+    storm_wind: Optional[WindDir] = None
+
+
+class ActionRecord(NamedTuple):
+    """How one call into the game went, as passed to its hooks"""
+    action: str
+    seconds: float
+    tiles_changed: int
+    rejected: bool
+
+
+def timed(name: Union[str, Callable[..., str]]):
+    """
+    Report calls of a game method to the game's hooks as an ActionRecord named by name, or by calling name with the
+    method's arguments. Costs one check when the game has no hooks; calls made from another timed call aren't reported
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(game: FireTowerGame, *args, **kwargs):
+            if not game.hooks or game.timing:
+                return method(game, *args, **kwargs)
+            action = name if isinstance(name, str) else name(game, *args, **kwargs)
+            game.timing = True
+            game.rejected = False
+            writes = game.board.writes
+            start = time.perf_counter()
+            try:
+                return method(game, *args, **kwargs)
+            finally:
+                record = ActionRecord(action, time.perf_counter() - start, game.board.writes - writes, game.rejected)
+                game.timing = False
+                for hook in game.hooks:
+                    hook(game, record)
+        return wrapper
+    return decorator
+
+
 class FireTowerGame:
     BOARD_SIZE = 16
+    CARD_ACTIONS = ('add_wind_fire', 'dozer_line', 'scratch_line', 'de_re_forest', 'flare_up', 'burning_snag',
+                    'explosion', 'ember_phase_one', 'fire_truck', 'air_drop', 'smoke_jumper')
+    ORIENTED_ACTIONS = frozenset({'dozer_line', 'scratch_line', 'flare_up', 'air_drop'})
 
     @staticmethod
     def get_board_range(x_range: range, y_range: range) -> Set[Point]:
         return {Point(int(x), int(y)) for x in x_range for y in y_range}
 
-    @classproperty
-    def eternal_flame(cls) -> Set[Point]:
-        return cls.get_board_range(x_range=range(int(cls.BOARD_SIZE / 2 - 1), int(cls.BOARD_SIZE / 2 + 1)),
-                                   y_range=range(int(cls.BOARD_SIZE / 2 - 1), int(cls.BOARD_SIZE / 2 + 1)))
+    @property
+    def eternal_flame(self) -> Set[Point]:
+        """The centre tiles that are always on fire, on this game's board"""
+        return {self.geometry.points[i] for i in self.geometry.eternal_flame}
 
-    def __init__(self):
+    def __init__(self, players: Optional[Players] = None, board_type: Optional[Type[Board]] = None,
+                 seed: Optional[Any] = None, size: Optional[int] = None):
+        """
+        A headless game state. Drive it with apply/update, or attach a FireTowerGUI to play in a window.
+        board_type selects the board backend, a plain Board by default, or SparseBoard for very large boards. size is the board's width, BOARD_SIZE by default.
+        Wind rolls and fire storms draw from the game's own random generator, seeded with seed
+        """
+        if size is not None and size < 8:
+            raise ValueError(f'a {size}x{size} board has no room between the towers, expecting 8 or more')
         self.active = True
-        self.board = Board({Point(r, c): TileStatus.tree for r in range(0, self.BOARD_SIZE)
-                            for c in range(0, self.BOARD_SIZE)})
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.listeners: List[Callable[[FireTowerGame, GameEvent], Any]] = []
+        self.hooks: List[Callable[[FireTowerGame, ActionRecord], Any]] = []
+        self.allowed_actions: Optional[FrozenSet[str]] = None
+        self.timing = False
+        self.rejected = False
+        self.verbose = True
+        self.journal = Journal()
+        self.geometry = Geometry.of(size or self.BOARD_SIZE)
+        self.board = (board_type or Board)(self.geometry)
+        self.board.journal = self.journal
+
+        for i in self.geometry.eternal_flame:
+            self.board.put(i, TileStatus.fire)
+
+        self.players = players or Players.four_player()
+        self.tower_tiles = frozenset().union(*[self.geometry.towers[p.corner] for p in self.players])
+        self.protected_tiles = self.tower_tiles | self.geometry.eternal_flame
+        self.corner_tiles = frozenset(self.geometry.corners[p.corner] for p in self.players)
+        self.turn = 0
+
+        self.zobrist = Zobrist.of(self.geometry.size)
+        self._wind = None
+        self._action = self.add_wind_fire
+        self._orientation = OrientationEnum.h
+        self._state_hash = self.zobrist.action(self._action.__name__) ^ self.zobrist.orientations[self._orientation]
+        self.roll_wind()
+        self.journal.clear()
 
-        for pos in self.eternal_flame:
-            self.board[pos] = TileStatus.fire
+    @property
+    def wind(self) -> Optional[WindDir]:
+        return self._wind
 
-        self.players = Players.four_player()
+    @wind.setter
+    def wind(self, value: WindDir):
+        self.journal.record(self, 'wind', self._wind, value)
+        winds = self.zobrist.winds
+        self._state_hash ^= (winds[self._wind] if self._wind else 0) ^ winds[value]
+        self._wind = value
 
-        self.wind = None
-        self.action = self.add_wind_fire
-        self.orientation = OrientationEnum.h
-        self.roll_wind()
+    @property
+    def action(self) -> Callable:
+        return self._action
 
-        self.window = sg.Window('FireTower', layout=self._init_layout())
-        self.game_loop()
+    @action.setter
+    def action(self, value: Callable):
+        self.journal.record(self, 'action', self._action, value)
+        self._state_hash ^= self.zobrist.action(self._action.__name__) ^ self.zobrist.action(value.__name__)
+        self._action = value
 
-    def game_loop(self):
-        while self.active:
-            event, values = self.window.read()
-            if event in (None, 'Cancel', 'Exit'):
-                self.active = False
-                self.window.close()
-            self.update(event=event, values=values)
-            self.draw()
+    @property
+    def orientation(self) -> OrientationEnum:
+        return self._orientation
+
+    @orientation.setter
+    def orientation(self, value: OrientationEnum):
+        self.journal.record(self, 'orientation', self._orientation, value)
+        orientations = self.zobrist.orientations
+        self._state_hash ^= orientations[self._orientation] ^ orientations[value]
+        self._orientation = value
+
+    @property
+    def hash(self) -> int:
+        """
+        A 64-bit Zobrist hash of the position: tile statuses, wind, pending action, orientation, active players
+        and whose turn it is. The board and setter parts are kept up to date incrementally; the rest is a few XORs
+        """
+        h = self.board.hash ^ self._state_hash ^ self.zobrist.turns[self.turn]
+        for p in self.players:
+            if p.active:
+                h ^= self.zobrist.corners[p.corner]
+        return h
+
+    def assign(self, target: Any, name: str, value: Any):
+        """Set an attribute of the game or one of its players through the journal, so it can be undone"""
+        self.journal.record(target, name, getattr(target, name), value)
+        setattr(target, name, value)
+
+    def announce(self, message: str):
+        if self.verbose:
+            print(message)
+
+    def emit(self, event: GameEvent):
+        for listener in self.listeners:
+            listener(self, event)
+
+    @property
+    def current_player(self) -> Player:
+        return list(self.players)[self.turn]
+
+    def end_turn(self):
+        """Drop any pending card action and pass play to the next active player"""
+        self.action = self.no_action
+        players = list(self.players)
+        for step in range(1, len(players) + 1):
+            following = (self.turn + step) % len(players)
+            if players[following].active:
+                self.assign(self, 'turn', following)
+                break
+        self.journal.commit()
+        if self.listeners:
+            self.emit(GameEvent('end_turn'))
+
+    def copy(self) -> FireTowerGame:
+        """An independent copy of the game state with an empty journal, e.g. for a search or a worker process"""
+        clone = copy.copy(self)
+        clone.journal = Journal()
+        clone.listeners = []
+        clone.hooks = []
+        clone.timing = False
+        clone.board = self.board.copy()
+        clone.board.journal = clone.journal
+        clone.players = copy.deepcopy(self.players)
+        clone.rng = random.Random()
+        clone.rng.setstate(self.rng.getstate())
+        clone._action = getattr(clone, self._action.__name__)
+        return clone
+
+    def track_threats(self) -> ThreatMaps:
+        """Start keeping a threat distance map for every player's tower, updated with each tile written"""
+        if self.board.threats is None:
+            self.board.threats = ThreatMaps(self.board, {p.corner: self.geometry.towers[p.corner]
+                                                         for p in self.players})
+        return self.board.threats
+
+    def undo(self) -> bool:
+        return self.journal.undo()
+
+    def redo(self) -> bool:
+        return self.journal.redo()
+
+    def checkpoint(self) -> int:
+        return self.journal.checkpoint()
+
+    def rollback(self, checkpoint: int):
+        self.journal.rollback(checkpoint)
 
     def set_oriented_action(self, action: Callable):
         if self.action == action:
             self.orientation = self.orientation.flip
         self.action = action
 
+    @timed(lambda game, action, *_, **__: action if isinstance(action, str) else action.__name__)
+    def apply(self, action: Union[str, Callable], point: Point, orientation: Optional[OrientationEnum] = None):
+        """Select an action (a method or its name) and play it on the given point"""
+        self.action = getattr(self, action) if isinstance(action, str) else action
+        if orientation is not None:
+            self.orientation = orientation
+        self.play(point)
+
+    def play(self, point: Point):
+        """Play the pending action on the given point"""
+        name = self.action.__name__
+        self.action(point)
+        self.check_for_victory()
+        self.journal.commit()
+        if self.listeners:
+            orientation = self.orientation if name in self.ORIENTED_ACTIONS else None
+            self.emit(GameEvent('play', name, point, orientation))
+
+    UPDATE_EVENTS = frozendict({
+        '-W-': 'roll_wind', '-Fire-': 'select add_wind_fire', '-DL-': 'select dozer_line',
+        '-SL-': 'select scratch_line', '-DRF-': 'select de_re_forest', '-FL-': 'select flare_up',
+        '-EXPL-': 'select explosion', '-EMBR-': 'select ember_phase_one', '-BSNG-': 'select burning_snag',
+        '-FT-': 'select fire_truck', '-AD-': 'select air_drop', '-SJ-': 'select smoke_jumper', '-FS-': 'fire_storm',
+        '-Undo-': 'undo', '-Redo-': 'redo',
+    })
+
+    def update_name(self, event: Optional[Any] = None, *_, **__) -> str:
+        """What an update event does, as reported to hooks: the pending action for a point, otherwise the button"""
+        if isinstance(event, Point):
+            return self.action.__name__
+        return self.UPDATE_EVENTS.get(event, str(event))
+
+    @timed(update_name)
     def update(self, event: Optional[Any] = None, values: Optional[Union[Dict, List]] = None):
         if isinstance(event, Point):
-            self.action(event)
+            self.play(event)
         elif event == '-W-':
             self.roll_wind()
         elif event == '-Fire-':
@@ -253,16 +742,24 @@ class FireTowerGame:
         elif event == '-FS-':
             self.action = self.no_action
             self.fire_storm()
-        self.window['wind'].update(f'Wind Direction: {self.wind.value}')
+        elif event == '-Undo-':
+            self.undo()
+            return
+        elif event == '-Redo-':
+            self.redo()
+            return
         self.check_for_victory()
+        self.journal.commit()
 
     def check_for_victory(self):
-        current_remaining = [p for p in self.players if p.active]
-        for p in current_remaining:
-            if self.board[p.point] is TileStatus.fire:
-                p.active = False
-                for t_point in p.tower:
-                    self.board[t_point] = TileStatus.fire
+        if self.board.any_status(self.corner_tiles, TileStatus.fire):
+            tiles = self.board.tiles
+            current_remaining = [p for p in self.players if p.active]
+            for p in current_remaining:
+                if tiles[self.geometry.corners[p.corner]] is TileStatus.fire:
+                    self.assign(p, 'active', False)
+                    for t in self.geometry.towers[p.corner]:
+                        self.board.put(t, TileStatus.fire)
         new_remaining = [p for p in self.players if p.active]
         if len(new_remaining) == 1:
             self.victory(new_remaining[0])
@@ -271,198 +768,254 @@ class FireTowerGame:
 
     @property
     def towers(self) -> Set[Point]:
-        return set.union(*[player.corner.tower for player in self.players])
+        return {self.geometry.points[i] for i in self.tower_tiles}
 
     @property
     def corners(self) -> Set[Point]:
-        return set.union(*[player.corner.point for player in self.players])
+        return {self.geometry.points[self.geometry.corners[player.corner]] for player in self.players}
 
     def defeat(self):
-        self.active = False
-        print('Game over! All players burned!')
+        self.assign(self, 'active', False)
+        self.announce('Game over! All players burned!')
 
     def victory(self, player: Player):
-        self.active = False
-        print(f'{player.name} wins!')
-        self.window.close()
+        self.assign(self, 'active', False)
+        self.announce(f'{player.name} wins!')
 
+    @timed('roll_wind')
     def roll_wind(self) -> WindDir:
         old_wind = self.wind
         while self.wind is old_wind:
             self.wind = self.get_random_wind()
+        if self.listeners:
+            self.emit(GameEvent('roll_wind'))
         return self.wind
 
     def get_random_wind(self) -> WindDir:
         valid_winds = {w for c in [p.corner for p in self.players if p.active] for w in c}
-        return random.choice(list(valid_winds))
-
-    def _init_layout(self) -> List[List[Any]]:
-        def action_btn(name: str):
-            return sg.Button(name, size=(4, 1), button_color=('black', 'gray'), key=f'-{name}-')
-
-        colors = self.board.get_colors(self.players)
-        layout = [[sg.Button('', size=(2, 1), button_color=('white', colors[Point(r, c)]), key=Point(r, c))
-                   for r in range(0, self.BOARD_SIZE)] for c in range(0, self.BOARD_SIZE)]
-        layout.append([sg.Text(f'Wind Direction: {self.wind.value}', key='wind'), sg.Button('Wind', size=(4, 1),
-                                                                                            button_color=(
-                                                                                                'black', 'gray'),
-                                                                                            key='-W-')])
-        layout.append([action_btn('Fire'),
-                       action_btn('DL'),
-                       action_btn('SL'),
-                       action_btn('DRF'),
-                       action_btn('FL'),
-                       action_btn('EXPL'),
-                       action_btn('EMBR'),
-                       action_btn('BSNG'),
-                       action_btn('FT'),
-                       action_btn('AD'),
-                       action_btn('SJ'),
-                       action_btn('FS')])
-        return layout
+        return self.rng.choice([w for w in WindDir if w in valid_winds])
+
+    def execute(self, plan: Optional[Plan]) -> bool:
+        """Write a plan's tile changes to the board. Returns False if the plan was rejected"""
+        if plan is None:
+            self.rejected = True
+            return False
+        for i, status in plan:
+            self.board.put(i, status)
+        return True
+
+    def plan_add_wind_fire(self, i: int, _: OrientationEnum = None) -> Optional[Plan]:
+        tiles = self.board.tiles
+        if tiles[i] is TileStatus.tree and tiles[self.geometry.upwind[self.wind][i]] is TileStatus.fire:
+            return [(i, TileStatus.fire)]
+        return None
 
     def add_wind_fire(self, point: Point):
-        wind_point = point - self.wind.as_vector()
-        if self.board[point] is TileStatus.tree and self.board[wind_point] is TileStatus.fire:
-            self.board[point] = TileStatus.fire
-
-    def has_orthogonal(self, point: Point, status: TileStatus):
-        return (self.board[point.left] is status or self.board[point.right] is status
-                or self.board[point.up] is status or self.board[point.down] is status)
-
-    def validate_firebreak(self, point: Point):
-        return (self.board[point] is TileStatus.tree and point not in self.towers
-                and not self.has_orthogonal(point, TileStatus.firebreak))
-
-    def add_firebreak_cluster(self, cluster: Tuple[Point, Point]):
-        valid = all([self.validate_firebreak(p) for p in cluster])
-        if valid:
-            for p in cluster:
-                self.board[p] = TileStatus.firebreak
-        else:
-            print(f'{cluster} not valid for placing a firebreak')
+        self.execute(self.plan_add_wind_fire(self.geometry.index(point)))
+
+    def has_orthogonal(self, i: int, status: TileStatus):
+        return self.board.has_orthogonal(i, status)
+
+    def validate_firebreak(self, i: int):
+        return (self.board.tiles[i] is TileStatus.tree and i not in self.tower_tiles
+                and not self.board.has_orthogonal(i, TileStatus.firebreak))
+
+    def plan_firebreak_cluster(self, cluster: Tuple[int, int]) -> Optional[Plan]:
+        if self.validate_firebreak(cluster[0]) and self.validate_firebreak(cluster[1]):
+            return [(i, TileStatus.firebreak) for i in cluster]
+        return None
+
+    def add_firebreak_cluster(self, cluster: Tuple[int, int], point: Point):
+        if not self.execute(self.plan_firebreak_cluster(cluster)):
+            self.announce(f'{point} not valid for placing a firebreak')
+
+    def plan_dozer_line(self, i: int, orientation: OrientationEnum) -> Optional[Plan]:
+        return self.plan_firebreak_cluster(self.geometry.pairs[orientation][i])
 
     def dozer_line(self, point: Point):
         """Place two firebreak tokens adjacent to each other. Neither may be adjacent to any other firebreak"""
-        cluster = (point, point.right) if self.orientation is OrientationEnum.h else (point, point.down)
-        self.add_firebreak_cluster(cluster)
+        self.add_firebreak_cluster(self.geometry.pairs[self.orientation][self.geometry.index(point)], point)
+
+    def plan_de_re_forest(self, i: int, _: OrientationEnum = None) -> Optional[Plan]:
+        if self.validate_firebreak(i):
+            return [(i, TileStatus.firebreak)]
+        if self.board.tiles[i] is TileStatus.firebreak:
+            return [(i, TileStatus.tree)]
+        return None
 
     def de_re_forest(self, point: Point):
         """Add or remove one firebreak token"""
-        if self.validate_firebreak(point):
-            self.board[point] = TileStatus.firebreak
-        elif self.board[point] is TileStatus.firebreak:
-            self.board[point] = TileStatus.tree
-        else:
-            print(f'Cannot add or remove firebreak at {point}')
+        if not self.execute(self.plan_de_re_forest(self.geometry.index(point))):
+            self.announce(f'Cannot add or remove firebreak at {point}')
+
+    def plan_scratch_line(self, i: int, orientation: OrientationEnum) -> Optional[Plan]:
+        return self.plan_firebreak_cluster(self.geometry.gaps[orientation][i])
 
     def scratch_line(self, point: Point):
         """Place two firebreak tokens one space apart, either horizontally or vertically"""
-        cluster = (point, point.right.right) if self.orientation is OrientationEnum.h else (point, point.down.down)
-        self.add_firebreak_cluster(cluster)
+        self.add_firebreak_cluster(self.geometry.gaps[self.orientation][self.geometry.index(point)], point)
+
+    def plan_flare_up(self, i: int, orientation: OrientationEnum) -> Optional[Plan]:
+        tiles = self.board.tiles
+        flare = []
+        adjacent = False
+        for j in self.geometry.lines[orientation][i]:
+            if tiles[j] is TileStatus.firebreak:
+                break
+            if tiles[j] is TileStatus.tree:
+                flare.append((j, TileStatus.fire))
+                adjacent = adjacent or self.board.has_orthogonal(j, TileStatus.fire)
+        return flare if adjacent else None
 
     def flare_up(self, point: Point):
         """
         Place three fire gems in a horizontal or vertical line.
         At least one gem must be orthogonal to an existing gem
         """
-        flare_line = ([point, point.right, point.right.right] if self.orientation is OrientationEnum.h
-                      else [point, point.down, point.down.down])
-        filtered_flare = []
-        for p in flare_line:
-            if self.board[p] is TileStatus.firebreak:
-                break
-            if self.board[p] is TileStatus.tree:
-                filtered_flare.append(p)
-        if any(self.has_orthogonal(p, TileStatus.fire) for p in filtered_flare):
-            for p in filtered_flare:
-                self.board[p] = TileStatus.fire
+        self.execute(self.plan_flare_up(self.geometry.index(point), self.orientation))
+
+    def plan_burning_snag(self, i: int, _: OrientationEnum = None) -> Optional[Plan]:
+        tiles = self.board.tiles
+        square = self.geometry.squares[i]
+        if any(self.board.has_orthogonal(j, TileStatus.fire) for j in square):
+            snag = [(j, TileStatus.fire) for j in square if tiles[j] is TileStatus.tree]
+            return snag or None
+        return None
 
     def burning_snag(self, point: Point):
         """Place four fire gems in a square pattern. The selected point is the upper-left corner of the square"""
-        square = (point, point.right, point.down, point.right.down)
-        if (any(self.has_orthogonal(p, TileStatus.fire) for p in square) and
-                any(self.board[p] is TileStatus.tree for p in square)):
-            for p in square:
-                if self.board[p] is TileStatus.tree:
-                    self.board[p] = TileStatus.fire
+        self.execute(self.plan_burning_snag(self.geometry.index(point)))
+
+    def plan_explosion(self, i: int, _: OrientationEnum = None) -> Optional[Plan]:
+        tiles = self.board.tiles
+        if tiles[i] is not TileStatus.fire or i in self.geometry.eternal_flame:
+            return None
+        blast = [(j, TileStatus.fire) for j in self.geometry.surrounding[i] if tiles[j] is TileStatus.tree]
+        return [(i, TileStatus.firebreak)] + blast if blast else None
 
     def explosion(self, point: Point):
         """Convert an existing fire gem to a firebreak. All 8 surrounding tiles become fire if possible"""
-        if self.board[point] is not TileStatus.fire or point in self.eternal_flame:
-            return
-        area = (point.up.left, point.up, point.up.right, point.right, point.left, point.down.left, point.down,
-                point.down.right)
-        if any(self.board[p] is TileStatus.tree for p in area):
-            self.board[point] = TileStatus.firebreak
-            for p in area:
-                if self.board[p] is TileStatus.tree:
-                    self.board[p] = TileStatus.fire
+        self.execute(self.plan_explosion(self.geometry.index(point)))
+
+    def plan_ember_phase_one(self, i: int, _: OrientationEnum = None) -> Optional[Plan]:
+        if self.board.tiles[i] is TileStatus.fire and i not in self.protected_tiles:
+            return [(i, TileStatus.tree)]
+        return None
 
     def ember_phase_one(self, point: Point):
         """Select any fire gem on the board and remove it, then proceed to phase two"""
-        if self.board[point] is TileStatus.fire and point not in self.eternal_flame and point not in self.towers:
-            self.board[point] = TileStatus.tree
+        if self.execute(self.plan_ember_phase_one(self.geometry.index(point))):
             self.action = self.ember_phase_two
 
+    def plan_ember_phase_two(self, i: int, _: OrientationEnum = None) -> Optional[Plan]:
+        if self.board.tiles[i] is TileStatus.tree and self.board.has_orthogonal(i, TileStatus.fire):
+            return [(i, TileStatus.fire)]
+        return None
+
     def ember_phase_two(self, point: Point):
         """Place the removed fire gem from phase one on any space that's orthogonal to an existing fire gem"""
-        if self.board[point] is TileStatus.tree and self.has_orthogonal(point, TileStatus.fire):
-            self.board[point] = TileStatus.fire
+        if self.execute(self.plan_ember_phase_two(self.geometry.index(point))):
             self.action = self.no_action
 
-    def can_put_out(self, points: Iterable[Point]):
-        return not (any([p in self.eternal_flame for p in points])
-                    or not any([self.board[p] is TileStatus.fire for p in points]))
+    def can_put_out(self, tiles: Iterable[int]):
+        return not (any(i in self.geometry.eternal_flame for i in tiles)
+                    or not any(self.board.tiles[i] is TileStatus.fire for i in tiles))
+
+    def plan_put_out_fire(self, tiles: Iterable[int]) -> Plan:
+        return [(i, TileStatus.tree) for i in tiles
+                if i not in self.protected_tiles and self.board.tiles[i] is TileStatus.fire]
+
+    def put_out_fire(self, tiles: Iterable[int]):
+        self.execute(self.plan_put_out_fire(tiles))
 
-    def put_out_fire(self, points: Iterable[Point]):
-        for p in points:
-            if p not in set.union(self.towers, self.eternal_flame) and self.board[p] is TileStatus.fire:
-                self.board[p] = TileStatus.tree
+    def is_valid_smoke_jump(self, i: int):
+        return self.board.tiles[i] is TileStatus.fire and i not in self.protected_tiles
 
-    def is_valid_smoke_jump(self, point: Point):
-        return point not in self.eternal_flame and self.board[point] is TileStatus.fire and point not in self.towers
+    def plan_air_drop(self, i: int, orientation: OrientationEnum) -> Optional[Plan]:
+        water_line = self.geometry.lines[orientation][i]
+        return self.plan_put_out_fire(water_line) if self.can_put_out(water_line) else None
 
     def air_drop(self, point: Point):
         """Put out three fire gems in a horizontal or vertical line"""
-        water_line = ((point, point.right, point.right.right) if self.orientation is OrientationEnum.h
-                      else (point, point.down, point.down.down))
-        if self.can_put_out(water_line):
-            self.put_out_fire(water_line)
+        self.execute(self.plan_air_drop(self.geometry.index(point), self.orientation))
+
+    def plan_fire_truck(self, i: int, _: OrientationEnum = None) -> Optional[Plan]:
+        square = self.geometry.squares[i]
+        return self.plan_put_out_fire(square) if self.can_put_out(square) else None
 
     def fire_truck(self, point: Point):
         """Put out fire in four spaces in a square"""
-        square = (point, point.right, point.down, point.right.down)
-        if self.can_put_out(square):
-            self.put_out_fire(square)
+        self.execute(self.plan_fire_truck(self.geometry.index(point)))
+
+    def plan_smoke_jumper(self, i: int, _: OrientationEnum = None) -> Optional[Plan]:
+        return self.plan_put_out_fire(self.geometry.surrounding[i]) if self.is_valid_smoke_jump(i) else None
 
     def smoke_jumper(self, point: Point):
         """Put out all 8 tiles that surround an existing fire gem. The center gem remains"""
-        if self.is_valid_smoke_jump(point):
-            area = (point.up.left, point.up, point.up.right, point.left, point.right, point.down.left, point.down,
-                    point.down.right)
-            self.put_out_fire(area)
+        self.execute(self.plan_smoke_jumper(self.geometry.index(point)))
+
+    def candidates(self, action: str, orientation: Optional[OrientationEnum] = None) -> Sequence[int]:
+        """
+        The tiles worth asking an action's planner about. Fire and water cards can only apply near existing fire,
+        so they are drawn from the fire index instead of the whole board
+        """
+        geometry = self.geometry
+        fire_tiles = self.board.fire_tiles
+        back = geometry.backward[orientation or self.orientation]
+        if action == 'add_wind_fire':
+            found = {geometry.step[self.wind][i] for i in fire_tiles}
+        elif action == 'ember_phase_two':
+            found = set(self.board.frontier)
+        elif action in {'explosion', 'ember_phase_one', 'smoke_jumper'}:
+            found = set(fire_tiles)
+        elif action == 'flare_up':
+            found = {k for j in self.board.frontier for k in (j, back[j], back[back[j]])}
+        elif action == 'air_drop':
+            found = {k for j in fire_tiles for k in (j, back[j], back[back[j]])}
+        elif action in {'burning_snag', 'fire_truck'}:
+            near = ({k for j in fire_tiles for k in geometry.orthogonal[j]} if action == 'burning_snag'
+                    else fire_tiles)
+            found = {k for j in near for k in (j, geometry.left[j], geometry.up[j], geometry.left[geometry.up[j]])}
+        else:
+            return range(geometry.tiles)
+        found.discard(geometry.off_board)
+        return sorted(found)
 
-    def fire_storm(self):
+    def legal_moves(self, actions: Optional[Iterable[str]] = None) -> List[Move]:
+        """
+        Every valid placement of the given card actions in both orientations, found without changing the game.
+        By default this covers all card actions, or only ember_phase_two while a removed ember waits to be placed
+        """
+        if actions is None:
+            actions = ('ember_phase_two',) if self.action == self.ember_phase_two else self.CARD_ACTIONS
+        points = self.geometry.points
+        moves = []
+        for action in actions:
+            plan = getattr(self, f'plan_{action}')
+            orientations = list(OrientationEnum) if action in self.ORIENTED_ACTIONS else [None]
+            for orientation in orientations:
+                for i in self.candidates(action, orientation):
+                    if plan(i, orientation) is not None:
+                        moves.append(Move(action, points[i], orientation))
+        return moves
+
+    @timed('fire_storm')
+    def fire_storm(self, storm_wind: Optional[WindDir] = None, next_wind: Optional[WindDir] = None):
         """
         Add 1 fire gem orthogonal to every existing fire gem on the board, in a randomly selected wind direction.
-        Then, re-roll the wind direction for the game; the re-roll may be the same direction as before the firestorm
+        Then, re-roll the wind direction for the game; the re-roll may be the same direction as before the firestorm.
+        Either roll can be given instead, e.g. to replay a recorded storm
         """
-        storm_wind = self.get_random_wind()
-        full_board = range(0, self.BOARD_SIZE)
-        fire_points = {p for p in self.get_board_range(full_board, full_board) if self.board[p] is TileStatus.fire}
-        for fp in fire_points:
-            storm_pt = fp + storm_wind.as_vector()
-            if self.board[storm_pt] is TileStatus.tree:
-                self.board[storm_pt] = TileStatus.fire
-        self.wind = self.get_random_wind()
+        storm_wind = storm_wind or self.get_random_wind()
+        for i in self.board.storm_targets(storm_wind):
+            self.board.put(i, TileStatus.fire)
+        self.wind = next_wind or self.get_random_wind()
+        if self.listeners:
+            self.emit(GameEvent('fire_storm', storm_wind=storm_wind))
 
     def no_action(self, *_, **__):
         pass
 
-    def draw(self):
-        self.board.draw(self.window, self.players)
-
 
 class Board:
     CHAR_MAP = frozendict({
@@ -476,41 +1029,493 @@ class Board:
         TileStatus.firebreak: 'purple'
     })
 
-    def __init__(self, grid: Dict[Point, TileStatus]):
-        self.grid = grid
-
-    @staticmethod
-    def on_board(point: Point) -> bool:
-        return point.x in range(0, FireTowerGame.BOARD_SIZE) and point.y in range(0, FireTowerGame.BOARD_SIZE)
-
-    def get_colors(self, players: Players) -> Dict[Point, str]:
-        res = {point: self.COLOR_MAP[self[point]] for point in [Point(r, c)
-                                                                for r in range(0, FireTowerGame.BOARD_SIZE)
-                                                                for c in range(0, FireTowerGame.BOARD_SIZE)]}
-        for p in players:
-            for t_point in p.tower:
-                res[t_point] = 'brown' if self[t_point] is TileStatus.tree else res[t_point]
-            res[p.point] = 'white' if self[p.point] is TileStatus.tree else res[p.point]
-        return res
-
-    def draw(self, window: sg.Window, players: Players):
-        colors = self.get_colors(players)
-        for point in colors:
-            window[point].update(button_color=('white', colors[point]))
+    def __init__(self, geometry: Geometry, fill: TileStatus = TileStatus.tree):
+        """
+        Tile statuses stored in a flat list indexed by the geometry's tile indices.
+        The extra last slot is the off-board sentinel, so neighbour lookups never need a bounds check.
+        Alongside the tiles the board keeps a live index of the fire tiles, of how many orthogonal fire
+        neighbours each tile has and of the frontier: tree tiles orthogonal to at least one fire
+        """
+        self.geometry = geometry
+        self.journal: Optional[Journal] = None
+        self.tiles: List[TileStatus] = self.make_tiles(fill)
+        self.fire_tiles: Set[int] = set()
+        self.fire_neighbours: List[int] = self.make_counts()
+        self.frontier: Set[int] = set()
+        self.dirty: Set[int] = set(range(geometry.tiles)) if self.redraw_all else set()
+        self.writes = 0
+        self.threats: Optional[ThreatMaps] = None
+        self.zobrist = Zobrist.of(geometry.size).tiles
+        self.hash = 0
+        self.reindex()
+
+    # whether a new board marks every tile dirty, so that its first draw paints the whole board
+    redraw_all = True
+
+    def make_tiles(self, fill: TileStatus) -> List[TileStatus]:
+        return [fill] * self.geometry.tiles + [TileStatus.off_board]
+
+    def make_counts(self) -> List[int]:
+        return [0] * (self.geometry.tiles + 1)
+
+    def occupied(self) -> Iterable[int]:
+        """The indices of every tile that isn't a tree"""
+        tiles = self.tiles
+        return (i for i in range(self.geometry.tiles) if tiles[i] is not TileStatus.tree)
+
+    def reindex(self):
+        """
+        Rebuild the fire and frontier index and the Zobrist hash from the tiles. The hash is taken relative to an
+        all-tree board, so only the tiles that aren't trees contribute to it
+        """
+        tiles = self.tiles
+        trees = self.zobrist[TileStatus.tree]
+        occupied = list(self.occupied())
+        self.hash = 0
+        for i in occupied:
+            self.hash ^= self.zobrist[tiles[i]][i] ^ trees[i]
+        orthogonal = self.geometry.orthogonal
+        self.fire_tiles = {i for i in occupied if tiles[i] is TileStatus.fire}
+        self.fire_neighbours = self.make_counts()
+        for i in self.fire_tiles:
+            for j in orthogonal[i]:
+                self.fire_neighbours[j] += 1
+        self.fire_neighbours[self.geometry.off_board] = 0
+        self.frontier = {j for i in self.fire_tiles for j in orthogonal[i] if tiles[j] is TileStatus.tree}
+
+    def copy(self) -> Board:
+        """An independent copy of the board and its index, detached from any journal"""
+        clone = copy.copy(self)
+        clone.journal = None
+        clone.tiles = self.tiles.copy()
+        clone.fire_tiles = set(self.fire_tiles)
+        clone.fire_neighbours = self.fire_neighbours.copy()
+        clone.frontier = set(self.frontier)
+        clone.dirty = set(self.dirty)
+        clone.threats = self.threats.copy(clone) if self.threats is not None else None
+        return clone
+
+    def on_board(self, point: Point) -> bool:
+        return self.geometry.index(point) != self.geometry.off_board
+
+    def put(self, i: int, value: TileStatus):
+        """Set the status of the tile at index i, keeping the fire index up to date. Off-board writes are ignored"""
+        tiles = self.tiles
+        old = tiles[i]
+        if i == self.geometry.off_board or old is value:
+            return
+        if self.journal is not None:
+            self.journal.record(self, i, old, value)
+        tiles[i] = value
+        self.writes += 1
+        self.dirty.add(i)
+        self.hash ^= self.zobrist[old][i] ^ self.zobrist[value][i]
+        counts = self.fire_neighbours
+        if old is TileStatus.fire:
+            self.fire_tiles.discard(i)
+            for j in self.geometry.orthogonal[i]:
+                counts[j] -= 1
+                if not counts[j]:
+                    self.frontier.discard(j)
+        elif value is TileStatus.fire:
+            self.fire_tiles.add(i)
+            for j in self.geometry.orthogonal[i]:
+                counts[j] += 1
+                if tiles[j] is TileStatus.tree:
+                    self.frontier.add(j)
+        counts[self.geometry.off_board] = 0
+        if value is TileStatus.tree and counts[i]:
+            self.frontier.add(i)
+        else:
+            self.frontier.discard(i)
+        if self.threats is not None:
+            self.threats.update(i, old, value)
+
+    def has_orthogonal(self, i: int, status: TileStatus) -> bool:
+        if status is TileStatus.fire:
+            return self.fire_neighbours[i] > 0
+        tiles = self.tiles
+        left, right, up, down = self.geometry.orthogonal[i]
+        return tiles[left] is status or tiles[right] is status or tiles[up] is status or tiles[down] is status
+
+    def any_status(self, tiles: FrozenSet[int], status: TileStatus) -> bool:
+        """Whether any of the given tiles has the given status"""
+        return any(self.tiles[i] is status for i in tiles)
+
+    def storm_targets(self, wind: WindDir) -> List[int]:
+        """The tree tiles that a fire storm blowing in the given direction would set alight"""
+        tiles = self.tiles
+        step = self.geometry.step[wind]
+        return [step[i] for i in self.fire_tiles if tiles[step[i]] is TileStatus.tree]
+
+    def tile_color(self, i: int, players: Players, heatmap: bool = False) -> str:
+        """
+        The color of one tile; trees are shown white on a player's corner and brown elsewhere in their tower.
+        With the heatmap on, other trees are shaded by how few fire placements separate them from an active tower
+        """
+        status = self.tiles[i]
+        if status is TileStatus.tree:
+            for p in players:
+                if i == self.geometry.corners[p.corner]:
+                    return 'white'
+                if i in self.geometry.towers[p.corner]:
+                    return 'brown'
+            if heatmap and self.threats is not None:
+                danger = self.threats.danger(i, [p.corner for p in players if p.active])
+                if danger <= len(self.HEAT_COLORS):
+                    return self.HEAT_COLORS[danger - 1]
+        return self.COLOR_MAP[status]
+
+    # tree colors for the danger heatmap, from one placement away from a tower outwards
+    HEAT_COLORS = ('#ff0000', '#ff4000', '#ff8000', '#ffbf00', '#ffff00', '#bfff00', '#80ff00')
+
+    def get_colors(self, players: Players, heatmap: bool = False) -> Dict[Point, str]:
+        return {point: self.tile_color(i, players, heatmap) for i, point in enumerate(self.geometry.points)}
+
+    def draw(self, window: sg.Window, players: Players, heatmap: bool = False):
+        """Repaint only the tiles written since the last draw, plus those whose danger changed if showing the heatmap"""
+        tiles = self.dirty
+        if self.threats is not None:
+            self.threats.retarget(p.corner for p in players if p.active)
+            if heatmap:
+                tiles |= self.threats.changed
+            self.threats.changed.clear()
+        for i in tiles:
+            window[self.geometry.points[i]].update(button_color=('white', self.tile_color(i, players, heatmap)))
+        self.dirty.clear()
 
     def __getitem__(self, pos: Point):
         if not isinstance(pos, Point):
             raise TypeError(f'Received {type(pos)}, expecting Point')
-        if self.on_board(pos):
-            return self.grid[pos]
-        return TileStatus.off_board
+        return self.tiles[self.geometry.index(pos)]
 
     def __setitem__(self, pos: Point, value: TileStatus):
         if not isinstance(pos, Point):
             raise TypeError(f'Board setitem operation expects a Point, received {type(pos)} instead')
-        if self.on_board(pos):
-            self.grid[pos] = value
-        return
+        self.put(self.geometry.index(pos), value)
+
+
+class SparseTiles:
+    """
+    Tile statuses stored in a dict holding only the tiles that aren't trees, read and written like the flat tile
+    list of a Board, off-board sentinel included
+    """
+    __slots__ = ('stored', 'off_board')
+
+    def __init__(self, tiles: int):
+        self.stored: Dict[int, TileStatus] = {}
+        self.off_board = tiles
+
+    def __getitem__(self, i: Union[int, slice]) -> Union[TileStatus, List[TileStatus]]:
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self.off_board + 1))]
+        if i == self.off_board:
+            return TileStatus.off_board
+        return self.stored.get(i, TileStatus.tree)
+
+    def __setitem__(self, i: int, value: TileStatus):
+        if value is TileStatus.tree:
+            self.stored.pop(i, None)
+        else:
+            self.stored[i] = value
+
+    def __len__(self) -> int:
+        return self.off_board + 1
+
+    def __iter__(self) -> Iterable[TileStatus]:
+        return (self[i] for i in range(self.off_board + 1))
+
+    def copy(self) -> SparseTiles:
+        clone = SparseTiles(self.off_board)
+        clone.stored = dict(self.stored)
+        return clone
+
+
+class SparseBoard(Board):
+    """
+    A Board storing only the tiles that aren't trees, with the fire neighbour counts kept in a Counter, so memory
+    and rebuilding the index grow with the fire and firebreaks on the board rather than with its area.
+    Meant for very large boards with a LazyTable geometry; a new sparse board starts with nothing dirty
+    """
+    redraw_all = False
+
+    def __init__(self, geometry: Geometry, fill: TileStatus = TileStatus.tree):
+        if fill is not TileStatus.tree:
+            raise ValueError(f'a sparse board starts out as trees, not {fill.value}')
+        super().__init__(geometry, fill)
+
+    def make_tiles(self, fill: TileStatus) -> SparseTiles:
+        return SparseTiles(self.geometry.tiles)
+
+    def make_counts(self) -> Counter:
+        return Counter()
+
+    def occupied(self) -> Iterable[int]:
+        return self.tiles.stored.keys()
+
+
+class ThreatMaps:
+    """
+    For each tower, a distance map holding the fewest fire placements that would carry fire from each tile into
+    the tower: a shortest path where trees cost a placement, fire costs none and firebreaks are walls. Fire next to
+    a tower is at distance 1, fire inside it at 0. Board.put keeps the maps up to date one tile at a time, repairing
+    only the tiles whose distance can have changed; those tiles are collected in `changed` for redrawing.
+    `targets` are the towers whose danger is being shown, which retarget moves when players drop out or come back.
+    With walls off, firebreaks cost a placement like trees, giving a lower bound for when firebreaks may be removed
+    """
+    UNREACHABLE = 1 << 30
+
+    def __init__(self, board: Board, towers: Dict[Corner, FrozenSet[int]], walls: bool = True):
+        self.board = board
+        self.towers = towers
+        self.walls = walls
+        self.distance: Dict[Corner, List[int]] = {}
+        self.changed: Set[int] = set()
+        self.targets: FrozenSet[Corner] = frozenset(towers)
+        self.rebuild()
+
+    def cost(self, status: TileStatus) -> int:
+        if status is TileStatus.fire:
+            return 0
+        if status is TileStatus.tree or status is TileStatus.firebreak and not self.walls:
+            return 1
+        return self.UNREACHABLE
+
+    def rebuild(self):
+        """Compute every map from scratch"""
+        for corner, tower in self.towers.items():
+            self.distance[corner] = self.search(tower)
+        self.changed.update(range(self.board.geometry.tiles))
+
+    def search(self, tower: FrozenSet[int], limit: int = UNREACHABLE) -> List[int]:
+        """
+        A fresh map for one tower, searched only as far as `limit`: distances up to it are exact, and anything
+        further is only known to be further
+        """
+        tiles = self.board.tiles
+        distance = [self.UNREACHABLE] * (self.board.geometry.tiles + 1)
+        queue = []
+        for t in tower:
+            cost = self.cost(tiles[t])
+            if cost < self.UNREACHABLE:
+                distance[t] = cost
+                queue.append((cost, t))
+        heapq.heapify(queue)
+        self.relax(distance, queue, limit)
+        return distance
+
+    def copy(self, board: Board) -> ThreatMaps:
+        clone = copy.copy(self)
+        clone.board = board
+        clone.distance = {corner: distance.copy() for corner, distance in self.distance.items()}
+        clone.changed = set(self.changed)
+        return clone
+
+    def relax(self, distance: List[int], queue: List[Tuple[int, int]], limit: int = UNREACHABLE) -> Set[int]:
+        """
+        Dijkstra from the queued (distance, tile) entries, returning the tiles whose distance went down. The search
+        stops once the nearest tile left is further than `limit`
+        """
+        orthogonal = self.board.geometry.orthogonal
+        tiles = self.board.tiles
+        fire, tree, firebreak = TileStatus.fire, TileStatus.tree, TileStatus.firebreak
+        crossable = not self.walls
+        lowered = set()
+        while queue:
+            d, i = heapq.heappop(queue)
+            if d > limit:
+                break
+            if d > distance[i]:
+                continue
+            for j in orthogonal[i]:
+                status = tiles[j]
+                if status is fire:
+                    reach = d
+                elif status is tree or status is firebreak and crossable:
+                    reach = d + 1
+                else:
+                    continue
+                if reach < distance[j]:
+                    distance[j] = reach
+                    lowered.add(j)
+                    heapq.heappush(queue, (reach, j))
+        return lowered
+
+    def update(self, i: int, old: TileStatus, new: TileStatus):
+        """Repair the maps after tile i changed from old to new"""
+        before, after = self.cost(old), self.cost(new)
+        if before == after:
+            return
+        for corner, distance in self.distance.items():
+            if after < before:
+                self.lower(distance, self.towers[corner], i, after)
+            else:
+                self.raise_(distance, self.towers[corner], i)
+
+    def lower(self, distance: List[int], tower: FrozenSet[int], i: int, cost: int):
+        """A tile got cheaper to burn through, which can only shorten paths, so relax outwards from it"""
+        best = cost if i in tower else self.UNREACHABLE
+        for j in self.board.geometry.orthogonal[i]:
+            best = min(best, distance[j] + cost)
+        if best < distance[i]:
+            distance[i] = best
+            self.changed.add(i)
+            self.changed |= self.relax(distance, [(best, i)])
+
+    def raise_(self, distance: List[int], tower: FrozenSet[int], i: int):
+        """
+        A tile got dearer or became a wall. Going outwards from it in order of distance, find the tiles left with
+        no shortest path, forget their distances and fill them in again from the tiles around them.
+        A tree is carried by a neighbour one nearer; fire at the same distance is carried as a connected group,
+        by any of its tiles touching a tree at that distance or lying in the tower
+        """
+        orthogonal = self.board.geometry.orthogonal
+        tiles = self.board.tiles
+        fire = TileStatus.fire
+        affected = {i}
+        queued = {i}
+        # (distance, trees before fire, tile), so that a group of fire is judged after the trees at its distance
+        queue = [(distance[i], 0, i)]
+        while queue:
+            d, _, k = heapq.heappop(queue)
+            if k == i:
+                lost = [i]
+            elif tiles[k] is fire:
+                lost = [k]
+                carried = False
+                for m in lost:
+                    if m in tower and d == 0 or any(tiles[j] is not fire and j not in affected and distance[j] == d
+                                                    for j in orthogonal[m]):
+                        carried = True
+                        break
+                    for j in orthogonal[m]:
+                        if j not in queued and tiles[j] is fire and distance[j] == d:
+                            queued.add(j)
+                            lost.append(j)
+                if carried:
+                    # the rest of the group is carried too, so its tiles are left queued and never judged again
+                    continue
+            else:
+                if k in tower and d == 1 or any(j not in affected and distance[j] + 1 == d for j in orthogonal[k]):
+                    continue
+                lost = [k]
+            affected.update(lost)
+            for m in lost:
+                for j in orthogonal[m]:
+                    if j in queued:
+                        continue
+                    status = tiles[j]
+                    if status is fire and distance[j] == d:
+                        queued.add(j)
+                        heapq.heappush(queue, (d, 1, j))
+                    elif status is not fire and distance[j] == d + 1:
+                        queued.add(j)
+                        heapq.heappush(queue, (d + 1, 0, j))
+        old = {k: distance[k] for k in affected}
+        for k in affected:
+            distance[k] = self.UNREACHABLE
+        queue = []
+        for k in affected:
+            cost = self.cost(tiles[k])
+            if cost >= self.UNREACHABLE:
+                continue
+            best = cost if k in tower else self.UNREACHABLE
+            for j in orthogonal[k]:
+                if j not in affected:
+                    best = min(best, distance[j] + cost)
+            if best < self.UNREACHABLE:
+                distance[k] = best
+                queue.append((best, k))
+        heapq.heapify(queue)
+        self.relax(distance, queue)
+        self.changed.update(k for k in affected if distance[k] != old[k])
+
+    def threat(self, corner: Corner) -> int:
+        """The fewest fire placements that would bring any fire on the board into the corner's tower"""
+        distance = self.distance[corner]
+        return min((distance[i] for i in self.board.fire_tiles), default=self.UNREACHABLE)
+
+    def danger(self, i: int, corners: Iterable[Corner]) -> int:
+        """How close tile i is to the nearest of the given towers, in fire placements"""
+        return min((self.distance[corner][i] for corner in corners), default=self.UNREACHABLE)
+
+    def retarget(self, corners: Iterable[Corner]):
+        """
+        Show danger for these towers from now on. No tile is written when a player is eliminated, or comes back on
+        an undo, so the tiles whose danger that moves are added to `changed` here
+        """
+        corners = frozenset(corners)
+        if corners == self.targets:
+            return
+        old, self.targets = self.targets, corners
+        self.changed.update(i for i in range(self.board.geometry.tiles)
+                            if self.danger(i, old) != self.danger(i, corners))
+
+
+class FireTowerGUI:
+    """A PySimpleGUI front-end that drives a FireTowerGame from window events"""
+
+    def __init__(self, game: FireTowerGame):
+        import PySimpleGUI as sg
+        self.sg = sg
+        self.game = game
+        self.heatmap = False
+        self.window = sg.Window('FireTower', layout=self._init_layout())
+
+    def game_loop(self, profiler: Optional[LoopProfiler] = None):
+        """Play until the game ends or the window closes, profiling a sample of the events if given a profiler"""
+        while self.game.active:
+            event, values = self.window.read()
+            if event in (None, 'Cancel', 'Exit'):
+                self.game.active = False
+                break
+            with profiler.step() if profiler is not None else nullcontext():
+                if event == '-Heat-':
+                    self.toggle_heatmap()
+                else:
+                    self.game.update(event=event, values=values)
+                self.window['wind'].update(f'Wind Direction: {self.game.wind.value}')
+                self.draw()
+        self.window.close()
+
+    def _init_layout(self) -> List[List[Any]]:
+        def action_btn(name: str):
+            return self.sg.Button(name, size=(4, 1), button_color=('black', 'gray'), key=f'-{name}-')
+
+        colors = self.game.board.get_colors(self.game.players)
+        layout = [[self.sg.Button('', size=(2, 1), button_color=('white', colors[Point(r, c)]), key=Point(r, c))
+                   for r in range(self.game.geometry.size)] for c in range(self.game.geometry.size)]
+        self.game.board.dirty.clear()
+        layout.append([self.sg.Text(f'Wind Direction: {self.game.wind.value}', key='wind'),
+                       self.sg.Button('Wind', size=(4, 1), button_color=('black', 'gray'), key='-W-'),
+                       action_btn('Undo'),
+                       action_btn('Redo'),
+                       action_btn('Heat')])
+        layout.append([action_btn('Fire'),
+                       action_btn('DL'),
+                       action_btn('SL'),
+                       action_btn('DRF'),
+                       action_btn('FL'),
+                       action_btn('EXPL'),
+                       action_btn('EMBR'),
+                       action_btn('BSNG'),
+                       action_btn('FT'),
+                       action_btn('AD'),
+                       action_btn('SJ'),
+                       action_btn('FS')])
+        return layout
+
+    def toggle_heatmap(self):
+        """
+        Switch the danger overlay on or off. The threat maps are built once, on first use, and from then on only
+        repaired tile by tile as the board changes, so redraws stay as cheap as without the overlay
+        """
+        self.heatmap = not self.heatmap
+        self.game.track_threats()
+        self.game.board.dirty.update(range(self.game.geometry.tiles))
+
+    def draw(self):
+        self.game.board.draw(self.window, self.game.players, self.heatmap)
 
 
 class CardTypeEnum(Enum):
@@ -536,4 +1541,5 @@ class Card:
         self.action()
 
 
-game = FireTowerGame()
+if __name__ == '__main__':
+    FireTowerGUI(FireTowerGame()).game_loop()
@@ -0,0 +1,116 @@
+from __future__ import annotations
+import cProfile
+import io
+import json
+import pstats
+import random
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, IO, Iterator, Optional, Union
+
+from firetower import ActionRecord, FireTowerGame
+
+
+@dataclass
+class ActionStats:
+    calls: int = 0
+    seconds: float = 0.0
+    slowest: float = 0.0
+    tiles_changed: int = 0
+    rejected: int = 0
+
+    @property
+    def mean(self) -> float:
+        return self.seconds / self.calls if self.calls else 0.0
+
+
+class Counters:
+    """A game hook totting up calls, time, tile changes and rejections per action"""
+
+    def __init__(self):
+        self.actions: Dict[str, ActionStats] = {}
+
+    def __call__(self, game: FireTowerGame, record: ActionRecord):
+        stats = self.actions.get(record.action)
+        if stats is None:
+            stats = self.actions[record.action] = ActionStats()
+        stats.calls += 1
+        stats.seconds += record.seconds
+        stats.slowest = max(stats.slowest, record.seconds)
+        stats.tiles_changed += record.tiles_changed
+        stats.rejected += record.rejected
+
+    def summary(self) -> str:
+        lines = [f'{"action":<24} {"calls":>8} {"total s":>10} {"mean us":>10} {"max us":>10} {"tiles":>8} '
+                 f'{"rejected":>8}']
+        for action, s in sorted(self.actions.items(), key=lambda item: -item[1].seconds):
+            lines.append(f'{action:<24} {s.calls:>8} {s.seconds:>10.4f} {s.mean * 1e6:>10.1f} '
+                         f'{s.slowest * 1e6:>10.1f} {s.tiles_changed:>8} {s.rejected:>8}')
+        return '\n'.join(lines)
+
+
+class JsonlTrace:
+    """A game hook writing one JSON object per record to a file, tagged with the game's seed and turn"""
+
+    def __init__(self, file: Union[str, IO[str]]):
+        self.owned = isinstance(file, str)
+        self.file = open(file, 'w') if isinstance(file, str) else file
+
+    def __call__(self, game: FireTowerGame, record: ActionRecord):
+        self.file.write(json.dumps({
+            'time': time.time(), 'seed': game.seed if isinstance(game.seed, (int, str)) else None, 'turn': game.turn,
+            'action': record.action, 'seconds': record.seconds, 'tiles_changed': record.tiles_changed,
+            'rejected': record.rejected,
+        }) + '\n')
+
+    def close(self):
+        if self.owned:
+            self.file.close()
+        else:
+            self.file.flush()
+
+    def __enter__(self) -> JsonlTrace:
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+class LoopProfiler:
+    """
+    Runs cProfile over a random sample of the steps of a game loop, wrapped with `with profiler.step():`,
+    accumulating everything into one profile. Draws from its own random generator, so it leaves games alone
+    """
+
+    def __init__(self, sample: float = 0.01, seed: Optional[int] = None):
+        self.sample = sample
+        self.rng = random.Random(seed)
+        self.profile = cProfile.Profile()
+        self.steps = 0
+        self.sampled = 0
+
+    @contextmanager
+    def step(self) -> Iterator[None]:
+        self.steps += 1
+        if self.rng.random() >= self.sample:
+            yield
+            return
+        self.sampled += 1
+        self.profile.enable()
+        try:
+            yield
+        finally:
+            self.profile.disable()
+
+    def stats(self) -> pstats.Stats:
+        return pstats.Stats(self.profile)
+
+    def summary(self, limit: int = 20, sort: str = 'cumulative') -> str:
+        out = io.StringIO()
+        if self.sampled:
+            pstats.Stats(self.profile, stream=out).sort_stats(sort).print_stats(limit)
+        return f'profiled {self.sampled} of {self.steps} steps\n{out.getvalue()}'
+
+    def dump(self, path: str):
+        self.profile.dump_stats(path)
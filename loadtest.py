@@ -0,0 +1,232 @@
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from bots import CARD_PHASE, FIRE_PHASE, phase_actions, sample_move
+from deck import UNTARGETED
+from firetower import Board, FireTowerGame, WindDir
+from server import EMBER_PHASE, Message, encode, raise_open_files_limit
+from simulator import PLAYER_COUNTS
+
+STATUSES = {char: status for status, char in Board.CHAR_MAP.items()}
+
+
+@dataclass
+class LoadStats:
+    connections: int = 0
+    matches: int = 0
+    moves: int = 0
+    errors: int = 0
+    latencies: List[float] = field(default_factory=list)
+
+    def __add__(self, other: LoadStats) -> LoadStats:
+        return LoadStats(self.connections + other.connections, self.matches + other.matches,
+                         self.moves + other.moves, self.errors + other.errors, self.latencies + other.latencies)
+
+
+class SimulatedPlayer:
+    """
+    A client keeping a mirror of its match from the start board and the diffs, and answering its turns with random
+    legal moves drawn the way RandomBot draws them, limited to the cards in its hand
+    """
+
+    def __init__(self, players: int, seed: int):
+        self.players = players
+        self.rng = random.Random(seed)
+        self.mirror: Optional[FireTowerGame] = None
+        self.seat: Optional[int] = None
+        self.hand: List[str] = []
+        self.phase = FIRE_PHASE
+        self.finished = False
+
+    def start(self, message: Message):
+        self.mirror = FireTowerGame(PLAYER_COUNTS[self.players]())
+        self.mirror.verbose = False
+        for i, char in enumerate(message['board']):
+            self.mirror.board.put(i, STATUSES[char])
+        self.sync(message)
+
+    def sync(self, message: Message):
+        mirror = self.mirror
+        for i, char in message.get('tiles', ()):
+            mirror.board.put(i, STATUSES[char])
+        mirror.wind = WindDir[message['wind']]
+        mirror.turn = message['turn']
+        for player, active in zip(mirror.players, message['players']):
+            player.active = active
+        self.phase = message['phase']
+        mirror.action = mirror.ember_phase_two if self.phase == EMBER_PHASE else mirror.no_action
+        mirror.journal.clear()
+
+    def move(self) -> Message:
+        mirror = self.mirror
+        if self.phase == FIRE_PHASE:
+            # the wind fire is compulsory when there is one, so look at every placement rather than sampling
+            moves = mirror.legal_moves(phase_actions(mirror, FIRE_PHASE))
+            if not moves:
+                return {'op': 'pass'}
+            point = self.rng.choice(moves).point
+            return {'op': 'fire', 'x': point.x, 'y': point.y}
+        if self.phase == EMBER_PHASE:
+            move = sample_move(mirror, phase_actions(mirror, CARD_PHASE), self.rng)
+            return {'op': 'ember', 'x': move.point.x, 'y': move.point.y} if move else {'op': 'pass'}
+        mirror.allowed_actions = frozenset(self.hand)
+        move = sample_move(mirror, phase_actions(mirror, CARD_PHASE), self.rng)
+        if move is not None:
+            message = {'op': 'card', 'card': self.hand.index(move.action), 'x': move.point.x, 'y': move.point.y}
+            if move.orientation is not None:
+                message['orientation'] = move.orientation.name
+            return message
+        untargeted = [k for k, action in enumerate(self.hand) if action in UNTARGETED]
+        return {'op': 'card', 'card': untargeted[0]} if untargeted else {'op': 'discard', 'card': 0}
+
+    @property
+    def my_turn(self) -> bool:
+        return self.mirror is not None and not self.finished and self.mirror.turn == self.seat
+
+
+async def run_player(host: str, port: int, players: int, seed: int, stats: LoadStats):
+    """One simulated connection playing matches until its match ends"""
+    reader, writer = await asyncio.open_connection(host, port)
+    stats.connections += 1
+    player = SimulatedPlayer(players, seed)
+    sent: Optional[float] = None
+
+    def send(message: Message):
+        writer.write(encode(message))
+
+    send({'op': 'join', 'players': players})
+    try:
+        while not player.finished:
+            line = await reader.readline()
+            if not line:
+                break
+            message = json.loads(line)
+            op = message['op']
+            if op in ('update', 'error') and sent is not None:
+                stats.latencies.append(time.perf_counter() - sent)
+                sent = None
+            if op == 'joined':
+                player.seat = message['seat']
+            elif op == 'start':
+                player.start(message)
+            elif op == 'hand':
+                player.hand = message['cards']
+            elif op == 'update':
+                player.sync(message)
+            elif op == 'over':
+                player.finished = True
+                stats.matches += player.seat == 0 and 'reason' not in message
+                break
+            elif op == 'error':
+                stats.errors += 1
+                break
+            if player.my_turn and op in ('start', 'update', 'hand') and sent is None and player.hand:
+                send(player.move())
+                stats.moves += 1
+                sent = time.perf_counter()
+    finally:
+        writer.close()
+
+
+async def run_clients(host: str, port: int, clients: int, players: int, seed: int, ramp: float) -> LoadStats:
+    stats = LoadStats()
+    tasks = []
+    for k in range(clients):
+        tasks.append(asyncio.create_task(run_player(host, port, players, seed + k, stats)))
+        if ramp:
+            await asyncio.sleep(ramp)
+    for result in await asyncio.gather(*tasks, return_exceptions=True):
+        if isinstance(result, Exception):
+            stats.errors += 1
+    return stats
+
+
+def client_process(host: str, port: int, clients: int, players: int, seed: int, ramp: float) -> LoadStats:
+    raise_open_files_limit()
+    return asyncio.run(run_clients(host, port, clients, players, seed, ramp))
+
+
+async def server_stats(host: str, port: int) -> Message:
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(b'{"op":"stats"}\n')
+    message = json.loads(await reader.readline())
+    writer.close()
+    return message
+
+
+def wait_for_server(host: str, port: int, timeout: float = 10.0):
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            asyncio.run(server_stats(host, port))
+            return
+        except OSError:
+            if time.perf_counter() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+def report(stats: LoadStats, seconds: float, server: Message) -> str:
+    latencies = sorted(stats.latencies) or [0.0]
+
+    def percentile(p: float) -> float:
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1e3
+
+    return '\n'.join([
+        f'{stats.connections} connections, {stats.matches} matches, {stats.moves} moves, {stats.errors} errors '
+        f'in {seconds:.2f}s',
+        f'{stats.matches / seconds:.1f} matches/s, {stats.moves / seconds:.0f} moves/s',
+        f'move latency ms: mean {statistics.mean(latencies) * 1e3:.2f}, p50 {percentile(0.5):.2f}, '
+        f'p95 {percentile(0.95):.2f}, p99 {percentile(0.99):.2f}, max {latencies[-1] * 1e3:.2f}',
+        f'server: {server["cpu_seconds"]:.2f} cpu s for {server["finished"]} finished matches, '
+        f'{server["matches_per_cpu_second"]:.1f} matches per cpu second (one core)',
+    ])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load-test the match server with simulated players')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--clients', type=int, default=1000, help='connections, rounded down to whole matches')
+    parser.add_argument('--players', type=int, choices=sorted(PLAYER_COUNTS), default=4)
+    parser.add_argument('--processes', type=int, default=1, help='client processes sharing the connections')
+    parser.add_argument('--ramp', type=float, default=0.0, help='seconds between opening connections')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--spawn-server', action='store_true', help='start a server process for the test')
+    args = parser.parse_args()
+
+    server_process = None
+    if args.spawn_server:
+        server_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'server.py')
+        server_process = subprocess.Popen([sys.executable, server_path, '--host', args.host, '--port', str(args.port),
+                                           '--seed', str(args.seed)])
+    try:
+        wait_for_server(args.host, args.port)
+        before = asyncio.run(server_stats(args.host, args.port))
+        per_process = args.clients // args.players // args.processes * args.players
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=args.processes) as executor:
+            futures = [executor.submit(client_process, args.host, args.port, per_process, args.players,
+                                       args.seed + k * per_process, args.ramp) for k in range(args.processes)]
+            total = sum((f.result() for f in futures), LoadStats())
+        seconds = time.perf_counter() - start
+        after = asyncio.run(server_stats(args.host, args.port))
+        cpu = after['cpu_seconds'] - before['cpu_seconds']
+        finished = after['finished'] - before['finished']
+        after.update(cpu_seconds=cpu, finished=finished, matches_per_cpu_second=finished / cpu if cpu else 0.0)
+        print(report(total, seconds, after))
+    finally:
+        if server_process is not None:
+            server_process.terminate()
+            server_process.wait()
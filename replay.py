@@ -0,0 +1,381 @@
+from __future__ import annotations
+import argparse
+import itertools
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Iterator, List, NamedTuple, Optional, Tuple, Type
+
+from firetower import (CORNERS, Board, FireTowerGame, GameEvent, Geometry, OrientationEnum, Player, Players,
+                       TileStatus, WindDir)
+
+FILE_MAGIC = b'FTRP'
+GAME_MAGIC = b'GAME'
+INDEX_MAGIC = b'FTIX'
+VERSION = 2
+# version 1 files are still read: their game headers lack the board format and always hold a dense board
+READ_VERSIONS = (1, 2)
+FILE_HEADER = struct.Struct('<4sB3x')
+# magic, seed, move count, board size, corner per seat, active bits, wind, orientation, turn, pending action,
+# board format; followed by the board
+GAME_HEADER = struct.Struct('<4sQIH4sBBBBBB')
+GAME_HEADER_V1 = struct.Struct('<4sQIH4sBBBBB')
+# a dense board holds every tile at 2 bits; a sparse one a count, then the index and status of each tile that
+# isn't a tree, which is far smaller for a large board that is mostly forest
+DENSE_BOARD, SPARSE_BOARD = 0, 1
+SPARSE_COUNT = struct.Struct('<I')
+SPARSE_TILE = struct.Struct('<IB')
+MOVE_COUNT = struct.Struct('<I')
+MOVE_COUNT_OFFSET = struct.calcsize('<4sQ')
+# event, orientation, wind after the event, storm wind, tile index; boards of 256x256 and up need the wide tile index
+MOVE = struct.Struct('<BBBBH')
+WIDE_MOVE = struct.Struct('<BBBBI')
+# game offsets as little-endian u64s, then their count and the magic, closing the file
+INDEX_FOOTER = struct.Struct('<Q4s')
+
+# the id of every event a move record can hold, which is its position here: only ever append to this
+EVENTS = ('add_wind_fire', 'dozer_line', 'scratch_line', 'de_re_forest', 'flare_up', 'burning_snag', 'explosion',
+          'ember_phase_one', 'fire_truck', 'air_drop', 'smoke_jumper', 'ember_phase_two', 'no_action',
+          'fire_storm', 'roll_wind', 'end_turn')
+EVENT_CODES = {name: code for code, name in enumerate(EVENTS)}
+EVENT_KINDS = frozenset({'fire_storm', 'roll_wind', 'end_turn'})
+WINDS = tuple(WindDir)
+ORIENTATIONS = (None,) + tuple(OrientationEnum)
+STATUSES = (TileStatus.tree, TileStatus.fire, TileStatus.firebreak, TileStatus.off_board)
+STATUS_CODES = {status: code for code, status in enumerate(STATUSES)}
+NO_WIND = 0xff
+# every packed board byte as the four statuses it holds, lowest bits first
+UNPACKED = tuple(tuple(STATUSES[byte >> shift & 3] for shift in (0, 2, 4, 6)) for byte in range(256))
+
+
+class Step(NamedTuple):
+    event: GameEvent
+    wind: WindDir
+
+
+def move_struct(size: int) -> struct.Struct:
+    return MOVE if size * size < 0xffff else WIDE_MOVE
+
+
+def no_tile(move: struct.Struct) -> int:
+    """The tile index recorded for events without a tile, the largest the record can hold"""
+    return (1 << 8 * struct.calcsize(move.format[-1])) - 1
+
+
+def board_bytes(size: int) -> int:
+    return -(-size * size // 4)
+
+
+def pack_board(tiles: List[TileStatus]) -> bytes:
+    codes = [STATUS_CODES[s] for s in tiles] + [0] * (-len(tiles) % 4)
+    return bytes(codes[j] | codes[j + 1] << 2 | codes[j + 2] << 4 | codes[j + 3] << 6
+                 for j in range(0, len(codes), 4))
+
+
+def unpack_board(data: bytes, tiles: int) -> List[TileStatus]:
+    return [status for byte in data for status in UNPACKED[byte]][:tiles]
+
+
+def encode_board(board: Board) -> Tuple[int, bytes]:
+    """The board's format and bytes: sparse when that is smaller than packing every tile, otherwise dense"""
+    tiles = board.tiles
+    limit = (board_bytes(board.geometry.size) - SPARSE_COUNT.size) // SPARSE_TILE.size
+    # stop counting as soon as the sparse form would be the larger one, so a busy dense board isn't scanned twice
+    occupied = list(itertools.islice(board.occupied(), limit + 1))
+    if len(occupied) > limit:
+        return DENSE_BOARD, pack_board(tiles[:board.geometry.tiles])
+    return SPARSE_BOARD, SPARSE_COUNT.pack(len(occupied)) + b''.join(
+        SPARSE_TILE.pack(i, STATUS_CODES[tiles[i]]) for i in sorted(occupied))
+
+
+def encode_game(game: FireTowerGame) -> bytes:
+    """The game header and board for the game's current state, with a move count of 0 to be patched later"""
+    players = list(game.players)
+    corners = bytes(CORNERS.index(p.corner) for p in players).ljust(4, b'\xff')
+    active = sum(1 << k for k, p in enumerate(players) if p.active) | (0x80 if game.active else 0)
+    seed = game.seed & 0xffff_ffff_ffff_ffff if isinstance(game.seed, int) else 0
+    board_format, board = encode_board(game.board)
+    header = GAME_HEADER.pack(GAME_MAGIC, seed, 0, game.geometry.size, corners, active, WINDS.index(game.wind),
+                              ORIENTATIONS.index(game.orientation), game.turn, EVENT_CODES[game.action.__name__],
+                              board_format)
+    return header + board
+
+
+def encode_event(game: FireTowerGame, event: GameEvent) -> bytes:
+    storm = WINDS.index(event.storm_wind) if event.storm_wind is not None else NO_WIND
+    move = move_struct(game.geometry.size)
+    point = game.geometry.index(event.point) if event.point is not None else no_tile(move)
+    return move.pack(EVENT_CODES[event.action or event.kind], ORIENTATIONS.index(event.orientation),
+                     WINDS.index(game.wind), storm, point)
+
+
+def apply_step(game: FireTowerGame, step: Step):
+    """Play a recorded step on a game, forcing the recorded winds instead of rolling them"""
+    event, wind = step
+    if event.kind == 'play':
+        game.apply(event.action, event.point, event.orientation)
+    elif event.kind == 'fire_storm':
+        game.fire_storm(event.storm_wind, wind)
+        game.check_for_victory()
+    elif event.kind == 'end_turn':
+        game.end_turn()
+    if game.wind is not wind:
+        game.wind = wind
+    game.journal.commit()
+
+
+class GameRecorder:
+    """A game listener streaming every event of one game into a ReplayWriter. Call finish once the game is over"""
+
+    def __init__(self, writer: ReplayWriter, game: FireTowerGame, offset: int):
+        self.writer = writer
+        self.game: Optional[FireTowerGame] = game
+        self.offset = offset
+        self.moves = 0
+        game.listeners.append(self)
+
+    def __call__(self, game: FireTowerGame, event: GameEvent):
+        self.writer.file.write(encode_event(game, event))
+        self.moves += 1
+
+    def finish(self):
+        if self.game is None:
+            return
+        self.game.listeners.remove(self)
+        self.game = None
+        self.writer.end_game(self)
+
+    def __enter__(self) -> GameRecorder:
+        return self
+
+    def __exit__(self, *_):
+        self.finish()
+
+
+class ReplayWriter:
+    """
+    Streams games into a replay file, one game at a time. Each game starts with a header holding the seed, seating
+    and starting board, dense or sparse whichever is smaller, followed by a 6-byte record per move (8 on boards over 255x255) as it happens.
+    Closing the writer appends an index of game offsets so readers can seek straight to any game
+    """
+
+    def __init__(self, path: str):
+        self.file = open(path, 'wb')
+        self.file.write(FILE_HEADER.pack(FILE_MAGIC, VERSION))
+        self.offsets = array('Q')
+        self.recording: Optional[GameRecorder] = None
+
+    def record(self, game: FireTowerGame) -> GameRecorder:
+        """Start recording a game from its current state"""
+        if self.recording is not None:
+            raise ValueError('a game is already being recorded, finish it first')
+        offset = self.file.tell()
+        self.file.write(encode_game(game))
+        self.offsets.append(offset)
+        self.recording = GameRecorder(self, game, offset)
+        return self.recording
+
+    def end_game(self, recorder: GameRecorder):
+        self.file.seek(recorder.offset + MOVE_COUNT_OFFSET)
+        self.file.write(MOVE_COUNT.pack(recorder.moves))
+        self.file.seek(0, os.SEEK_END)
+        self.recording = None
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        if self.file.closed:
+            return
+        if self.recording is not None:
+            self.recording.finish()
+        offsets = array('Q', self.offsets)
+        if sys.byteorder == 'big':
+            offsets.byteswap()
+        self.file.write(offsets.tobytes())
+        self.file.write(INDEX_FOOTER.pack(len(offsets), INDEX_MAGIC))
+        self.file.close()
+
+    def __enter__(self) -> ReplayWriter:
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+class GameReplay:
+    """One recorded game, read in place from the replay file's buffer"""
+
+    def __init__(self, buffer: mmap.mmap, offset: int, version: int = VERSION):
+        header = GAME_HEADER if version > 1 else GAME_HEADER_V1
+        fields = header.unpack_from(buffer, offset)
+        (magic, self.seed, self.moves, self.size, corners, self.active_bits, wind, orientation, self.turn,
+         action) = fields[:10]
+        self.board_format = fields[10] if version > 1 else DENSE_BOARD
+        if magic != GAME_MAGIC:
+            raise ValueError(f'no game recorded at offset {offset}')
+        if self.board_format not in (DENSE_BOARD, SPARSE_BOARD):
+            raise ValueError(f'unknown board format {self.board_format} at offset {offset}')
+        self.buffer = buffer
+        self.offset = offset
+        self.corners = [CORNERS[c] for c in corners if c != 0xff]
+        self.wind = WINDS[wind]
+        self.orientation = ORIENTATIONS[orientation]
+        self.action = EVENTS[action]
+        self.board_offset = offset + header.size
+        if self.board_format == SPARSE_BOARD:
+            count, = SPARSE_COUNT.unpack_from(buffer, self.board_offset)
+            self.moves_offset = self.board_offset + SPARSE_COUNT.size + count * SPARSE_TILE.size
+        else:
+            self.moves_offset = self.board_offset + board_bytes(self.size)
+        self.move = move_struct(self.size)
+        self.no_tile = no_tile(self.move)
+        self.end = self.moves_offset + self.moves * self.move.size
+
+    def __len__(self) -> int:
+        return self.moves
+
+    def __getitem__(self, k: int) -> Step:
+        if not -self.moves <= k < self.moves:
+            raise IndexError(f'move {k} out of range for a game of {self.moves} moves')
+        offset = self.moves_offset + k % self.moves * self.move.size
+        code, orientation, wind, storm, point = self.move.unpack_from(self.buffer, offset)
+        name = EVENTS[code]
+        if name in EVENT_KINDS:
+            event = GameEvent(name, storm_wind=WINDS[storm] if storm != NO_WIND else None)
+        else:
+            point = Geometry.of(self.size).points[point] if point != self.no_tile else None
+            event = GameEvent('play', name, point, ORIENTATIONS[orientation])
+        return Step(event, WINDS[wind])
+
+    def __iter__(self) -> Iterator[Step]:
+        for k in range(self.moves):
+            yield self[k]
+
+    def tiles(self) -> List[TileStatus]:
+        if self.board_format == DENSE_BOARD:
+            return unpack_board(self.buffer[self.board_offset:self.moves_offset], self.size * self.size)
+        tiles = [TileStatus.tree] * (self.size * self.size)
+        for i, status in self.placed():
+            tiles[i] = status
+        return tiles
+
+    def placed(self) -> Iterator[Tuple[int, TileStatus]]:
+        """The index and status of every tile of the starting board that isn't a tree"""
+        if self.board_format == DENSE_BOARD:
+            return ((i, status) for i, status in enumerate(self.tiles()) if status is not TileStatus.tree)
+        data = self.buffer[self.board_offset + SPARSE_COUNT.size:self.moves_offset]
+        return ((i, STATUSES[code]) for i, code in SPARSE_TILE.iter_unpack(data))
+
+    def start(self, board_type: Optional[Type[Board]] = None) -> FireTowerGame:
+        """A fresh game in the recorded starting state"""
+        players = [Player(f'Player {k + 1}', corner, bool(self.active_bits >> k & 1))
+                   for k, corner in enumerate(self.corners)]
+        game = FireTowerGame(Players(*players), board_type, self.seed, self.size)
+        game.verbose = False
+        board = game.board
+        placed = dict(self.placed())
+        for i in [i for i in board.occupied() if i not in placed]:
+            board.put(i, TileStatus.tree)
+        for i, status in placed.items():
+            if status is not board.tiles[i]:
+                board.put(i, status)
+        game.active = bool(self.active_bits & 0x80)
+        game.turn = self.turn
+        game.wind = self.wind
+        game.orientation = self.orientation
+        game.action = getattr(game, self.action)
+        game.journal.clear()
+        return game
+
+    def game_at(self, step: Optional[int] = None, board_type: Optional[Type[Board]] = None) -> FireTowerGame:
+        """The game after its first `step` moves have been replayed, or after all of them"""
+        game = self.start(board_type)
+        for k in range(self.moves if step is None else step):
+            apply_step(game, self[k])
+        return game
+
+    def board_at(self, step: Optional[int] = None, board_type: Optional[Type[Board]] = None) -> Board:
+        return self.game_at(step, board_type).board
+
+
+class ReplayReader:
+    """
+    Memory-maps a replay file for iterating over or random access to its games without loading the file.
+    Uses the index written on close, or finds the games by walking their headers if the writer never closed
+    """
+
+    def __init__(self, path: str):
+        self.file = open(path, 'rb')
+        self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version = FILE_HEADER.unpack_from(self.buffer)
+        if magic != FILE_MAGIC:
+            raise ValueError(f'{path} is not a replay file')
+        if version not in READ_VERSIONS:
+            raise ValueError(f'{path} is replay version {version}, expecting one of {READ_VERSIONS}')
+        self.version = version
+        self.offsets = self.read_index()
+        if self.offsets is None:
+            self.offsets = self.scan()
+
+    def read_index(self) -> Optional[array]:
+        end = len(self.buffer) - INDEX_FOOTER.size
+        if end < FILE_HEADER.size:
+            return None
+        count, magic = INDEX_FOOTER.unpack_from(self.buffer, end)
+        if magic != INDEX_MAGIC:
+            return None
+        offsets = array('Q', self.buffer[end - 8 * count:end])
+        if sys.byteorder == 'big':
+            offsets.byteswap()
+        return offsets
+
+    def scan(self) -> array:
+        offsets = array('Q')
+        offset = FILE_HEADER.size
+        header = GAME_HEADER if self.version > 1 else GAME_HEADER_V1
+        while offset + header.size <= len(self.buffer) and self.buffer[offset:offset + 4] == GAME_MAGIC:
+            offsets.append(offset)
+            offset = GameReplay(self.buffer, offset, self.version).end
+        return offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __getitem__(self, k: int) -> GameReplay:
+        return GameReplay(self.buffer, self.offsets[k], self.version)
+
+    def __iter__(self) -> Iterator[GameReplay]:
+        for offset in self.offsets:
+            yield GameReplay(self.buffer, offset, self.version)
+
+    def close(self):
+        self.buffer.close()
+        self.file.close()
+
+    def __enter__(self) -> ReplayReader:
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Inspect a Fire Tower replay file')
+    parser.add_argument('path')
+    parser.add_argument('--game', type=int, default=None, help='show this game instead of listing them all')
+    parser.add_argument('--step', type=int, default=None, help='replay this many moves of the game, default all')
+    args = parser.parse_args()
+    with ReplayReader(args.path) as reader:
+        if args.game is None:
+            for k, replay in enumerate(reader):
+                print(f'{k}: seed {replay.seed}, {len(replay)} moves')
+        else:
+            game = reader[args.game].game_at(args.step)
+            size = game.geometry.size
+            tiles = game.board.tiles
+            for y in range(size):
+                print(''.join(Board.CHAR_MAP[tiles[y * size + x]] for x in range(size)))
+            print(f'wind {game.wind.name}, turn {game.turn}, {"active" if game.active else "over"}')
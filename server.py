@@ -0,0 +1,347 @@
+from __future__ import annotations
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+from bots import CARD_PHASE, FIRE_PHASE
+from deck import UNTARGETED, TurnEngine
+from firetower import Board, FireTowerGame, OrientationEnum, Point
+from simulator import PLAYER_COUNTS, game_seed
+
+EMBER_PHASE = 'ember'
+# the most bytes a client may fall behind by before it is dropped
+MAX_BUFFERED = 1 << 20
+Message = Dict[str, Any]
+
+
+def encode(message: Message) -> bytes:
+    return json.dumps(message, separators=(',', ':')).encode() + b'\n'
+
+
+def raise_open_files_limit():
+    """Allow as many sockets as the hard limit does, where the platform has one"""
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+class Connection:
+    """One client socket, speaking one JSON object per line both ways"""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.match: Optional[Match] = None
+        self.seat: Optional[int] = None
+        self.watching: Optional[Match] = None
+
+    def send(self, message: Message):
+        self.write(encode(message))
+
+    def write(self, line: bytes):
+        if self.writer.is_closing():
+            return
+        if self.writer.transport.get_write_buffer_size() > MAX_BUFFERED:
+            # a client that stopped reading would have every broadcast pile up for it, so it is dropped instead;
+            # its serve_client then sees the connection close and leaves its match as on any disconnect
+            self.writer.transport.abort()
+            return
+        self.writer.write(line)
+
+    async def receive(self) -> Optional[Message]:
+        line = await self.reader.readline()
+        return json.loads(line) if line else None
+
+
+class Match:
+    """
+    A game between connected seats, played through a TurnEngine. Every accepted move is broadcast as an update
+    holding only the tiles written since the last one, from the board's dirty set, plus wind, turn and phase;
+    each seat is sent its own hand privately whenever it changes. Spectators get everything but the hands
+    """
+
+    def __init__(self, match_id: int, players: int, seed: int, max_turns: int):
+        self.id = match_id
+        self.game = FireTowerGame(PLAYER_COUNTS[players](), seed=seed)
+        self.game.verbose = False
+        self.engine = TurnEngine(self.game)
+        self.seats: List[Optional[Connection]] = [None] * players
+        self.spectators: List[Connection] = []
+        self.max_turns = max_turns
+        self.phase = FIRE_PHASE
+        self.seq = 0
+        self.moves = 0
+        self.over = False
+        self.ending: Optional[Message] = None
+        self.completed = False
+
+    @property
+    def full(self) -> bool:
+        return all(self.seats)
+
+    def seat(self, connection: Connection) -> int:
+        k = self.seats.index(None)
+        self.seats[k] = connection
+        connection.match, connection.seat = self, k
+        return k
+
+    def broadcast(self, message: Message):
+        line = encode(message)
+        for connection in self.seats:
+            if connection is not None:
+                connection.write(line)
+        for connection in self.spectators:
+            connection.write(line)
+
+    def send_hand(self, k: int):
+        if self.seats[k] is not None:
+            self.seats[k].send({'op': 'hand', 'cards': [card.action.__name__ for card in self.engine.hand(k)]})
+
+    def start(self):
+        self.broadcast(self.snapshot())
+        self.game.board.dirty.clear()
+        for k in range(len(self.seats)):
+            self.send_hand(k)
+
+    def snapshot(self) -> Message:
+        """The start message, holding the whole board as it is now"""
+        board = self.game.board
+        return {'op': 'start', 'match': self.id, 'size': self.game.geometry.size,
+                'board': ''.join(Board.CHAR_MAP[s] for s in board.tiles[:self.game.geometry.tiles]), **self.state()}
+
+    def watch(self, connection: Connection):
+        """Add a spectator, sending it the board so far if the match has started"""
+        self.spectators.append(connection)
+        connection.watching = self
+        if self.full:
+            connection.send(self.snapshot())
+            if self.ending is not None:
+                connection.send(self.ending)
+
+    def state(self) -> Message:
+        return {'wind': self.game.wind.name, 'turn': self.game.turn, 'phase': self.phase,
+                'players': [p.active for p in self.game.players]}
+
+    def update(self):
+        """Broadcast the tiles changed by the last move, then end the match if the game is over"""
+        board = self.game.board
+        self.seq += 1
+        self.broadcast({'op': 'update', 'seq': self.seq,
+                        'tiles': [[i, Board.CHAR_MAP[board.tiles[i]]] for i in sorted(board.dirty)], **self.state()})
+        board.dirty.clear()
+        if not self.game.active or self.engine.turns >= self.max_turns:
+            remaining = [p for p in self.game.players if p.active]
+            winner = remaining[0].corner.name if not self.game.active and remaining else None
+            self.completed = True
+            self.finish({'op': 'over', 'winner': winner, 'turns': self.engine.turns})
+
+    def finish(self, message: Message):
+        if not self.over:
+            self.over = True
+            self.ending = message
+            self.broadcast(message)
+
+    def handle(self, k: int, message: Message) -> Optional[str]:
+        """Play a seat's move, returning why it was refused if it was"""
+        if self.over:
+            return 'the match is over'
+        if k != self.game.turn:
+            return 'not your turn'
+        op = message.get('op')
+        point = Point(message['x'], message['y']) if 'x' in message and 'y' in message else None
+        if point is not None and not (all(isinstance(c, int) for c in point) and self.game.board.on_board(point)):
+            return 'that tile is not on the board'
+        engine = self.engine
+        if self.phase == FIRE_PHASE:
+            if op == 'fire' and point is not None:
+                if not engine.place_wind_fire(point):
+                    return 'wind fire not valid there'
+            elif op != 'pass' or self.wind_fire_possible():
+                return 'expecting the wind fire'
+            self.phase = CARD_PHASE
+        elif self.phase == CARD_PHASE:
+            if op == 'card':
+                position = message.get('card')
+                if not isinstance(position, int) or not 0 <= position < len(engine.deck.hands[k]):
+                    return 'no such card in hand'
+                if point is None and engine.hand(k)[position].action.__name__ not in UNTARGETED:
+                    return 'the card needs a tile'
+                orientation = OrientationEnum[message['orientation']] if 'orientation' in message else None
+                if not engine.play_card(position, point, orientation):
+                    return 'card not valid there'
+            elif op == 'discard':
+                position = message.get('card')
+                if not isinstance(position, int) or not 0 <= position < len(engine.deck.hands[k]):
+                    return 'no such card in hand'
+                engine.discard(position)
+            elif op != 'pass':
+                return 'expecting a card, a discard or a pass'
+            self.phase = EMBER_PHASE if self.game.action == self.game.ember_phase_two else FIRE_PHASE
+        elif self.phase == EMBER_PHASE:
+            if op == 'ember' and point is not None:
+                if not engine.play_action('ember_phase_two', point):
+                    return 'ember not valid there'
+            elif op != 'pass':
+                return 'expecting the ember or a pass'
+            self.phase = FIRE_PHASE
+        self.moves += 1
+        if self.phase == FIRE_PHASE and self.game.active:
+            engine.end_turn()
+            self.send_hand(k)
+        self.update()
+        return None
+
+    def wind_fire_possible(self) -> bool:
+        return any(self.game.plan_add_wind_fire(i) is not None for i in self.game.candidates('add_wind_fire'))
+
+
+class GameServer:
+    """
+    Hosts any number of concurrent matches in one event loop. Clients send {"op": "join", "players": n} and are
+    seated in the next match waiting for that many players, which starts as soon as it is full. Spectators send
+    {"op": "watch"}, with a "match" id or without to be given one, and again once it is over to watch another
+    """
+
+    def __init__(self, seed: int = 0, max_turns: int = 200):
+        self.seed = seed
+        self.max_turns = max_turns
+        self.ids = itertools.count()
+        self.lobby: Dict[int, Match] = {}
+        self.matches: Dict[int, Match] = {}
+        self.finished = 0
+        self.moves = 0
+        self.connections = 0
+        self.started = time.perf_counter()
+        self.cpu_started = time.process_time()
+
+    def join(self, connection: Connection, players: int):
+        match = self.lobby.get(players)
+        if match is None:
+            match_id = next(self.ids)
+            match = self.lobby[players] = self.matches[match_id] = Match(
+                match_id, players, game_seed(self.seed, match_id), self.max_turns)
+        k = match.seat(connection)
+        connection.send({'op': 'joined', 'match': match.id, 'seat': k,
+                         'corner': list(match.game.players)[k].corner.name})
+        if match.full:
+            del self.lobby[players]
+            match.start()
+
+    def watch(self, connection: Connection, match_id: Optional[int] = None):
+        """
+        Add a spectator to the given match, or without one to the match in play with the fewest spectators, so that
+        spectators asking in turn spread over the matches
+        """
+        if connection.watching is not None:
+            connection.watching.spectators.remove(connection)
+            connection.watching = None
+        if match_id is not None:
+            match = self.matches.get(match_id)
+        else:
+            match = min((m for m in self.matches.values() if m.full and not m.over),
+                        key=lambda m: len(m.spectators), default=None)
+        if match is None:
+            connection.send({'op': 'error', 'message': 'no match to watch'})
+        else:
+            match.watch(connection)
+
+    def stats(self) -> Message:
+        cpu = time.process_time() - self.cpu_started
+        return {'op': 'stats', 'matches': len(self.matches), 'finished': self.finished, 'moves': self.moves,
+                'connections': self.connections, 'seconds': time.perf_counter() - self.started, 'cpu_seconds': cpu,
+                'matches_per_cpu_second': self.finished / cpu if cpu else 0.0}
+
+    def close_match(self, match: Match):
+        if self.matches.pop(match.id, None) is not None:
+            self.finished += match.completed
+            self.moves += match.moves
+            if self.lobby.get(len(match.seats)) is match:
+                del self.lobby[len(match.seats)]
+
+    async def serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        connection = Connection(reader, writer)
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    message = await connection.receive()
+                except (ConnectionError, json.JSONDecodeError, ValueError):
+                    break
+                if message is None:
+                    break
+                self.dispatch(connection, message)
+                await writer.drain()
+        finally:
+            self.connections -= 1
+            if connection.watching is not None:
+                connection.watching.spectators.remove(connection)
+            match = connection.match
+            if match is not None:
+                match.seats[connection.seat] = None
+                if self.lobby.get(len(match.seats)) is not match:
+                    match.finish({'op': 'over', 'winner': None, 'turns': match.engine.turns, 'reason': 'disconnect'})
+                # a match still waiting for players just frees the seat for the next to join
+                if not any(match.seats):
+                    self.close_match(match)
+            writer.close()
+
+    def dispatch(self, connection: Connection, message: Message):
+        """
+        Act on one client message, answering anything malformed, or any move the engine fails on, with an error
+        rather than dropping the client and ending its match
+        """
+        if not isinstance(message, dict):
+            error = 'messages must be JSON objects'
+        else:
+            try:
+                error = self.route(connection, message)
+            except (KeyError, TypeError, ValueError) as e:
+                error = f'bad message: {e!r}'
+            except Exception as e:
+                error = f'move failed: {e!r}'
+        if error is not None:
+            connection.send({'op': 'error', 'message': error})
+
+    def route(self, connection: Connection, message: Message) -> Optional[str]:
+        """Hand a message to whatever deals with its op, returning why it was refused if it was"""
+        op = message.get('op')
+        if op == 'join' and connection.match is None:
+            players = message.get('players', 4)
+            if players not in PLAYER_COUNTS:
+                return f'{players} players not supported'
+            self.join(connection, players)
+        elif op == 'stats':
+            connection.send(self.stats())
+        elif op == 'watch':
+            self.watch(connection, message.get('match'))
+        elif connection.match is None or not connection.match.full:
+            return 'not in a started match'
+        else:
+            return connection.match.handle(connection.seat, message)
+        return None
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 8765):
+        server = await asyncio.start_server(self.serve_client, host, port, backlog=4096)
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Host Fire Tower matches over a line-delimited JSON protocol')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-turns', type=int, default=200)
+    args = parser.parse_args()
+    raise_open_files_limit()
+    try:
+        asyncio.run(GameServer(args.seed, args.max_turns).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,218 @@
+from __future__ import annotations
+import argparse
+import hashlib
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack, nullcontext
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Sequence, Type
+
+from bots import FIRE_PHASE, Policy, RandomBot, MCTSBot, ThreatBot, advance
+from firetower import ActionRecord, Board, Corner, FireTowerGame, Player, Players
+from instrument import JsonlTrace, LoopProfiler
+from replay import ReplayWriter
+
+PolicyFactory = Callable[..., Policy]
+Hook = Callable[[FireTowerGame, ActionRecord], Any]
+PLAYER_COUNTS = {2: Players.two_player, 3: Players.three_player, 4: Players.four_player}
+
+
+def game_seed(seed: int, index: int) -> int:
+    """An independent 64-bit seed for the index-th game of a run, whichever worker ends up playing it"""
+    return int.from_bytes(hashlib.sha256(f'{seed}:{index}'.encode()).digest()[:8], 'little')
+
+
+@dataclass
+class GameResult:
+    seed: int
+    winner: Optional[str]
+    turns: int
+    cards: Dict[str, int]
+
+
+@dataclass
+class SimulationReport:
+    games: int = 0
+    wins: Counter = field(default_factory=Counter)
+    turns: List[int] = field(default_factory=list)
+    cards: Counter = field(default_factory=Counter)
+    seconds: float = 0.0
+
+    def add(self, result: GameResult):
+        self.games += 1
+        self.wins[result.winner or 'none'] += 1
+        self.turns.append(result.turns)
+        self.cards.update(result.cards)
+
+    @property
+    def win_rates(self) -> Dict[str, float]:
+        return {corner: wins / self.games for corner, wins in sorted(self.wins.items())}
+
+    @property
+    def mean_turns(self) -> float:
+        return sum(self.turns) / len(self.turns) if self.turns else 0.0
+
+    @property
+    def games_per_second(self) -> float:
+        return self.games / self.seconds if self.seconds else 0.0
+
+    def summary(self) -> str:
+        lines = [f'{self.games} games in {self.seconds:.2f}s ({self.games_per_second:.1f} games/s)',
+                 f'turns: mean {self.mean_turns:.1f}, min {min(self.turns, default=0)}, '
+                 f'max {max(self.turns, default=0)}',
+                 'win rates: ' + ', '.join(f'{corner} {rate:.1%}' for corner, rate in self.win_rates.items()),
+                 'cards: ' + ', '.join(f'{card} {count}' for card, count in self.cards.most_common())]
+        return '\n'.join(lines)
+
+
+class GameRun:
+    """
+    One game between a policy per seat, played a move at a time by step. The game's wind rolls, fire storms and
+    every policy draw from random streams derived from the seed, so the same seed always replays the same game.
+    corners seats the players in those corners, in turn order, instead of the default ones for the player count
+    """
+
+    def __init__(self, seed: int, policies: Sequence[PolicyFactory], players: int = 4, max_turns: int = 200,
+                 storm_chance: float = 0.1, board_type: Optional[Type[Board]] = None,
+                 corners: Sequence[Corner] = ()):
+        seating = (Players(*(Player(f'Player {k + 1}', corner) for k, corner in enumerate(corners))) if corners
+                   else PLAYER_COUNTS[players]())
+        self.seed = seed
+        self.game = game = FireTowerGame(seating, board_type, seed)
+        game.verbose = False
+        self.seats = [policies[k % len(policies)](seed=game.rng.getrandbits(32)) for k in range(players)]
+        self.max_turns = max_turns
+        self.storm_chance = storm_chance
+        self.cards = Counter()
+        self.turns = 0
+        self.phase = FIRE_PHASE
+
+    @property
+    def over(self) -> bool:
+        return not self.game.active or self.turns >= self.max_turns
+
+    def step(self):
+        """Play the next phase of the current turn, and the fire storm that may follow a finished turn"""
+        game = self.game
+        move = self.seats[game.turn].choose(game, self.phase)
+        if move is not None:
+            self.cards[move.action] += 1
+        self.phase = advance(game, self.phase, move)
+        if self.phase == FIRE_PHASE:
+            self.turns += 1
+            if game.active and game.rng.random() < self.storm_chance:
+                self.cards['fire_storm'] += 1
+                game.fire_storm()
+                game.check_for_victory()
+
+    def close(self):
+        for seat in self.seats:
+            if hasattr(seat, 'close'):
+                seat.close()
+
+    def result(self) -> GameResult:
+        remaining = [p for p in self.game.players if p.active]
+        winner = remaining[0].corner.name if not self.game.active and remaining else None
+        return GameResult(self.seed, winner, self.turns, dict(self.cards))
+
+
+def play_game(seed: int, policies: Sequence[PolicyFactory], players: int = 4, max_turns: int = 200,
+              storm_chance: float = 0.1, writer: Optional[ReplayWriter] = None,
+              board_type: Optional[Type[Board]] = None, hooks: Sequence[Hook] = (),
+              profiler: Optional[LoopProfiler] = None, corners: Sequence[Corner] = ()) -> GameResult:
+    """
+    Play one full game as a GameRun. Every move is streamed to the writer's replay file if one is given, the hooks
+    are attached to the game and the profiler samples the moves, bot decisions included
+    """
+    run = GameRun(seed, policies, players, max_turns, storm_chance, board_type, corners)
+    run.game.hooks.extend(hooks)
+    recorder = writer.record(run.game) if writer is not None else None
+    while not run.over:
+        with profiler.step() if profiler is not None else nullcontext():
+            run.step()
+    run.close()
+    if recorder is not None:
+        recorder.finish()
+    return run.result()
+
+
+def _play_chunk(seed: int, indices: range, policies: Sequence[PolicyFactory], players: int, max_turns: int,
+                storm_chance: float, replay_dir: Optional[str] = None, trace_dir: Optional[str] = None,
+                profile_sample: float = 0.0) -> List[GameResult]:
+    with ExitStack() as stack:
+        writer = hooks = profiler = None
+        if replay_dir is not None:
+            writer = stack.enter_context(ReplayWriter(os.path.join(replay_dir, f'games-{indices.start:08d}.ftr')))
+        if trace_dir is not None:
+            hooks = [stack.enter_context(JsonlTrace(os.path.join(trace_dir, f'trace-{indices.start:08d}.jsonl')))]
+            if profile_sample:
+                profiler = LoopProfiler(profile_sample, seed=game_seed(seed, indices.start))
+        results = [play_game(game_seed(seed, i), policies, players, max_turns, storm_chance, writer,
+                             hooks=hooks or (), profiler=profiler) for i in indices]
+    if profiler is not None:
+        profiler.dump(os.path.join(trace_dir, f'profile-{indices.start:08d}.prof'))
+    return results
+
+
+def simulate(games: int, policies: Sequence[PolicyFactory] = (RandomBot,), players: int = 4, seed: int = 0,
+             workers: Optional[int] = None, max_turns: int = 200, storm_chance: float = 0.1,
+             chunk_size: Optional[int] = None, replay_dir: Optional[str] = None, trace_dir: Optional[str] = None,
+             profile_sample: float = 0.0) -> SimulationReport:
+    """
+    Play many games across a process pool and aggregate win rates per corner, game lengths and card usage.
+    Games are handed out in chunks to keep inter-process traffic low; results do not depend on the worker count.
+    With a replay_dir, each chunk's games are recorded to their own replay file there. With a trace_dir, each chunk
+    writes a JSONL trace of every action there, plus a cProfile dump of a profile_sample share of the moves
+    """
+    workers = workers or os.cpu_count() or 1
+    for directory in (replay_dir, trace_dir):
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+    chunk_size = chunk_size or max(1, min(64, games // (4 * workers)))
+    chunks = [range(start, min(start + chunk_size, games)) for start in range(0, games, chunk_size)]
+    report = SimulationReport()
+    start = time.perf_counter()
+    if workers == 1:
+        for chunk in chunks:
+            for result in _play_chunk(seed, chunk, policies, players, max_turns, storm_chance, replay_dir,
+                                      trace_dir, profile_sample):
+                report.add(result)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            play = partial(_play_chunk, seed, policies=policies, players=players, max_turns=max_turns,
+                           storm_chance=storm_chance, replay_dir=replay_dir, trace_dir=trace_dir,
+                           profile_sample=profile_sample)
+            for results in executor.map(play, chunks):
+                for result in results:
+                    report.add(result)
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+POLICIES = {
+    'random': RandomBot,
+    'mcts': partial(MCTSBot, iterations=50),
+    'threat': ThreatBot,
+}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Play many Fire Tower games between bots and report statistics')
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--players', type=int, choices=sorted(PLAYER_COUNTS), default=4)
+    parser.add_argument('--policy', action='append', choices=sorted(POLICIES),
+                        help='policy per seat, repeated for each seat and cycled if fewer than the players')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--max-turns', type=int, default=200)
+    parser.add_argument('--replay-dir', default=None, help='record every game to replay files in this directory')
+    parser.add_argument('--trace-dir', default=None, help='write JSONL action traces to this directory')
+    parser.add_argument('--profile-sample', type=float, default=0.0,
+                        help='with --trace-dir, also profile this share of the moves, e.g. 0.01')
+    args = parser.parse_args()
+    print(simulate(args.games, [POLICIES[p] for p in args.policy or ['random']], args.players, args.seed,
+                   args.workers, args.max_turns, replay_dir=args.replay_dir, trace_dir=args.trace_dir,
+                   profile_sample=args.profile_sample).summary())
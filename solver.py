@@ -0,0 +1,338 @@
+from __future__ import annotations
+import argparse
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, Iterator, List, Optional, Tuple
+
+from bots import CARD_PHASE, FIRE_PHASE, RandomBot, phase_actions, play_turn
+from firetower import (Corner, FireTowerGame, Move, OrientationEnum, Plan, ThreatMaps, TileStatus,
+                       TranspositionTable, WindDir)
+
+# the most placements one move can take off the fire's path to any tile. A flare-up sets three tiles alight; a
+# burning snag's square touches fire already, so a path enters it from there and crosses at most three of its tiles;
+# an explosion's ring is at most two steps from its centre, which was fire already
+FIRE_GAIN = {'add_wind_fire': 1, 'flare_up': 3, 'burning_snag': 3, 'explosion': 2, 'ember_phase_one': 1,
+             'ember_phase_two': 1, 'de_re_forest': 0}
+# a player burned out has their whole tower set alight, which a path crosses from the corner in at most four tiles
+TOWER_GAIN = 4
+# actions that only ever add fire, so playing one is never worse for the attacker than passing, as long as the fire
+# cannot reach the attacker's own corner
+PURE_FIRE = frozenset({'add_wind_fire', 'flare_up', 'burning_snag', 'ember_phase_two'})
+ORIENTATIONS = tuple(OrientationEnum)
+
+
+class OutOfTime(Exception):
+    pass
+
+
+@dataclass
+class Solution:
+    """
+    forced is True if the attacker can burn the target within `moves` of their own moves, whatever the wind does,
+    False if no depth up to `moves` can, and None if the time ran out before either was shown. line is the attacker's
+    winning play up to the first wind roll
+    """
+    forced: Optional[bool]
+    moves: int
+    line: List[Optional[Move]] = field(default_factory=list)
+    nodes: int = 0
+    seconds: float = 0.0
+
+
+class ForcedBurnSolver:
+    """
+    Answers whether the current player can force fire into a target player's tower within N of their own moves,
+    counting the wind fire and the card of each turn as one move each, for every wind rolled between their turns.
+    It is an AND-OR search by iterative deepening: the attacker's moves are OR nodes and the wind rolls AND nodes;
+    the other players' turns and fire storms are left out, as in a puzzle. A hand set in game.allowed_actions stays
+    the attacker's hand from turn to turn.
+
+    A threat map for the target tower orders the moves by how close they bring fire to the tower and prunes
+    positions where the moves left could not close the gap, even playing the largest card each turn and burning out
+    every other player in reach. A move is counted by how many placements it can take off the fire's path, in
+    FIRE_GAIN, rather than by the tiles it sets alight. The map lets fire through firebreaks at the cost of a tree, so
+    the bound holds when de_re_forest clears one. It is searched afresh at each position, and only as far from the
+    tower as the moves left could carry fire, which near the leaves is a handful of tiles: cheaper than repairing a
+    map as every move is played and rolled back.
+
+    While the same bound shows that fire cannot reach the attacker's own corner in the moves left, only the cards
+    that add fire are tried, and passing is left out when a card that only adds fire can be played: more fire and no
+    more firebreaks then never leaves the attacker worse off. Where the corner is in reach, a wind fire the attacker
+    is made to place could burn it out, so the whole hand and passing are searched.
+    A last move is judged from the planners' tile changes without being played. Proven results go into a
+    transposition table keyed on the game hash, phase, target and hand, which is kept between depths and calls.
+
+    On one core it searches some 8000 positions a second on the 16x16 board. Positions with fire within 8
+    placements of a tower are settled to 6 moves in under a second; with fire 10 away, most are still unsettled
+    at 8 moves after 30 seconds
+    """
+
+    def __init__(self, table_size: int = 1 << 18):
+        self.table = TranspositionTable(table_size)
+        self.nodes = 0
+        self.deadline: Optional[float] = None
+        self.game: Optional[FireTowerGame] = None
+        self.target: Optional[Corner] = None
+        self.tower: FrozenSet[int] = frozenset()
+        self.attacker = None
+        self.own_corner: FrozenSet[int] = frozenset()
+        self.threats: Optional[ThreatMaps] = None
+        self.distance: List[int] = []
+
+    def solve(self, game: FireTowerGame, target: Corner, max_moves: int = 4,
+              time_limit: Optional[float] = None, phase: str = FIRE_PHASE) -> Solution:
+        """Search depth 1, 2, ... up to max_moves from the given phase of the current player's turn"""
+        start = time.perf_counter()
+        self.deadline = start + time_limit if time_limit is not None else None
+        self.nodes = 0
+        self.game = game = game.copy()
+        game.verbose = False
+        self.target = target
+        self.tower = game.geometry.towers[target]
+        self.attacker = game.current_player
+        self.own_corner = frozenset({game.geometry.corners[self.attacker.corner]})
+        # the copy's own maps would be repaired on every move played; the search maps its positions itself
+        game.board.threats = None
+        self.threats = ThreatMaps(game.board, {target: self.tower}, walls=False)
+        solution = Solution(False, 0)
+        try:
+            for depth in range(1, max_moves + 1):
+                if self.prove(phase, depth):
+                    solution = Solution(True, depth, self.line(phase))
+                    break
+                solution = Solution(False, depth)
+        except OutOfTime:
+            solution = Solution(None, solution.moves)
+        solution.nodes = self.nodes
+        solution.seconds = time.perf_counter() - start
+        return solution
+
+    @property
+    def burned(self) -> bool:
+        return self.game.board.any_status(self.tower, TileStatus.fire)
+
+    def key(self, phase: str) -> Tuple[int, str, str, Optional[FrozenSet[str]]]:
+        allowed = self.game.allowed_actions
+        return self.game.hash, phase, self.target.name, None if allowed is None else frozenset(allowed)
+
+    def winds(self) -> List[WindDir]:
+        """Every wind the next roll can come up with, as get_random_wind draws them"""
+        valid = {w for p in self.game.players if p.active for w in p.corner}
+        return [w for w in WindDir if w in valid]
+
+    def prove(self, phase: str, depth: int) -> bool:
+        """Whether the attacker, to play the given phase, can burn the target within depth moves"""
+        game = self.game
+        if self.burned:
+            return True
+        if depth <= 0 or not game.active or not self.attacker.active:
+            return False
+        self.nodes += 1
+        if self.deadline is not None and not self.nodes & 0xff and time.perf_counter() > self.deadline:
+            raise OutOfTime
+        key = self.key(phase)
+        entry = self.table.get(key)
+        if entry is not None:
+            proved, known_depth, _ = entry
+            if proved and known_depth <= depth or not proved and known_depth >= depth:
+                return proved
+        gain = self.gain(phase, depth)
+        if not self.reachable(gain):
+            self.table.put(key, (False, depth, None))
+            return False
+        safe = self.safe(gain)
+        moves = self.moves(self.actions(phase, safe), safe)
+        if depth == 1:
+            # a last move wins only if its own tiles reach the tower, which the plan shows without playing it
+            for move, plan in moves:
+                if move is not None and move.action != 'ember_phase_one' and self.burns(plan):
+                    self.table.put(key, (True, 1, move))
+                    return True
+            moves = [(move, plan) for move, plan in moves if move is not None and move.action == 'ember_phase_one']
+        for move, _ in moves:
+            if self.play(phase, move, depth):
+                self.table.put(key, (True, depth, move))
+                return True
+        self.table.put(key, (False, depth, None))
+        return False
+
+    def play(self, phase: str, move: Optional[Move], depth: int) -> bool:
+        """Play a move and search on from the position it leads to, rolling it back afterwards"""
+        game = self.game
+        checkpoint = game.checkpoint()
+        try:
+            if move is not None:
+                game.apply(move.action, move.point, move.orientation)
+            if self.burned:
+                return True
+            if move is not None and move.action == 'ember_phase_one':
+                # the ember's second half is part of the same move
+                return self.prove(CARD_PHASE, depth)
+            if phase == FIRE_PHASE:
+                return self.prove(CARD_PHASE, depth - 1)
+            if depth <= 1:
+                return False
+            game.action = game.no_action
+            for wind in self.winds():
+                game.wind = wind
+                game.journal.commit()
+                if not self.prove(FIRE_PHASE, depth - 1):
+                    return False
+            return True
+        finally:
+            game.rollback(checkpoint)
+
+    def actions(self, phase: str, safe: bool) -> Tuple[str, ...]:
+        """The actions worth trying: all of the hand where the attacker's own corner could burn, else only fire"""
+        game = self.game
+        if phase == FIRE_PHASE:
+            return 'add_wind_fire',
+        return tuple(a for a in phase_actions(game, CARD_PHASE) if a in FIRE_GAIN or not safe)
+
+    def gain(self, phase: str, depth: int) -> int:
+        """
+        The most placements depth moves could take off the fire's path to any tile, playing the largest card each
+        turn and burning out every other player whose corner that much could reach
+        """
+        game = self.game
+        card = max((FIRE_GAIN[a] for a in self.card_actions()), default=0)
+        gain = sum(FIRE_GAIN['add_wind_fire'] if (phase == FIRE_PHASE) == (k % 2 == 0) else card
+                   for k in range(depth))
+        if game.action == game.ember_phase_two:
+            # the move under way is the ember's second half
+            gain += FIRE_GAIN['ember_phase_two'] - card
+        corners = game.geometry.corners
+        others = [frozenset({corners[p.corner]}) for p in game.players
+                  if p.active and p is not self.attacker and p.corner is not self.target]
+        while True:
+            burned = [corner for corner in others if self.threat(self.threats.search(corner, gain)) <= gain]
+            if not burned:
+                return gain
+            others = [corner for corner in others if corner not in burned]
+            gain += TOWER_GAIN * len(burned)
+
+    def reachable(self, gain: int) -> bool:
+        """
+        Whether taking gain placements off the fire's path could carry it into the tower. This maps the position
+        for moves() to order by, only as far out from the tower as that reaches
+        """
+        self.distance = self.threats.search(self.tower, gain)
+        return self.threat(self.distance) <= gain
+
+    def safe(self, gain: int) -> bool:
+        """Whether taking gain placements off the fire's path could not carry it to the attacker's own corner"""
+        return self.threat(self.threats.search(self.own_corner, gain)) > gain
+
+    def threat(self, distance: List[int]) -> int:
+        return min((distance[i] for i in self.game.board.fire_tiles), default=ThreatMaps.UNREACHABLE)
+
+    def card_actions(self) -> Tuple[str, ...]:
+        allowed = self.game.allowed_actions
+        return tuple(a for a in FIRE_GAIN if a not in ('add_wind_fire', 'ember_phase_two')
+                     and (allowed is None or a in allowed))
+
+    def moves(self, actions: Tuple[str, ...], safe: bool) -> List[Tuple[Optional[Move], Plan]]:
+        """
+        The distinct placements of the given actions, nearest the tower first. Passing is offered last, in the
+        card phase, unless the attacker's corner is safe and a card that only adds fire can be played; the wind
+        fire can only be passed if impossible. Firebreaks are only added where the corner is not safe
+        """
+        game = self.game
+        points = game.geometry.points
+        distance = self.distance
+        found: Dict[FrozenSet[Tuple[int, TileStatus]], Tuple[int, Move, Plan]] = {}
+        for action in actions:
+            planner = getattr(game, f'plan_{action}')
+            for orientation in (ORIENTATIONS if action in game.ORIENTED_ACTIONS else (None,)):
+                for i in game.candidates(action, orientation):
+                    plan = planner(i, orientation)
+                    if plan is None or safe and action == 'de_re_forest' and plan[0][1] is not TileStatus.tree:
+                        continue
+                    effect = frozenset(plan)
+                    if effect not in found:
+                        burning = [distance[j] for j, s in plan if s is TileStatus.fire]
+                        found[effect] = (min(burning, default=ThreatMaps.UNREACHABLE),
+                                         Move(action, points[i], orientation), plan)
+        moves: List[Tuple[Optional[Move], Plan]] = [(move, plan) for _, move, plan in
+                                                    sorted(found.values(), key=lambda entry: entry[0])]
+        pure = any(move.action in PURE_FIRE for move, _ in moves)
+        if actions == ('add_wind_fire',):
+            if not moves:
+                moves.append((None, []))
+        elif not (safe and pure):
+            moves.append((None, []))
+        return moves
+
+    def burns(self, plan: Plan) -> bool:
+        return any(s is TileStatus.fire and i in self.tower for i, s in plan)
+
+    def line(self, phase: str) -> List[Optional[Move]]:
+        """The proven moves from the root up to the first wind roll, read back from the transposition table"""
+        game = self.game
+        checkpoint = game.checkpoint()
+        line = []
+        try:
+            while not self.burned:
+                entry = self.table.get(self.key(phase))
+                if entry is None or not entry[0]:
+                    break
+                move = entry[2]
+                line.append(move)
+                if move is not None:
+                    game.apply(move.action, move.point, move.orientation)
+                if move is not None and move.action == 'ember_phase_one':
+                    continue
+                if phase == CARD_PHASE:
+                    break
+                phase = CARD_PHASE
+        finally:
+            game.rollback(checkpoint)
+        return line
+
+
+def solve(game: FireTowerGame, target: Corner, max_moves: int = 4, time_limit: Optional[float] = None,
+          phase: str = FIRE_PHASE) -> Solution:
+    """Whether the current player can force fire into the target's tower, e.g. solve(game, CORNERS[2], 4, 1.0)"""
+    return ForcedBurnSolver().solve(game, target, max_moves, time_limit, phase)
+
+
+def puzzles(seed: int, count: int, closest: int = 6, turns: int = 40) -> Iterator[Tuple[FireTowerGame, Corner]]:
+    """
+    Positions from random games, taken at the start of a turn once fire is within `closest` placements of another
+    player's tower, with that player as the target
+    """
+    rng = random.Random(seed)
+    while count:
+        game = FireTowerGame(seed=rng.getrandbits(32))
+        game.verbose = False
+        bot = RandomBot(rng.getrandbits(32))
+        threats = game.track_threats()
+        for _ in range(turns):
+            if not game.active:
+                break
+            others = [p for p in game.players if p.active and p is not game.current_player]
+            near = [p for p in others if threats.threat(p.corner) <= closest]
+            if near:
+                yield game, min(near, key=lambda p: threats.threat(p.corner)).corner
+                count -= 1
+                break
+            play_turn(game, bot)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Look for forced tower burns in positions from random games')
+    parser.add_argument('--positions', type=int, default=10)
+    parser.add_argument('--moves', type=int, default=4, help='the most moves of the current player to search')
+    parser.add_argument('--time-limit', type=float, default=5.0, help='seconds per position')
+    parser.add_argument('--closest', type=int, default=6, help='take positions with fire this near a tower')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    solver = ForcedBurnSolver()
+    for game, target in puzzles(args.seed, args.positions, args.closest):
+        solution = solver.solve(game, target, args.moves, args.time_limit)
+        verdict = {True: f'forced in {solution.moves}', False: f'not forced within {solution.moves}',
+                   None: f'unknown beyond {solution.moves}'}[solution.forced]
+        line = ', '.join(f'{m.action} {tuple(m.point)}' if m else 'pass' for m in solution.line)
+        print(f'{game.current_player.corner.name} vs {target.name} (threat {game.board.threats.threat(target)}): '
+              f'{verdict}, {solution.nodes} nodes in {solution.seconds:.2f}s' + (f': {line}' if line else ''))
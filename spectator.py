@@ -0,0 +1,388 @@
+from __future__ import annotations
+import argparse
+import asyncio
+import itertools
+import json
+import shutil
+import sys
+import time
+from dataclasses import dataclass
+from typing import Dict, IO, Iterator, List, Optional, Sequence, Tuple
+
+from firetower import Board, FireTowerGame, TileStatus, WindDir
+from replay import ReplayReader, apply_step
+from simulator import PLAYER_COUNTS, POLICIES, GameRun, PolicyFactory, game_seed
+
+ESC = '\x1b['
+STATUSES = {char: status for status, char in Board.CHAR_MAP.items()}
+# SGR colour codes for each tile: red fire, green trees, magenta firebreaks; tower trees yellow, corners bold white
+TILE_SGR = {TileStatus.fire: '1;31', TileStatus.tree: '32', TileStatus.firebreak: '35'}
+TOWER_SGR = '33'
+CORNER_SGR = '1;37'
+# columns per tile, a character and a space, which keeps boards roughly square in a terminal
+CELL = 2
+# a feed yields the game it is showing after every move, with a title for it; a new game object starts a new game
+Feed = Iterator[Tuple[FireTowerGame, str]]
+
+
+class Screen:
+    """
+    An ANSI terminal written through a shadow copy of every cell, so that only cells whose text or colour changed
+    are sent. Writes are buffered until flush, and a run of cells along a row needs a single cursor move
+    """
+
+    def __init__(self, stream: IO[str] = sys.stdout, color: bool = True):
+        self.stream = stream
+        self.color = color
+        self.shadow: Dict[Tuple[int, int], Tuple[str, str]] = {}
+        self.out: List[str] = []
+        self.cursor: Optional[Tuple[int, int]] = None
+        self.sgr: Optional[str] = None
+        self.written = 0
+
+    def put(self, row: int, col: int, text: str, sgr: str = '0'):
+        if not self.color:
+            sgr = '0'
+        cell = text, sgr
+        if self.shadow.get((row, col)) == cell:
+            return
+        self.shadow[row, col] = cell
+        out = self.out
+        if self.cursor != (row, col):
+            out.append(f'{ESC}{row + 1};{col + 1}H')
+        if sgr != self.sgr:
+            out.append(f'{ESC}{sgr}m')
+            self.sgr = sgr
+        out.append(text)
+        self.cursor = row, col + len(text)
+
+    def text(self, row: int, col: int, text: str, width: int, sgr: str = '0'):
+        """Write text padded or cut to width"""
+        for k, char in enumerate(text[:width].ljust(width)):
+            self.put(row, col + k, char, sgr)
+
+    def flush(self):
+        if self.out:
+            data = ''.join(self.out)
+            self.out.clear()
+            self.written += len(data)
+            self.stream.write(data)
+            self.stream.flush()
+
+    def open(self):
+        """Switch to the alternate screen, clear it and hide the cursor"""
+        self.stream.write(f'{ESC}?1049h{ESC}?25l{ESC}0m{ESC}2J')
+        self.stream.flush()
+        self.shadow.clear()
+        self.cursor = None
+        self.sgr = '0'
+
+    def close(self):
+        self.flush()
+        self.stream.write(f'{ESC}0m{ESC}?25h{ESC}?1049l')
+        self.stream.flush()
+
+    def __enter__(self) -> Screen:
+        self.open()
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+class Panel:
+    """
+    One game drawn on a screen from Board.CHAR_MAP, a status line over its board, cropped to the rows and columns
+    of tiles the layout gives it. Each render sends only the tiles in the board's dirty set
+    """
+
+    def __init__(self, screen: Screen, top: int, left: int, rows: int, cols: int):
+        self.screen = screen
+        self.top = top
+        self.left = left
+        self.rows = rows
+        self.cols = cols
+        self.game: Optional[FireTowerGame] = None
+        self.title = ''
+        self.moves = 0
+        self.towers: Dict[int, str] = {}
+
+    def show(self, game: FireTowerGame, title: str):
+        """Start showing a game, marking the visible part of its board dirty so the next render paints all of it"""
+        self.game = game
+        self.title = title
+        self.moves = 0
+        geometry = game.geometry
+        self.towers = {i: TOWER_SGR for p in game.players for i in geometry.towers[p.corner]}
+        self.towers.update({geometry.corners[p.corner]: CORNER_SGR for p in game.players})
+        size = geometry.size
+        game.board.dirty.update(y * size + x for y in range(min(size, self.rows)) for x in range(min(size, self.cols)))
+
+    def status(self) -> str:
+        game = self.game
+        if game is None:
+            return ''
+        # the player to move is marked, and players out of the game are in lower case
+        players = ' '.join(('>' if p is game.current_player and game.active else '') +
+                           (p.corner.name if p.active else p.corner.name.lower()) for p in game.players)
+        return f'{self.title} {self.moves:>4} {game.wind.name:<2} {players}'
+
+    def render(self):
+        game = self.game
+        if game is None:
+            return
+        board = game.board
+        tiles = board.tiles
+        size = game.geometry.size
+        screen, top, left, rows, cols = self.screen, self.top + 1, self.left, self.rows, self.cols
+        char_map, towers = Board.CHAR_MAP, self.towers
+        for i in sorted(board.dirty):
+            y, x = divmod(i, size)
+            if y < rows and x < cols:
+                status = tiles[i]
+                sgr = towers.get(i, TILE_SGR[status]) if status is TileStatus.tree else TILE_SGR[status]
+                screen.put(top + y, left + CELL * x, char_map[status] + ' ', sgr)
+        board.dirty.clear()
+        screen.text(self.top, self.left, self.status(), CELL * cols, '1')
+
+
+def layout(screen: Screen, count: int, size: int, width: int, height: int) -> List[Panel]:
+    """
+    As many of count panels for boards of the given size as fit side by side and in rows, each cropped to the screen
+    if need be, leaving the bottom line for the totals
+    """
+    cols = max(1, min(size, width // CELL))
+    rows = max(1, min(size, height - 2))
+    across = max(1, (width + 1) // (CELL * cols + 1))
+    down = max(1, (height - 1) // (rows + 2))
+    return [Panel(screen, k // across * (rows + 2), k % across * (CELL * cols + 1), rows, cols)
+            for k in range(min(count, across * down))]
+
+
+def replay_feed(reader: ReplayReader, games: Sequence[int]) -> Feed:
+    """The given games of a replay file, move by move"""
+    for j in games:
+        replay = reader[j]
+        game = replay.start()
+        title = f'game {j}'
+        yield game, title
+        for step in replay:
+            apply_step(game, step)
+            yield game, title
+
+
+def simulated_feed(seed: int, games: Sequence[int], policies: Sequence[PolicyFactory], players: int = 4,
+                   max_turns: int = 200, storm_chance: float = 0.1) -> Feed:
+    """The given games of a simulator run, played live move by move; the same seed plays the same games"""
+    for j in games:
+        run = GameRun(game_seed(seed, j), policies, players, max_turns, storm_chance)
+        title = f'game {j}'
+        yield run.game, title
+        try:
+            while not run.over:
+                run.step()
+                yield run.game, title
+        finally:
+            run.close()
+
+
+class Spectator:
+    """
+    Plays feeds into panels and redraws the screen at most fps times a second, whatever the playback speed: at
+    `speed` moves a second per game, or with no speed as fast as the feeds go, so the moves between two frames
+    cost nothing on screen but the tiles they left changed
+    """
+
+    def __init__(self, screen: Screen, feeds: Sequence[Feed], speed: float = 0.0, fps: float = 30.0):
+        width, height = shutil.get_terminal_size((80, 24))
+        self.screen = screen
+        self.height = height
+        self.width = width
+        self.feeds = list(feeds)
+        self.panels: List[Panel] = []
+        self.speed = speed
+        self.fps = fps
+        self.moves = 0
+        self.games = 0
+        self.start = time.perf_counter()
+
+    def step(self, k: int) -> bool:
+        """Advance the k-th feed a move, returning False once it has run out"""
+        try:
+            game, title = next(self.feeds[k])
+        except StopIteration:
+            return False
+        panel = self.panels[k]
+        if game is panel.game:
+            panel.moves += 1
+            self.moves += 1
+        else:
+            self.show(panel, game, title)
+        return True
+
+    def show(self, panel: Panel, game: FireTowerGame, title: str):
+        if panel.game is not None:
+            panel.game.board.dirty.clear()
+        panel.show(game, title)
+        self.games += 1
+
+    def render(self):
+        for panel in self.panels:
+            panel.render()
+        seconds = time.perf_counter() - self.start
+        rate = self.moves / seconds if seconds else 0.0
+        self.screen.text(self.height - 1, 0, f'{self.games} games, {self.moves} moves, {rate:.0f} moves/s, '
+                         f'{self.screen.written / 1024:.0f} kB sent', self.width - 1)
+        self.screen.flush()
+
+    def run(self):
+        """
+        Play every feed to its end, laid out for the largest of their first games. When fewer panels fit on the
+        screen than there are feeds, the feeds left over are queued behind the others, a panel playing them in turn
+        """
+        first = [next(feed, None) for feed in self.feeds]
+        size = max((item[0].geometry.size for item in first if item is not None), default=1)
+        feeds = [itertools.chain([item], feed) for item, feed in zip(first, self.feeds) if item is not None]
+        self.panels = layout(self.screen, len(feeds), size, self.width, self.height)
+        self.feeds = [itertools.chain.from_iterable(feeds[k::len(self.panels)]) for k in range(len(self.panels))]
+        for k in range(len(self.panels)):
+            self.step(k)
+        live = [True] * len(self.panels)
+        frame = 1 / self.fps
+        self.start = time.perf_counter()
+        next_frame = self.start
+        stepped = 0
+        while any(live):
+            if self.speed:
+                due = int((time.perf_counter() - self.start) * self.speed)
+                for _ in range(due - stepped):
+                    live = [on and self.step(k) for k, on in enumerate(live)]
+                stepped = due
+                wait = min(next_frame, self.start + (due + 1) / self.speed) - time.perf_counter()
+                if wait > 0:
+                    time.sleep(wait)
+            else:
+                while time.perf_counter() < next_frame and any(live):
+                    for k, on in enumerate(live):
+                        for _ in range(64 if on else 0):
+                            if not self.step(k):
+                                live[k] = False
+                                break
+            if time.perf_counter() >= next_frame:
+                self.render()
+                next_frame = max(next_frame + frame, time.perf_counter())
+        self.render()
+
+
+@dataclass
+class WatchStats:
+    matches: int = 0
+    moves: int = 0
+
+
+class Mirror:
+    """A watched server match, kept from its start board and the tile updates that follow, as loadtest does"""
+
+    def __init__(self, message: Dict):
+        self.game = FireTowerGame(PLAYER_COUNTS[len(message['players'])](), size=message['size'])
+        self.game.verbose = False
+        self.title = f'match {message["match"]}'
+        board = self.game.board
+        for i, char in enumerate(message['board']):
+            board.put(i, STATUSES[char])
+        self.sync(message)
+
+    def sync(self, message: Dict):
+        game = self.game
+        for i, char in message.get('tiles', ()):
+            game.board.put(i, STATUSES[char])
+        game.wind = WindDir[message['wind']]
+        game.turn = message['turn']
+        for player, active in zip(game.players, message['players']):
+            player.active = active
+        game.journal.clear()
+
+
+async def watch_match(host: str, port: int, panel: Panel, stats: WatchStats, retry: float = 1.0):
+    """Keep a panel showing server matches, asking for another each time the one it shows ends"""
+    reader, writer = await asyncio.open_connection(host, port)
+    mirror: Optional[Mirror] = None
+    try:
+        writer.write(b'{"op":"watch"}\n')
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            message = json.loads(line)
+            op = message['op']
+            if op == 'start':
+                mirror = Mirror(message)
+                panel.show(mirror.game, mirror.title)
+                stats.matches += 1
+            elif op == 'update' and mirror is not None:
+                mirror.sync(message)
+                panel.moves += 1
+                stats.moves += 1
+            elif op == 'over' and mirror is not None:
+                mirror.game.active = False
+            if op in ('over', 'error'):
+                await asyncio.sleep(retry)
+                writer.write(b'{"op":"watch"}\n')
+    finally:
+        writer.close()
+
+
+async def watch_server(screen: Screen, host: str, port: int, matches: int, fps: float = 30.0):
+    """Watch matches on a server, a panel each, spread over the matches being played"""
+    width, height = shutil.get_terminal_size((80, 24))
+    panels = layout(screen, matches, 16, width, height)
+    stats = WatchStats()
+    tasks = [asyncio.create_task(watch_match(host, port, panel, stats)) for panel in panels]
+    start = time.perf_counter()
+    try:
+        while not all(task.done() for task in tasks):
+            for panel in panels:
+                panel.render()
+            seconds = time.perf_counter() - start
+            screen.text(height - 1, 0, f'{host}:{port}, {stats.matches} matches, {stats.moves} moves, '
+                        f'{stats.moves / seconds if seconds else 0.0:.0f} moves/s', width - 1)
+            screen.flush()
+            await asyncio.sleep(1 / fps)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Watch Fire Tower games in a terminal')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--replay', help='play back the games in this replay file')
+    source.add_argument('--simulate', action='store_true', help='watch bots playing games live')
+    source.add_argument('--server', metavar='HOST:PORT', help='watch matches on a running match server')
+    parser.add_argument('--games', type=int, default=4, help='games shown at once, as many as fit')
+    parser.add_argument('--speed', type=float, default=0.0, help='moves a second per game, 0 for as fast as possible')
+    parser.add_argument('--fps', type=float, default=30.0, help='screen updates a second')
+    parser.add_argument('--policy', action='append', choices=sorted(POLICIES), help='with --simulate, as simulator')
+    parser.add_argument('--players', type=int, choices=sorted(PLAYER_COUNTS), default=4)
+    parser.add_argument('--total', type=int, default=100, help='with --simulate, games to play in all')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-color', action='store_true')
+    args = parser.parse_args()
+
+    screen = Screen(color=not args.no_color)
+    try:
+        with screen:
+            if args.server:
+                host, _, port = args.server.rpartition(':')
+                asyncio.run(watch_server(screen, host or '127.0.0.1', int(port), args.games, args.fps))
+            elif args.replay:
+                with ReplayReader(args.replay) as reader:
+                    feeds = [replay_feed(reader, range(k, len(reader), args.games)) for k in range(args.games)]
+                    Spectator(screen, feeds, args.speed, args.fps).run()
+            else:
+                policies = [POLICIES[p] for p in args.policy or ['random']]
+                feeds = [simulated_feed(args.seed, range(k, args.total, args.games), policies, args.players)
+                         for k in range(args.games)]
+                Spectator(screen, feeds, args.speed, args.fps).run()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,57 @@
+import random
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from batch import FIRE, WINDS, BatchEngine, check_against_scalar  # noqa: E402
+from firetower import FireTowerGame, TileStatus  # noqa: E402
+from simulator import PLAYER_COUNTS  # noqa: E402
+
+
+def scalar_games(count, players, seed):
+    """Seeded games with some firebreaks and fire scattered over them, so the boards differ"""
+    rng = random.Random(seed)
+    games = []
+    for k in range(count):
+        game = FireTowerGame(PLAYER_COUNTS[players](), seed=seed + k)
+        game.verbose = False
+        for _ in range(rng.randrange(30)):
+            i = rng.randrange(game.geometry.tiles)
+            game.board.put(i, rng.choice([TileStatus.firebreak, TileStatus.fire]))
+        games.append(game)
+    return games
+
+
+@pytest.mark.parametrize('players', sorted(PLAYER_COUNTS))
+@pytest.mark.parametrize('seed', range(3))
+def test_batch_matches_scalar_rules(players, seed):
+    scalar = scalar_games(16, players, seed)
+    batch = BatchEngine.from_games(scalar, seed=seed)
+    for _ in range(30):
+        candidates = batch.wind_fire_candidates()
+        for k, game in enumerate(scalar):
+            expected = [game.active and game.plan_add_wind_fire(i) is not None for i in range(game.geometry.tiles)]
+            assert candidates[k].ravel().tolist() == expected
+            placed = np.flatnonzero(candidates[k])
+            if len(placed):
+                i = int(placed[seed % len(placed)])
+                game.add_wind_fire(game.geometry.points[i])
+                batch.boards[k].flat[i] = FIRE
+        storm_winds, next_winds = batch.random_winds(), batch.random_winds()
+        for k, game in enumerate(scalar):
+            if game.active:
+                game.fire_storm(WINDS[storm_winds[k]], WINDS[next_winds[k]])
+                game.check_for_victory()
+        batch.fire_storm(storm_winds, next_winds)
+        batch.check_for_victory()
+        for k, game in enumerate(scalar):
+            assert batch.statuses(k) == game.board.tiles[:game.geometry.tiles]
+            assert bool(batch.active[k]) == game.active
+            assert batch.players_active[k].tolist() == [p.active for p in game.players]
+            assert WINDS[batch.winds[k]] is game.wind
+    assert not batch.active.all()
+
+
+def test_check_against_scalar():
+    assert check_against_scalar(games=8, steps=20, seed=5)
@@ -0,0 +1,52 @@
+import random
+
+import pytest
+
+from firetower import Board, FireTowerGame, SparseBoard, TileStatus
+
+BOARD_TYPES = [Board, SparseBoard]
+STATUSES = [TileStatus.tree, TileStatus.fire, TileStatus.firebreak]
+
+
+def scrambled(board_type, seed, writes=300):
+    game = FireTowerGame(board_type=board_type, seed=seed)
+    game.verbose = False
+    rng = random.Random(seed)
+    for _ in range(writes):
+        game.board.put(rng.randrange(game.geometry.tiles), rng.choice(STATUSES))
+    return game
+
+
+def assert_index_consistent(board):
+    """The fire, neighbour count and frontier index agree with the tiles"""
+    geometry = board.geometry
+    tiles = [board.tiles[i] for i in range(geometry.tiles)]
+    fire = {i for i, s in enumerate(tiles) if s is TileStatus.fire}
+    assert board.fire_tiles == fire
+    for i in range(geometry.tiles):
+        assert board.fire_neighbours[i] == sum(j in fire for j in geometry.orthogonal[i])
+    assert board.frontier == {i for i, s in enumerate(tiles) if s is TileStatus.tree
+                              and any(j in fire for j in geometry.orthogonal[i])}
+
+
+@pytest.mark.parametrize('board_type', BOARD_TYPES)
+@pytest.mark.parametrize('seed', range(5))
+def test_index_follows_random_writes(board_type, seed):
+    game = scrambled(board_type, seed)
+    assert_index_consistent(game.board)
+    game.journal.commit()
+    while game.undo():
+        pass
+    assert_index_consistent(game.board)
+
+
+@pytest.mark.parametrize('board_type', BOARD_TYPES)
+def test_copy_is_independent(board_type):
+    game = scrambled(board_type, 3)
+    clone = game.board.copy()
+    before = clone.hash
+    i = next(iter(game.board.fire_tiles))
+    game.board.put(i, TileStatus.tree)
+    assert clone.tiles[i] is TileStatus.fire
+    assert clone.hash == before
+    assert_index_consistent(clone)
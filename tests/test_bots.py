@@ -0,0 +1,28 @@
+import random
+
+import pytest
+
+from bots import FIRE_PHASE, rollout
+from firetower import FireTowerGame
+from simulator import PLAYER_COUNTS
+
+
+@pytest.mark.parametrize('players', sorted(PLAYER_COUNTS))
+def test_rollout_stops_when_the_game_is_over(players):
+    ended = 0
+    for seed in range(30):
+        game = FireTowerGame(PLAYER_COUNTS[players](), seed=seed)
+        game.verbose = False
+        storms = []
+        fire_storm = game.fire_storm
+
+        def storm():
+            storms.append(game.active)
+            fire_storm()
+        game.fire_storm = storm
+        values = rollout(game, FIRE_PHASE, 200, random.Random(seed), storm_chance=1.0)
+        assert all(storms)
+        if not game.active:
+            ended += 1
+            assert sorted(values) == [0.0] * (players - 1) + [1.0] or values == [0.0] * players
+    assert ended
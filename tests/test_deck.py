@@ -0,0 +1,69 @@
+from bots import RandomBot
+from deck import DECK_LIST, HAND_SIZE, TurnEngine, play_game
+from firetower import FireTowerGame, Point
+from instrument import Counters
+from simulator import PLAYER_COUNTS
+
+
+def engine_for(seed, players=4, **engine_args):
+    game = FireTowerGame(PLAYER_COUNTS[players](), seed=seed)
+    game.verbose = False
+    return TurnEngine(game, **engine_args)
+
+
+def all_cards(deck):
+    return sorted(list(deck.draw_pile) + list(deck.discard_pile) + [k for hand in deck.hands for k in hand])
+
+
+def test_a_seed_fixes_the_deal():
+    first, second, other = engine_for(3).deck, engine_for(3).deck, engine_for(4).deck
+    assert [list(h) for h in first.hands] == [list(h) for h in second.hands]
+    assert list(first.draw_pile) == list(second.draw_pile)
+    assert list(first.draw_pile) != list(other.draw_pile)
+
+
+def test_a_seed_fixes_the_game():
+    def played(seed):
+        engine = play_game(seed, [RandomBot(1), RandomBot(2), RandomBot(3)], max_turns=40)
+        return engine.turns, engine.played, list(engine.game.board.tiles)
+    assert played(5) == played(5)
+
+
+def test_every_card_is_dealt_once_and_storms_are_buried():
+    engine = engine_for(1)
+    deck = engine.deck
+    assert all(len(hand) == HAND_SIZE for hand in deck.hands)
+    assert all_cards(deck) == list(range(sum(count for *_, count in DECK_LIST)))
+    for k in deck.storms:
+        assert list(deck.draw_pile).index(k) <= len(deck.draw_pile) // 2
+    engine.run([RandomBot(1), RandomBot(2), RandomBot(3), RandomBot(4)], max_turns=60)
+    assert all_cards(deck) == list(range(len(deck.cards)))
+
+
+def test_playing_discards_and_the_turn_refills():
+    engine = engine_for(2, players=2)
+    deck = engine.deck
+    seat = engine.seat
+    hand = list(deck.hands[seat])
+    assert not engine.play_card(0, Point(-1, -1))
+    assert list(deck.hands[seat]) == hand and not deck.discard_pile
+    discarded = engine.discard(1)
+    assert deck.discard_pile[-1] == hand[1] and discarded is deck.cards[hand[1]]
+    assert len(deck.hands[seat]) == HAND_SIZE - 1
+    engine.end_turn()
+    assert len(deck.hands[seat]) == HAND_SIZE
+    assert engine.seat != seat and engine.turns == 1
+
+
+def test_wind_change_reaches_the_hooks():
+    engine = next(e for e in map(engine_for, range(50))
+                  if any(card.action.__name__ == 'roll_wind' for card in e.hand()))
+    counters = Counters()
+    engine.game.hooks.append(counters)
+    wind = engine.game.wind
+    assert engine.play_card(engine.position('roll_wind'))
+    assert engine.game.wind is not wind
+    assert counters.actions['roll_wind'].calls == 1
+    assert engine.played['roll_wind'] == 1
+    engine.end_turn()
+    assert counters.actions['roll_wind'].calls == 2
@@ -0,0 +1,80 @@
+import io
+import json
+
+from firetower import FireTowerGame, TileStatus
+from instrument import Counters, JsonlTrace, LoopProfiler
+
+
+def new_game(*hooks):
+    game = FireTowerGame(seed=3)
+    game.verbose = False
+    game.hooks.extend(hooks)
+    return game
+
+
+def wind_fire_points(game):
+    """A tile wind fire may be added to and a tree it may not"""
+    geometry = game.geometry
+    tiles = game.board.tiles
+    good = next(i for i in range(geometry.tiles) if game.plan_add_wind_fire(i) is not None)
+    bad = next(i for i in range(geometry.tiles) if tiles[i] is TileStatus.tree and game.plan_add_wind_fire(i) is None)
+    return geometry.points[good], geometry.points[bad]
+
+
+def test_counters_tally_calls_tiles_and_rejections():
+    counters = Counters()
+    game = new_game(counters)
+    good, bad = wind_fire_points(game)
+    game.apply('add_wind_fire', good)
+    game.apply('add_wind_fire', bad)
+    game.apply('add_wind_fire', bad)
+    stats = counters.actions['add_wind_fire']
+    assert (stats.calls, stats.tiles_changed, stats.rejected) == (3, 1, 2)
+    assert stats.seconds >= stats.slowest > 0
+    assert 'add_wind_fire' in counters.summary()
+
+
+def test_nested_calls_are_reported_once():
+    counters = Counters()
+    game = new_game(counters)
+    good, _ = wind_fire_points(game)
+    game.update('-Fire-')
+    game.update(good)
+    game.update('-FS-')
+    assert {action: stats.calls for action, stats in counters.actions.items()} == {
+        'select add_wind_fire': 1, 'add_wind_fire': 1, 'fire_storm': 1}
+    assert counters.actions['add_wind_fire'].tiles_changed == 1
+    assert counters.actions['fire_storm'].rejected == 0
+
+
+def test_trace_writes_a_line_per_call():
+    out = io.StringIO()
+    trace = JsonlTrace(out)
+    game = new_game(trace)
+    good, bad = wind_fire_points(game)
+    game.apply('add_wind_fire', good)
+    game.apply('add_wind_fire', bad)
+    trace.close()
+    lines = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [(line['action'], line['tiles_changed'], line['rejected']) for line in lines] == [
+        ('add_wind_fire', 1, False), ('add_wind_fire', 0, True)]
+    assert all(line['seed'] == 3 and line['turn'] == game.turn for line in lines)
+
+
+def test_only_calls_made_while_hooked_are_reported():
+    counters = Counters()
+    game = new_game()
+    game.apply('add_wind_fire', wind_fire_points(game)[0])
+    game.hooks.append(counters)
+    game.fire_storm()
+    assert list(counters.actions) == ['fire_storm'] and not game.timing
+
+
+def test_profiler_samples_its_share_of_steps():
+    for sample, sampled in ((0.0, 0), (1.0, 5)):
+        profiler = LoopProfiler(sample, seed=1)
+        for _ in range(5):
+            with profiler.step():
+                sum(range(100))
+        assert (profiler.steps, profiler.sampled) == (5, sampled)
+        assert f'profiled {sampled} of 5 steps' in profiler.summary()
@@ -0,0 +1,68 @@
+import random
+
+import pytest
+
+from firetower import Board, FireTowerGame, SparseBoard
+
+BOARD_TYPES = [Board, SparseBoard]
+
+
+def state(game):
+    board = game.board
+    return ([board.tiles[i] for i in range(game.geometry.tiles)], game.wind, game.action.__name__, game.orientation,
+            game.active, game.turn, [p.active for p in game.players], set(board.fire_tiles), set(board.frontier),
+            game.hash)
+
+
+def play_random(game, rng, moves):
+    """Random legal moves with the odd fire storm and turn end, recording the state after each"""
+    states = [state(game)]
+    for _ in range(moves):
+        if not game.active:
+            break
+        roll = rng.random()
+        legal = game.legal_moves()
+        if roll < 0.1:
+            game.fire_storm()
+            game.check_for_victory()
+            game.journal.commit()
+        elif roll < 0.2 or not legal:
+            game.end_turn()
+            game.journal.commit()
+        else:
+            move = rng.choice(legal)
+            game.apply(move.action, move.point, move.orientation)
+        states.append(state(game))
+    return states
+
+
+@pytest.mark.parametrize('board_type', BOARD_TYPES)
+@pytest.mark.parametrize('seed', range(4))
+def test_undo_redo_restore_every_state(board_type, seed):
+    game = FireTowerGame(board_type=board_type, seed=seed)
+    game.verbose = False
+    states = play_random(game, random.Random(seed), 60)
+    steps = len(game.journal.done)
+    for k in range(steps, 0, -1):
+        assert game.undo()
+        assert state(game) == states[k - 1]
+    assert not game.undo()
+    for k in range(1, steps + 1):
+        assert game.redo()
+        assert state(game) == states[k]
+    assert not game.redo()
+
+
+@pytest.mark.parametrize('board_type', BOARD_TYPES)
+def test_rollback_to_checkpoint(board_type):
+    game = FireTowerGame(board_type=board_type, seed=5)
+    game.verbose = False
+    rng = random.Random(5)
+    play_random(game, rng, 20)
+    before = state(game)
+    checkpoint = game.checkpoint()
+    play_random(game, rng, 30)
+    game.rollback(checkpoint)
+    assert state(game) == before
+    assert not game.redo()
+
@@ -0,0 +1,76 @@
+import random
+
+import pytest
+
+from firetower import Board, FireTowerGame, Move, OrientationEnum, Point, SparseBoard
+
+BOARD_TYPES = [Board, SparseBoard]
+ACTIONS = FireTowerGame.CARD_ACTIONS + ('ember_phase_two',)
+
+
+def brute_force_moves(game):
+    """
+    Every placement whose planner accepts it, asking on every tile. Each is also played and rolled back, checking
+    that it changes exactly the tiles its plan says, and that a placement the planner refuses changes nothing
+    """
+    moves = []
+    for action in ACTIONS:
+        plan = getattr(game, f'plan_{action}')
+        for orientation in (list(OrientationEnum) if action in game.ORIENTED_ACTIONS else [None]):
+            for i in range(game.geometry.tiles):
+                expected = plan(i, orientation)
+                before = [game.board.tiles[j] for j in range(game.geometry.tiles)]
+                checkpoint = game.checkpoint()
+                game.apply(action, game.geometry.points[i], orientation)
+                after = [game.board.tiles[j] for j in range(game.geometry.tiles)]
+                game.rollback(checkpoint)
+                changed = {j: s for j, s in enumerate(after) if s is not before[j]}
+                if expected is None:
+                    assert not changed
+                else:
+                    assert changed == {j: s for j, s in expected if s is not before[j]}
+                    moves.append(Move(action, game.geometry.points[i], orientation))
+    return moves
+
+
+def key(move):
+    return move.action, tuple(move.point), str(move.orientation)
+
+
+@pytest.mark.parametrize('board_type', BOARD_TYPES)
+@pytest.mark.parametrize('seed', range(2))
+def test_legal_moves_match_brute_force(board_type, seed):
+    game = FireTowerGame(board_type=board_type, seed=seed)
+    game.verbose = False
+    rng = random.Random(seed)
+    for _ in range(8):
+        if not game.active:
+            break
+        moves = game.legal_moves(ACTIONS)
+        assert sorted(map(key, moves)) == sorted(map(key, brute_force_moves(game)))
+        if rng.random() < 0.2:
+            game.fire_storm()
+        elif moves:
+            move = rng.choice(moves)
+            game.apply(move.action, move.point, move.orientation)
+
+
+def test_legal_moves_leave_the_game_alone():
+    game = FireTowerGame(seed=9)
+    game.verbose = False
+    tiles, hash_ = list(game.board.tiles), game.hash
+    game.legal_moves()
+    assert list(game.board.tiles) == tiles
+    assert game.hash == hash_
+    assert not game.journal.done
+
+
+@pytest.mark.parametrize('point', [(-1, 3), (16, 0), (3, 99)])
+def test_off_board_placements_are_refused(point):
+    game = FireTowerGame(seed=1)
+    game.verbose = False
+    tiles = list(game.board.tiles)
+    for action in ACTIONS + ('add_wind_fire',):
+        for orientation in (list(OrientationEnum) if action in game.ORIENTED_ACTIONS else [None]):
+            game.apply(action, Point(*point), orientation)
+            assert list(game.board.tiles) == tiles
@@ -0,0 +1,96 @@
+import os
+
+import pytest
+
+from bots import RandomBot
+from firetower import Board, FireTowerGame, Point, SparseBoard, TileStatus
+from replay import (DENSE_BOARD, FILE_HEADER, FILE_MAGIC, GAME_HEADER, GAME_HEADER_V1, SPARSE_BOARD, ReplayReader,
+                    ReplayWriter, board_bytes, encode_board, encode_game)
+from simulator import GameRun
+
+
+def final_state(game):
+    return ([game.board.tiles[i] for i in range(game.geometry.tiles)], game.wind, game.turn, game.active,
+            [p.active for p in game.players])
+
+
+@pytest.mark.parametrize('board_type', [Board, SparseBoard])
+def test_round_trip(tmp_path, board_type):
+    path = str(tmp_path / 'games.ftr')
+    played = []
+    with ReplayWriter(path) as writer:
+        for seed in range(4):
+            run = GameRun(seed, [RandomBot], 2 + seed % 3, max_turns=60, board_type=board_type)
+            recorder = writer.record(run.game)
+            while not run.over:
+                run.step()
+            recorder.finish()
+            played.append(final_state(run.game))
+    with ReplayReader(path) as reader:
+        assert len(reader) == len(played)
+        for replay, expected in zip(reader, played):
+            assert final_state(replay.game_at(board_type=board_type)) == expected
+            assert final_state(replay.game_at(0)) != expected
+
+
+def test_reader_finds_games_without_the_index(tmp_path):
+    path = str(tmp_path / 'games.ftr')
+    writer = ReplayWriter(path)
+    for seed in range(3):
+        run = GameRun(seed, [RandomBot], 2, max_turns=20)
+        recorder = writer.record(run.game)
+        while not run.over:
+            run.step()
+        recorder.finish()
+    writer.flush()
+    with ReplayReader(path) as unindexed:
+        assert unindexed.read_index() is None
+        offsets = list(unindexed.offsets)
+        lengths = [len(r) for r in unindexed]
+    writer.close()
+    with ReplayReader(path) as indexed:
+        assert list(indexed.offsets) == offsets
+        assert [len(r) for r in indexed] == lengths
+
+
+def test_large_sparse_boards_are_stored_sparsely(tmp_path):
+    path = str(tmp_path / 'large.ftr')
+    game = FireTowerGame(board_type=SparseBoard, size=1024, seed=2)
+    game.verbose = False
+    geometry = game.geometry
+    for k in range(3):
+        game.board.put(geometry.index(Point(5 + k, 9)), TileStatus.firebreak)
+    with ReplayWriter(path) as writer:
+        recorder = writer.record(game)
+        for _ in range(12):
+            i = next(i for i in game.candidates('add_wind_fire') if game.plan_add_wind_fire(i) is not None)
+            game.apply('add_wind_fire', geometry.points[i])
+            game.fire_storm()
+            game.check_for_victory()
+            game.journal.commit()
+        recorder.finish()
+    assert os.path.getsize(path) < 2000 < board_bytes(geometry.size)
+    with ReplayReader(path) as reader:
+        replay = reader[0]
+        assert replay.board_format == SPARSE_BOARD and len(replay) >= 24
+        start = replay.start(board_type=SparseBoard)
+        assert start.board.tiles.stored[geometry.index(Point(6, 9))] is TileStatus.firebreak
+        assert final_state(replay.game_at(board_type=SparseBoard)) == final_state(game)
+
+
+def test_busy_boards_stay_dense_and_version_1_files_still_read(tmp_path):
+    game = FireTowerGame(seed=3)
+    game.verbose = False
+    for i in range(0, game.geometry.tiles, 3):
+        game.board.put(i, TileStatus.firebreak)
+    board_format, _ = encode_board(game.board)
+    assert board_format == DENSE_BOARD
+    path = str(tmp_path / 'old.ftr')
+    header = encode_game(game)
+    with open(path, 'wb') as f:
+        f.write(FILE_HEADER.pack(FILE_MAGIC, 1))
+        # a version 1 game header is the current one without its last byte, the board format
+        f.write(header[:GAME_HEADER_V1.size] + header[GAME_HEADER.size:])
+    with ReplayReader(path) as reader:
+        assert len(reader) == 1 and len(reader[0]) == 0
+        assert final_state(reader[0].start()) == final_state(game)
@@ -0,0 +1,198 @@
+import asyncio
+import json
+
+from server import MAX_BUFFERED, Connection, GameServer
+
+TIMEOUT = 5
+
+
+class Client:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    async def send(self, message):
+        line = message if isinstance(message, bytes) else json.dumps(message).encode() + b'\n'
+        self.writer.write(line)
+        await self.writer.drain()
+
+    async def receive(self):
+        line = await asyncio.wait_for(self.reader.readline(), TIMEOUT)
+        assert line, 'the server closed the connection'
+        return json.loads(line)
+
+    async def until(self, op):
+        while True:
+            message = await self.receive()
+            if message['op'] == op:
+                return message
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+def run(scenario):
+    """Run a scenario against a fresh server listening on a free port"""
+    async def main():
+        server = GameServer(seed=1, max_turns=50)
+        listener = await asyncio.start_server(server.serve_client, '127.0.0.1', 0)
+        port = listener.sockets[0].getsockname()[1]
+
+        async def connect():
+            return Client(*await asyncio.open_connection('127.0.0.1', port))
+
+        async with listener:
+            await scenario(server, connect)
+    asyncio.run(main())
+
+
+async def seated(connect, players=2):
+    """Clients joined into one started match, in seat order"""
+    clients = [await connect() for _ in range(players)]
+    for client in clients:
+        await client.send({'op': 'join', 'players': players})
+        assert (await client.until('joined'))['seat'] == clients.index(client)
+    for client in clients:
+        await client.until('start')
+    return clients
+
+
+def wind_fire(match):
+    game = match.game
+    i = next(i for i in game.candidates('add_wind_fire') if game.plan_add_wind_fire(i) is not None)
+    point = game.geometry.points[i]
+    return {'op': 'fire', 'x': point.x, 'y': point.y}
+
+
+def test_join_seats_and_starts():
+    async def scenario(server, connect):
+        clients = await seated(connect)
+        match = next(iter(server.matches.values()))
+        assert match.full and not server.lobby
+        for client in clients:
+            assert (await client.until('hand'))['cards']
+    run(scenario)
+
+
+def test_turn_order_and_updates():
+    async def scenario(server, connect):
+        clients = await seated(connect)
+        match = next(iter(server.matches.values()))
+        turn = match.game.turn
+        waiting = clients[1 - turn]
+        await waiting.send({'op': 'pass'})
+        assert (await waiting.until('error'))['message'] == 'not your turn'
+        await clients[turn].send(wind_fire(match))
+        for client in clients:
+            update = await client.until('update')
+            assert update['phase'] == 'card' and update['tiles']
+    run(scenario)
+
+
+def test_malformed_and_off_board_moves_get_errors():
+    async def scenario(server, connect):
+        clients = await seated(connect)
+        match = next(iter(server.matches.values()))
+        mover = clients[match.game.turn]
+        await mover.send(b'[1, 2]\n')
+        assert (await mover.until('error'))['message'] == 'messages must be JSON objects'
+        await mover.send({'op': 'fire', 'x': 99, 'y': -1})
+        assert (await mover.until('error'))['message'] == 'that tile is not on the board'
+        await mover.send(wind_fire(match))
+        await mover.until('update')
+        for bad in ({'op': 'card', 'card': 0, 'x': 16, 'y': 3, 'orientation': 'h'},
+                    {'op': 'card', 'card': 0, 'x': 'a', 'y': 3},
+                    {'op': 'card', 'card': 0, 'x': 3, 'y': 3, 'orientation': 'sideways'},
+                    {'op': 'card', 'card': [0]}):
+            await mover.send(bad)
+            assert (await mover.until('error'))['message']
+
+        def broken(*args):
+            raise RuntimeError('engine failure')
+        match.engine.play_card = broken
+        await mover.send({'op': 'card', 'card': 0, 'x': 3, 'y': 3, 'orientation': 'h'})
+        assert 'engine failure' in (await mover.until('error'))['message']
+        assert not match.over
+        await mover.send({'op': 'pass'})
+        assert (await mover.until('update'))['phase'] == 'fire'
+    run(scenario)
+
+
+def test_spectator_sees_the_match():
+    async def scenario(server, connect):
+        clients = await seated(connect)
+        match = next(iter(server.matches.values()))
+        spectator = await connect()
+        await spectator.send({'op': 'watch'})
+        start = await spectator.until('start')
+        assert start['match'] == match.id
+        assert len(start['board']) == match.game.geometry.tiles
+        await clients[match.game.turn].send(wind_fire(match))
+        assert (await spectator.until('update'))['seq'] == 1
+    run(scenario)
+
+
+def test_leaving_the_lobby_frees_the_seat():
+    async def scenario(server, connect):
+        stayer, leaver = await connect(), await connect()
+        for client in (stayer, leaver):
+            await client.send({'op': 'join', 'players': 3})
+            await client.until('joined')
+        await leaver.close()
+        while server.connections > 1:
+            await asyncio.sleep(0.01)
+        late = [await connect() for _ in range(2)]
+        for client in late:
+            await client.send({'op': 'join', 'players': 3})
+        assert [(await client.until('joined'))['seat'] for client in late] == [1, 2]
+        clients = [stayer] + late
+        for client in clients:
+            await client.until('start')
+        match = next(iter(server.matches.values()))
+        assert not match.over
+        await clients[match.game.turn].send(wind_fire(match))
+        for client in clients:
+            await client.until('update')
+    run(scenario)
+
+
+def test_disconnect_ends_a_started_match():
+    async def scenario(server, connect):
+        clients = await seated(connect)
+        await clients[0].close()
+        over = await clients[1].until('over')
+        assert over['reason'] == 'disconnect'
+        await clients[1].close()
+        while server.connections:
+            await asyncio.sleep(0.01)
+        assert not server.matches
+    run(scenario)
+
+
+class StalledWriter:
+    """A writer whose peer has stopped reading, with a megabyte and more already queued"""
+
+    def __init__(self):
+        self.transport = self
+        self.written = []
+        self.aborted = False
+
+    def is_closing(self):
+        return self.aborted
+
+    def get_write_buffer_size(self):
+        return MAX_BUFFERED + 1
+
+    def abort(self):
+        self.aborted = True
+
+    def write(self, line):
+        self.written.append(line)
+
+
+def test_a_client_that_stops_reading_is_dropped():
+    writer = StalledWriter()
+    connection = Connection(None, writer)
+    connection.send({'op': 'update'})
+    assert writer.aborted and not writer.written
@@ -0,0 +1,32 @@
+import pytest
+
+from bots import RandomBot
+from simulator import game_seed, play_game, simulate
+
+
+def outcome(report):
+    return report.games, report.wins, report.turns, report.cards
+
+
+@pytest.fixture(scope='module')
+def serial():
+    return simulate(16, [RandomBot], players=3, seed=7, workers=1, max_turns=60)
+
+
+@pytest.mark.parametrize('workers, chunk_size', [(2, None), (2, 3), (1, 5)])
+def test_results_do_not_depend_on_workers_or_chunks(serial, workers, chunk_size):
+    report = simulate(16, [RandomBot], players=3, seed=7, workers=workers, max_turns=60, chunk_size=chunk_size)
+    assert outcome(report) == outcome(serial)
+
+
+def test_the_seed_fixes_the_run(serial):
+    assert serial.games == 16 and sum(serial.wins.values()) == 16
+    other = simulate(16, [RandomBot], players=3, seed=8, workers=1, max_turns=60)
+    assert outcome(other) != outcome(serial)
+
+
+def test_a_game_seed_replays_the_same_game():
+    seed = game_seed(7, 3)
+    assert seed != game_seed(7, 4) and seed != game_seed(8, 3)
+    first, second = (play_game(seed, [RandomBot], players=3, max_turns=60) for _ in range(2))
+    assert first == second
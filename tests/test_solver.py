@@ -0,0 +1,148 @@
+import random
+
+import pytest
+
+from bots import CARD_PHASE, FIRE_PHASE, RandomBot, play_turn, turn_moves
+from firetower import FireTowerGame, Point, ThreatMaps, TileStatus
+from simulator import PLAYER_COUNTS
+from solver import FIRE_GAIN, TOWER_GAIN, ForcedBurnSolver, puzzles
+
+HANDS = [('flare_up', 'dozer_line'), ('burning_snag', 'smoke_jumper'), ('explosion', 'scratch_line'),
+         ('explosion', 'burning_snag'), ('flare_up',)]
+
+
+def forced(game, tower, attacker, phase, depth):
+    """
+    Whether the attacker can burn the tower within depth moves, trying every move the rules allow, passing
+    included. A last move is judged from its plan, which test_moves checks against playing it
+    """
+    if game.board.any_status(tower, TileStatus.fire):
+        return True
+    if depth <= 0 or not game.active or not attacker.active:
+        return False
+    for move in turn_moves(game, phase):
+        if depth == 1 and move is not None and move.action != 'ember_phase_one':
+            plan = getattr(game, f'plan_{move.action}')(game.geometry.index(move.point), move.orientation)
+            if any(s is TileStatus.fire and i in tower for i, s in plan):
+                return True
+            continue
+        checkpoint = game.checkpoint()
+        try:
+            if move is not None:
+                game.apply(move.action, move.point, move.orientation)
+            if move is not None and move.action == 'ember_phase_one':
+                won = forced(game, tower, attacker, CARD_PHASE, depth)
+            elif phase == FIRE_PHASE:
+                won = forced(game, tower, attacker, CARD_PHASE, depth - 1)
+            elif game.board.any_status(tower, TileStatus.fire):
+                won = True
+            elif depth <= 1 or not game.active or not attacker.active:
+                won = False
+            else:
+                game.action = game.no_action
+                won = True
+                for wind in {w for p in game.players if p.active for w in p.corner}:
+                    game.wind = wind
+                    game.journal.commit()
+                    if not forced(game, tower, attacker, FIRE_PHASE, depth - 1):
+                        won = False
+                        break
+            if won:
+                return True
+        finally:
+            game.rollback(checkpoint)
+    return False
+
+
+def assert_agrees(game, target, depth, phase):
+    solution = ForcedBurnSolver().solve(game, target, depth, phase=phase)
+    clone = game.copy()
+    clone.verbose = False
+    tower = clone.geometry.towers[target]
+    expected = next((d for d in range(1, depth + 1) if forced(clone, tower, clone.current_player, phase, d)), None)
+    assert solution.forced == (expected is not None)
+    if expected is not None:
+        assert solution.moves == expected
+    return solution.forced
+
+
+def fire_near_corners(seed):
+    """A position with a few fires near every corner, the attacker's own included, and a random hand"""
+    rng = random.Random(seed)
+    game = FireTowerGame(PLAYER_COUNTS[rng.choice(sorted(PLAYER_COUNTS))](), seed=seed)
+    game.verbose = False
+    geometry = game.geometry
+    for player in game.players:
+        corner = geometry.points[geometry.corners[player.corner]]
+        for _ in range(rng.randrange(1, 4)):
+            x = min(max(corner.x + rng.randrange(-4, 5), 0), geometry.size - 1)
+            y = min(max(corner.y + rng.randrange(-4, 5), 0), geometry.size - 1)
+            i = geometry.index(Point(x, y))
+            if i not in geometry.towers[player.corner]:
+                game.board.put(i, TileStatus.fire)
+    game.allowed_actions = frozenset(rng.choice(HANDS))
+    target = rng.choice([p for p in game.players if p is not game.current_player]).corner
+    return game, target, rng.choice([FIRE_PHASE, CARD_PHASE])
+
+
+def test_agrees_with_brute_force_near_the_corners():
+    wins = 0
+    for seed in range(24):
+        game, target, phase = fire_near_corners(seed)
+        for depth in (1, 2, 3):
+            wins += assert_agrees(game, target, depth, phase)
+    assert wins
+
+
+def test_agrees_with_brute_force_on_played_positions():
+    for k, (game, target) in enumerate(puzzles(5, 4, closest=3)):
+        game.allowed_actions = frozenset(HANDS[k % len(HANDS)])
+        assert_agrees(game, target, 2, FIRE_PHASE)
+        assert_agrees(game, target, 2, CARD_PHASE)
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_no_move_shortens_a_path_by_more_than_its_gain(seed):
+    game = FireTowerGame(PLAYER_COUNTS[2 + seed](), seed=seed)
+    game.verbose = False
+    bot = RandomBot(seed)
+    for _ in range(6):
+        play_turn(game, bot)
+    geometry = game.geometry
+    goals = {**{('tower', c): geometry.towers[c] for c in geometry.towers},
+             **{('corner', c): frozenset({i}) for c, i in geometry.corners.items()}}
+
+    def threats():
+        maps = ThreatMaps(game.board, goals, walls=False)
+        return {goal: maps.threat(goal) for goal in goals}
+
+    before = threats()
+    for action in FIRE_GAIN:
+        for move in game.legal_moves((action,)):
+            active = sum(p.active for p in game.players)
+            checkpoint = game.checkpoint()
+            game.apply(move.action, move.point, move.orientation)
+            burned = active - sum(p.active for p in game.players)
+            after = threats()
+            game.rollback(checkpoint)
+            for goal, threat in before.items():
+                assert threat - after[goal] <= FIRE_GAIN[action] + TOWER_GAIN * burned
+
+
+def test_defence_is_searched_when_fire_could_reach_the_attackers_corner():
+    game = FireTowerGame(seed=2)
+    game.verbose = False
+    geometry = game.geometry
+    attacker = game.current_player
+    target = next(p for p in game.players if p is not attacker).corner
+    corner = geometry.points[geometry.corners[attacker.corner]]
+    game.board.put(geometry.index(Point(abs(corner.x - 4), corner.y)), TileStatus.fire)
+    game.allowed_actions = frozenset({'flare_up', 'dozer_line'})
+    solver = ForcedBurnSolver()
+    solver.solve(game, target, 1, phase=CARD_PHASE)
+    assert not solver.safe(solver.gain(CARD_PHASE, 3))
+    moves = [move for move, _ in solver.moves(solver.actions(CARD_PHASE, False), False)]
+    assert None in moves and any(move and move.action == 'dozer_line' for move in moves)
+    assert solver.safe(solver.gain(CARD_PHASE, 1))
+    moves = [move for move, _ in solver.moves(solver.actions(CARD_PHASE, True), True)]
+    assert None not in moves and all(move.action == 'flare_up' for move in moves)
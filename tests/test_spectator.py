@@ -0,0 +1,158 @@
+import io
+import re
+
+from bots import RandomBot
+from firetower import Board, FireTowerGame, TileStatus
+from replay import ReplayReader, ReplayWriter
+from simulator import GameRun
+from spectator import CELL, CORNER_SGR, TILE_SGR, Panel, Screen, Spectator, layout, replay_feed, simulated_feed
+
+SEQUENCE = re.compile(r'\x1b\[(\??[\d;]*)([A-Za-z])')
+
+
+class Terminal:
+    """Just enough of an ANSI terminal to read back what a Screen drew: cursor moves, colours and text"""
+
+    def __init__(self):
+        self.cells = {}
+        self.row = self.col = 0
+        self.sgr = '0'
+
+    def feed(self, data):
+        at = 0
+        for match in SEQUENCE.finditer(data):
+            self.write(data[at:match.start()])
+            params, command = match.groups()
+            if command == 'H':
+                row, col = params.split(';')
+                self.row, self.col = int(row) - 1, int(col) - 1
+            elif command == 'm':
+                self.sgr = params
+            at = match.end()
+        self.write(data[at:])
+
+    def write(self, text):
+        for char in text:
+            self.cells[self.row, self.col] = char, self.sgr
+            self.col += 1
+
+    def line(self, row, col, width):
+        return ''.join(self.cells.get((row, col + k), (' ',))[0] for k in range(width))
+
+
+def drawn(stream, terminal):
+    data = stream.getvalue()
+    stream.seek(0)
+    stream.truncate()
+    terminal.feed(data)
+    return data
+
+
+def assert_shows(terminal, panel):
+    """The panel's part of the screen shows its game's board, cropped to the panel"""
+    game = panel.game
+    size = game.geometry.size
+    for y in range(size):
+        for x in range(size):
+            cell = terminal.cells.get((panel.top + 1 + y, panel.left + CELL * x))
+            if y < panel.rows and x < panel.cols:
+                assert cell[0] == Board.CHAR_MAP[game.board.tiles[y * size + x]]
+            else:
+                assert cell is None or cell[0] == ' '
+
+
+def test_screen_sends_only_changed_cells():
+    stream, terminal = io.StringIO(), Terminal()
+    screen = Screen(stream)
+    screen.text(2, 3, 'fire', 6, '31')
+    screen.flush()
+    assert drawn(stream, terminal)
+    assert terminal.line(2, 3, 6) == 'fire  ' and terminal.cells[2, 3][1] == '31'
+    screen.text(2, 3, 'fire', 6, '31')
+    screen.flush()
+    assert not drawn(stream, terminal)
+    screen.text(2, 3, 'fine', 6, '31')
+    screen.flush()
+    assert drawn(stream, terminal) == '\x1b[3;6Hn'
+    assert terminal.line(2, 3, 6) == 'fine  '
+
+
+def test_panel_draws_the_board_then_only_what_changed():
+    stream, terminal = io.StringIO(), Terminal()
+    screen = Screen(stream)
+    game = FireTowerGame(seed=1)
+    game.verbose = False
+    panel = Panel(screen, 0, 0, 16, 16)
+    panel.show(game, 'game 0')
+    panel.render()
+    screen.flush()
+    first = drawn(stream, terminal)
+    assert_shows(terminal, panel)
+    assert terminal.line(0, 0, 6) == 'game 0' and game.wind.name in terminal.line(0, 0, 32)
+    geometry = game.geometry
+    corner = geometry.points[geometry.corners[game.current_player.corner]]
+    assert terminal.cells[1 + corner.y, CELL * corner.x][1] == CORNER_SGR
+    i = next(i for i in range(geometry.tiles) if game.plan_add_wind_fire(i) is not None)
+    game.apply('add_wind_fire', geometry.points[i])
+    panel.moves += 1
+    panel.render()
+    screen.flush()
+    second = drawn(stream, terminal)
+    assert_shows(terminal, panel)
+    y, x = divmod(i, geometry.size)
+    assert terminal.cells[1 + y, CELL * x] == (Board.CHAR_MAP[TileStatus.fire], TILE_SGR[TileStatus.fire])
+    assert len(second) < 40 < len(first) // 10
+
+
+def test_cropped_panels_stay_in_their_place():
+    stream, terminal = io.StringIO(), Terminal()
+    screen = Screen(stream, color=False)
+    panels = layout(screen, 4, 16, 30, 9)
+    assert len(panels) == 1 and (panels[0].rows, panels[0].cols) == (7, 15)
+    panels = layout(screen, 4, 16, 70, 20)
+    assert [(p.top, p.left) for p in panels] == [(0, 0), (0, 33)]
+    for seed, panel in enumerate(panels):
+        game = FireTowerGame(seed=seed)
+        game.verbose = False
+        panel.show(game, f'game {seed}')
+        panel.render()
+    screen.flush()
+    drawn(stream, terminal)
+    for panel in panels:
+        assert_shows(terminal, panel)
+    assert {sgr for _, sgr in terminal.cells.values()} == {'0'}
+
+
+def test_spectator_plays_every_game_of_every_feed(tmp_path, monkeypatch):
+    path = str(tmp_path / 'games.ftr')
+    with ReplayWriter(path) as writer:
+        for seed in range(5):
+            run = GameRun(seed, [RandomBot], 2 + seed % 3, max_turns=30)
+            recorder = writer.record(run.game)
+            while not run.over:
+                run.step()
+            recorder.finish()
+    monkeypatch.setenv('COLUMNS', '70')
+    monkeypatch.setenv('LINES', '20')
+    stream, terminal = io.StringIO(), Terminal()
+    with ReplayReader(path) as reader:
+        moves = sum(1 for _ in replay_feed(reader, range(5))) - 5
+        feeds = [replay_feed(reader, range(k, 5, 3)) for k in range(3)]
+        spectator = Spectator(Screen(stream), feeds)
+        spectator.run()
+    # three feeds on the two panels that fit: the third feed's games are played after the first's
+    assert len(spectator.panels) == 2
+    assert (spectator.games, spectator.moves) == (5, moves)
+    drawn(stream, terminal)
+    for panel in spectator.panels:
+        assert_shows(terminal, panel)
+    assert [panel.title for panel in spectator.panels] == ['game 2', 'game 4']
+    assert terminal.line(19, 0, 69).startswith(f'5 games, {moves} moves, ')
+
+
+def test_simulated_feed_replays_the_seed():
+    def final(seed):
+        *_, (game, title) = simulated_feed(seed, [2], [RandomBot], players=3, max_turns=30)
+        return title, list(game.board.tiles), game.turn
+    assert final(6) == final(6)
+    assert final(6)[0] == 'game 2'
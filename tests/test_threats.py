@@ -0,0 +1,128 @@
+import random
+
+import pytest
+
+from bots import RandomBot, play_turn
+from firetower import Board, FireTowerGame, SparseBoard, ThreatMaps, TileStatus
+from simulator import PLAYER_COUNTS
+
+BOARD_TYPES = [Board, SparseBoard]
+STATUSES = [TileStatus.tree, TileStatus.fire, TileStatus.firebreak]
+
+
+def tracked(board_type, seed, walls):
+    game = FireTowerGame(board_type=board_type, seed=seed)
+    game.verbose = False
+    towers = {p.corner: game.geometry.towers[p.corner] for p in game.players}
+    game.board.threats = ThreatMaps(game.board, towers, walls)
+    return game
+
+
+def assert_matches_rebuild(board):
+    threats = board.threats
+    assert ThreatMaps(board, threats.towers, threats.walls).distance == threats.distance
+
+
+@pytest.mark.parametrize('walls', [True, False])
+@pytest.mark.parametrize('board_type', BOARD_TYPES)
+@pytest.mark.parametrize('seed', range(4))
+def test_repair_matches_rebuild_on_random_writes(board_type, seed, walls):
+    game = tracked(board_type, seed, walls)
+    rng = random.Random(seed)
+    for step in range(200):
+        game.board.put(rng.randrange(game.geometry.tiles), rng.choice(STATUSES))
+        if step % 10 == 0:
+            assert_matches_rebuild(game.board)
+    assert_matches_rebuild(game.board)
+    game.journal.commit()
+    while game.undo():
+        pass
+    assert_matches_rebuild(game.board)
+
+
+@pytest.mark.parametrize('board_type', BOARD_TYPES)
+@pytest.mark.parametrize('seed', range(3))
+def test_repair_matches_rebuild_through_games(board_type, seed):
+    game = FireTowerGame(board_type=board_type, seed=seed)
+    game.verbose = False
+    game.track_threats()
+    bot = RandomBot(seed)
+    for _ in range(40):
+        if not game.active:
+            break
+        play_turn(game, bot)
+        if game.rng.random() < 0.1:
+            game.fire_storm()
+            game.check_for_victory()
+        assert_matches_rebuild(game.board)
+    clone = game.copy()
+    assert_matches_rebuild(clone.board)
+    clone.board.put(next(iter(clone.board.frontier)), TileStatus.fire)
+    assert_matches_rebuild(game.board)
+    assert_matches_rebuild(clone.board)
+
+
+def test_walls_off_is_a_lower_bound():
+    game = tracked(Board, 11, True)
+    rng = random.Random(11)
+    for _ in range(150):
+        game.board.put(rng.randrange(game.geometry.tiles), rng.choice(STATUSES))
+    walls = game.board.threats
+    open_ = ThreatMaps(game.board, walls.towers, walls=False)
+    for corner in walls.towers:
+        assert all(o <= w for o, w in zip(open_.distance[corner], walls.distance[corner]))
+
+
+@pytest.mark.parametrize('walls', [True, False])
+def test_bounded_search_is_exact_up_to_the_limit(walls):
+    game = tracked(Board, 4, walls)
+    rng = random.Random(4)
+    for _ in range(150):
+        game.board.put(rng.randrange(game.geometry.tiles), rng.choice(STATUSES))
+    threats = game.board.threats
+    for corner, tower in threats.towers.items():
+        full = threats.distance[corner]
+        for limit in (0, 1, 3, 8):
+            bounded = threats.search(tower, limit)
+            assert all(b == f if f <= limit else b > limit for b, f in zip(bounded, full))
+
+
+class Window:
+    """Stands in for a PySimpleGUI window, keeping the last colour each tile button was given"""
+
+    def __init__(self):
+        self.colors = {}
+
+    def __getitem__(self, point):
+        window = self
+
+        class Button:
+            def update(self, button_color):
+                window.colors[point] = button_color[1]
+        return Button()
+
+
+def assert_heatmap_drawn(game, window):
+    game.board.draw(window, game.players, heatmap=True)
+    assert window.colors == game.board.get_colors(game.players, heatmap=True)
+
+
+@pytest.mark.parametrize('seed', range(8))
+def test_heatmap_follows_players_dropping_out_and_coming_back(seed):
+    game = FireTowerGame(PLAYER_COUNTS[3 + seed % 2](), seed=seed)
+    game.verbose = False
+    game.track_threats()
+    window = Window()
+    game.board.dirty.update(range(game.geometry.tiles))
+    assert_heatmap_drawn(game, window)
+    bot = RandomBot(seed)
+    while game.active:
+        play_turn(game, bot)
+        if game.active and game.rng.random() < 0.3:
+            game.fire_storm()
+            game.check_for_victory()
+            game.journal.commit()
+        assert_heatmap_drawn(game, window)
+    while game.undo():
+        assert_heatmap_drawn(game, window)
+    assert all(p.active for p in game.players)
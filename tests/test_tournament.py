@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+from tournament import Ratings, Tournament
+
+# a storm every turn settles some of these short matches, so the ratings have something to agree on
+SETTINGS = dict(policies=['random', 'mcts'], counts=(2,), seed=4, max_turns=14, storm_chance=1.0)
+
+
+def outcomes(tournament):
+    return {index: (result.winner, result.turns) for index, result in tournament.results.items()}
+
+
+def interrupt_after(matches):
+    def progress(tournament):
+        if len(tournament.results) == matches:
+            raise KeyboardInterrupt
+    return progress
+
+
+@pytest.fixture(scope='module')
+def uninterrupted():
+    tournament = Tournament(**SETTINGS)
+    tournament.run(workers=1)
+    assert any(result.winner is not None for result in tournament.results.values())
+    return tournament
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_resumed_run_matches_an_uninterrupted_one(tmp_path, uninterrupted, workers):
+    path = str(tmp_path / 'checkpoint.jsonl')
+    first = Tournament(**SETTINGS, checkpoint=path)
+    with pytest.raises(KeyboardInterrupt):
+        first.run(workers=1, progress=interrupt_after(5))
+    # an interruption in the middle of writing a result leaves half a line behind
+    with open(path, 'a') as f:
+        f.write('{"index": 7, "win')
+    resumed = Tournament(**SETTINGS, checkpoint=path)
+    assert len(resumed.results) == 5
+    assert len(resumed.pending) == len(resumed.matches) - 5
+    resumed.run(workers=workers)
+    assert not resumed.pending
+    assert outcomes(resumed) == outcomes(uninterrupted)
+    assert resumed.ratings().elo == uninterrupted.ratings().elo
+    with open(path) as f:
+        lines = f.read().splitlines()
+    assert json.loads(lines[0])['settings'] == resumed.settings
+    assert sum(line.startswith('{"index"') and line.endswith('}') for line in lines) == len(resumed.matches)
+
+
+def test_checkpoint_of_other_settings_is_refused(tmp_path):
+    path = str(tmp_path / 'checkpoint.jsonl')
+    first = Tournament(**SETTINGS, checkpoint=path)
+    with pytest.raises(KeyboardInterrupt):
+        first.run(workers=1, progress=interrupt_after(1))
+    with pytest.raises(ValueError):
+        Tournament(**{**SETTINGS, 'seed': 5}, checkpoint=path)
+
+
+def test_ratings_are_zero_sum_and_favour_the_winner():
+    ratings = Ratings()
+    ratings.update(['a', 'b', 'b'], 0)
+    assert ratings.elo['a'] > ratings.initial > ratings.elo['b']
+    assert sum(ratings.elo.values()) == pytest.approx(2 * ratings.initial)
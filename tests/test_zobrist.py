@@ -0,0 +1,86 @@
+import random
+
+import pytest
+
+from firetower import Board, FireTowerGame, SparseBoard, TileStatus, TranspositionTable
+
+BOARD_TYPES = [Board, SparseBoard]
+STATUSES = [TileStatus.tree, TileStatus.fire, TileStatus.firebreak]
+
+
+def scrambled(board_type, seed, writes=300):
+    game = FireTowerGame(board_type=board_type, seed=seed)
+    game.verbose = False
+    rng = random.Random(seed)
+    for _ in range(writes):
+        game.board.put(rng.randrange(game.geometry.tiles), rng.choice(STATUSES))
+    return game
+
+
+@pytest.mark.parametrize('board_type', BOARD_TYPES)
+@pytest.mark.parametrize('seed', range(5))
+def test_hash_matches_rebuild(board_type, seed):
+    game = scrambled(board_type, seed)
+    board = game.board
+    incremental = board.hash
+    board.reindex()
+    assert board.hash == incremental
+
+
+@pytest.mark.parametrize('board_type', BOARD_TYPES)
+def test_hash_depends_only_on_tiles(board_type):
+    rng = random.Random(7)
+    game = FireTowerGame(board_type=board_type, seed=0)
+    writes = [(rng.randrange(game.geometry.tiles), rng.choice(STATUSES[1:])) for _ in range(40)]
+    writes = list(dict(writes).items())
+    hashes = set()
+    for _ in range(3):
+        board = FireTowerGame(board_type=board_type, seed=0).board
+        rng.shuffle(writes)
+        for i, status in writes:
+            board.put(i, status)
+        hashes.add(board.hash)
+    assert len(hashes) == 1
+    board.put(writes[0][0], TileStatus.tree)
+    assert board.hash not in hashes
+
+
+
+
+def test_hash_returns_with_the_position():
+    game = FireTowerGame(seed=2)
+    game.verbose = False
+    start = game.hash
+    rng = random.Random(2)
+    for _ in range(40):
+        moves = game.legal_moves()
+        if not game.active or not moves:
+            break
+        move = rng.choice(moves)
+        game.apply(move.action, move.point, move.orientation)
+    assert game.hash != start
+    while game.undo():
+        pass
+    assert game.hash == start
+
+
+def test_game_hash_covers_the_wind_and_turn():
+    game = FireTowerGame(seed=4)
+    game.verbose = False
+    start = game.hash
+    game.wind = next(w for w in type(game.wind) if w is not game.wind)
+    assert game.hash != start
+    windy = game.hash
+    game.end_turn()
+    assert game.hash != windy
+
+
+def test_table_evicts_the_least_recently_used():
+    table = TranspositionTable(2)
+    table.put(1, 'a')
+    table.put(2, 'b')
+    assert table.get(1) == 'a'
+    table.put(3, 'c')
+    assert 2 not in table and 1 in table and 3 in table
+    assert table.get(2) is None
+    assert (table.hits, table.misses) == (1, 1)
@@ -0,0 +1,269 @@
+from __future__ import annotations
+import argparse
+import itertools
+import json
+import os
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Dict, IO, List, Optional, Sequence, Tuple
+
+from firetower import CORNERS
+from simulator import PLAYER_COUNTS, POLICIES, game_seed, play_game
+
+CORNER_NAMES = {corner.name: corner for corner in CORNERS}
+
+
+@dataclass(frozen=True)
+class Match:
+    """One scheduled game: the policy and corner of each seat, in turn order, and the game's seed"""
+    index: int
+    lineup: Tuple[str, ...]
+    corners: Tuple[str, ...]
+    seed: int
+
+
+@dataclass(frozen=True)
+class MatchResult:
+    index: int
+    winner: Optional[int]
+    turns: int
+    seconds: float
+
+
+def schedule(policies: Sequence[str], counts: Sequence[int] = (2, 3, 4), rounds: int = 1,
+             seed: int = 0) -> List[Match]:
+    """
+    A round robin: for every player count, every set of corners for that many players and every way of seating
+    the policies in them, with at least two different policies at the table, `rounds` games each
+    """
+    matches = []
+    for _ in range(rounds):
+        for players in counts:
+            for corners in itertools.combinations(CORNERS, players):
+                for lineup in itertools.product(policies, repeat=players):
+                    if len(set(lineup)) > 1:
+                        index = len(matches)
+                        matches.append(Match(index, lineup, tuple(c.name for c in corners), game_seed(seed, index)))
+    return matches
+
+
+def play_match(match: Match, max_turns: int, storm_chance: float) -> MatchResult:
+    start = time.perf_counter()
+    result = play_game(match.seed, [POLICIES[name] for name in match.lineup], len(match.lineup), max_turns,
+                       storm_chance, corners=[CORNER_NAMES[name] for name in match.corners])
+    winner = match.corners.index(result.winner) if result.winner is not None else None
+    return MatchResult(match.index, winner, result.turns, time.perf_counter() - start)
+
+
+@dataclass
+class Ratings:
+    """
+    Elo ratings for multiplayer games, each scored as every pair of seats with different policies: the winner beats
+    each other seat, and seats that both lost draw. K is shared out over a seat's opponents
+    """
+    k: float = 32.0
+    initial: float = 1500.0
+    elo: Dict[str, float] = field(default_factory=dict)
+
+    def expected(self, a: str, b: str) -> float:
+        return 1 / (1 + 10 ** ((self.elo[b] - self.elo[a]) / 400))
+
+    def update(self, lineup: Sequence[str], winner: Optional[int]):
+        for name in lineup:
+            self.elo.setdefault(name, self.initial)
+        deltas = Counter()
+        k = self.k / (len(lineup) - 1)
+        for i, j in itertools.combinations(range(len(lineup)), 2):
+            a, b = lineup[i], lineup[j]
+            if a == b:
+                continue
+            score = 1.0 if winner == i else 0.0 if winner == j else 0.5
+            change = k * (score - self.expected(a, b))
+            deltas[a] += change
+            deltas[b] -= change
+        for name, change in deltas.items():
+            self.elo[name] += change
+
+
+@dataclass
+class Standing:
+    games: int = 0
+    wins: int = 0
+    draws: int = 0
+    by_players: Counter = field(default_factory=Counter)
+
+
+class Tournament:
+    """
+    Runs a schedule of matches on a process pool, appending each result to a JSON lines checkpoint as soon as it
+    comes in. Started again on the same checkpoint, it checks the settings match and plays only what is missing.
+    Ratings are worked out from the results in schedule order, so they come out the same however the run was split
+    """
+
+    def __init__(self, policies: Sequence[str], counts: Sequence[int] = (2, 3, 4), rounds: int = 1, seed: int = 0,
+                 max_turns: int = 200, storm_chance: float = 0.1, checkpoint: Optional[str] = None):
+        unknown = [name for name in policies if name not in POLICIES]
+        if unknown:
+            raise ValueError(f'unknown policies {unknown}, expecting some of {sorted(POLICIES)}')
+        if len(set(policies)) < 2:
+            raise ValueError('a tournament needs at least two different policies')
+        self.settings = {'policies': list(policies), 'counts': list(counts), 'rounds': rounds, 'seed': seed,
+                         'max_turns': max_turns, 'storm_chance': storm_chance}
+        self.matches = schedule(policies, counts, rounds, seed)
+        self.max_turns = max_turns
+        self.storm_chance = storm_chance
+        self.checkpoint = checkpoint
+        self.results: Dict[int, MatchResult] = {}
+        if checkpoint is not None and os.path.exists(checkpoint):
+            self.load(checkpoint)
+
+    def load(self, path: str):
+        with open(path) as f:
+            lines = f.read().splitlines()
+        if not lines:
+            return
+        settings = json.loads(lines[0]).get('settings')
+        if settings != self.settings:
+            raise ValueError(f'{path} was written by a tournament with settings {settings}, not {self.settings}')
+        for line in lines[1:]:
+            try:
+                result = MatchResult(**json.loads(line))
+            except (json.JSONDecodeError, TypeError):
+                # the last line of an interrupted run may be cut short; that match is simply played again
+                continue
+            self.results[result.index] = result
+
+    @property
+    def pending(self) -> List[Match]:
+        return [match for match in self.matches if match.index not in self.results]
+
+    def open_checkpoint(self) -> Optional[IO[str]]:
+        if self.checkpoint is None:
+            return None
+        ending = b''
+        if os.path.exists(self.checkpoint) and os.path.getsize(self.checkpoint):
+            with open(self.checkpoint, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                ending = f.read()
+        f = open(self.checkpoint, 'a')
+        if not ending:
+            f.write(json.dumps({'settings': self.settings}) + '\n')
+        elif ending != b'\n':
+            # finish off a line cut short by an interruption, so the next result starts on a line of its own
+            f.write('\n')
+        return f
+
+    def record(self, result: MatchResult, f: Optional[IO[str]]):
+        self.results[result.index] = result
+        if f is not None:
+            f.write(json.dumps(asdict(result)) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def run(self, workers: Optional[int] = None, progress: Optional[Callable[[Tournament], None]] = None):
+        """
+        Play every pending match, with `workers` processes (one runs in this process). Interrupting is safe: what
+        finished is on disk, and matches still in the pool are cancelled
+        """
+        workers = workers or os.cpu_count() or 1
+        pending = self.pending
+        f = self.open_checkpoint()
+        try:
+            if workers == 1:
+                for match in pending:
+                    self.record(play_match(match, self.max_turns, self.storm_chance), f)
+                    if progress is not None:
+                        progress(self)
+                return
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                # keep a couple of matches queued per worker rather than submitting the whole schedule up front,
+                # so an interrupted run leaves little work behind in the pool
+                queue = iter(pending)
+                running = {executor.submit(play_match, m, self.max_turns, self.storm_chance)
+                           for m in itertools.islice(queue, 2 * workers)}
+                try:
+                    while running:
+                        done, running = wait(running, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            self.record(future.result(), f)
+                            if progress is not None:
+                                progress(self)
+                        for match in itertools.islice(queue, len(done)):
+                            running.add(executor.submit(play_match, match, self.max_turns, self.storm_chance))
+                except BaseException:
+                    for future in running:
+                        future.cancel()
+                    raise
+        finally:
+            if f is not None:
+                f.close()
+
+    def ratings(self) -> Ratings:
+        ratings = Ratings()
+        for match in self.matches:
+            result = self.results.get(match.index)
+            if result is not None:
+                ratings.update(match.lineup, result.winner)
+        return ratings
+
+    def standings(self) -> Dict[str, Standing]:
+        """Matches played, won and drawn (ended with no winner) by each policy, wins also by player count"""
+        standings = {name: Standing() for name in self.settings['policies']}
+        for match in self.matches:
+            result = self.results.get(match.index)
+            if result is None:
+                continue
+            winner = match.lineup[result.winner] if result.winner is not None else None
+            for name in set(match.lineup):
+                standing = standings[name]
+                standing.games += 1
+                standing.wins += name == winner
+                standing.draws += winner is None
+                standing.by_players[len(match.lineup)] += name == winner
+        return standings
+
+    def summary(self) -> str:
+        ratings = self.ratings()
+        standings = self.standings()
+        counts = self.settings['counts']
+        seconds = sum(result.seconds for result in self.results.values())
+        lines = [f'{len(self.results)} of {len(self.matches)} matches played, {seconds:.1f}s of play',
+                 f'{"policy":<12} {"elo":>7} {"games":>6} {"wins":>6} {"draws":>6} {"win %":>6} '
+                 + ' '.join(f'{f"{n}p wins":>8}' for n in counts)]
+        for name in sorted(standings, key=lambda n: -ratings.elo.get(n, ratings.initial)):
+            s = standings[name]
+            rate = s.wins / s.games if s.games else 0.0
+            lines.append(f'{name:<12} {ratings.elo.get(name, ratings.initial):>7.1f} {s.games:>6} {s.wins:>6} '
+                         f'{s.draws:>6} {rate:>6.1%} ' + ' '.join(f'{s.by_players[n]:>8}' for n in counts))
+        return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Play a round-robin bot tournament with Elo ratings')
+    parser.add_argument('--policy', action='append', choices=sorted(POLICIES), required=True,
+                        help='a policy taking part, repeated for each one')
+    parser.add_argument('--players', type=int, nargs='+', choices=sorted(PLAYER_COUNTS), default=sorted(PLAYER_COUNTS))
+    parser.add_argument('--rounds', type=int, default=1, help='games per seating')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--max-turns', type=int, default=200)
+    parser.add_argument('--storm-chance', type=float, default=0.1)
+    parser.add_argument('--checkpoint', help='append results to this file, and resume from it if it exists')
+    parser.add_argument('--every', type=int, default=0, help='print the standings every this many matches')
+    args = parser.parse_args()
+
+    tournament = Tournament(args.policy, args.players, args.rounds, args.seed, args.max_turns, args.storm_chance,
+                            args.checkpoint)
+    print(f'{len(tournament.pending)} of {len(tournament.matches)} matches to play')
+
+    def progress(t: Tournament):
+        if args.every and len(t.results) % args.every == 0:
+            print(t.summary(), flush=True)
+
+    try:
+        tournament.run(args.workers, progress)
+    except KeyboardInterrupt:
+        print('interrupted, run again with the same checkpoint to carry on')
+    print(tournament.summary())